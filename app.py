@@ -1,9 +1,11 @@
 import streamlit as st
 import pandas as pd
 import requests
-import os, json, subprocess, sys
+import os, json, subprocess, sys, hashlib
 from pathlib import Path
 
+from source_freshness import FreshnessRegistry
+
 # === Streamlit ===
 st.set_page_config(page_title="Veri Güncelleme", layout="wide")
 st.title("📦 Günlük Suç Tahmin Zenginleştirme ve Güncelleme Paneli")
@@ -82,19 +84,36 @@ if st.button("📦 requirements.txt yükle"):
     except Exception as e:
         st.error(f"Kurulum çağrısı başarısız: {e}")
 
-def download_and_preview(name, url, file_path, is_json=False):
+def download_and_preview(name, url, file_path, is_json=False, fresh=None):
     st.markdown(f"### 🔹 {name}")
     try:
-        r = requests.get(url, timeout=30)
-        r.raise_for_status()
-        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        key = f"http:{url}"
+        local = Path(file_path)
+        # Yerel kopya varsa koşullu istek: kaynak değişmediyse sunucu 304 döner, gövde inmez
+        headers = fresh.http_headers(key) if (fresh and local.exists()) else {}
+        r = requests.get(url, timeout=30, headers=headers)
+        if r.status_code == 304 and local.exists():
+            st.caption("🗃️ Kaynak değişmemiş (304); yerel kopya kullanılıyor.")
+            if fresh:
+                fresh.update(key, from_cache=True)
+        else:
+            r.raise_for_status()
+            # ETag/Last-Modified yoksa içerik özetiyle karşılaştır; aynıysa diske yazma
+            digest = hashlib.blake2b(r.content, digest_size=16).hexdigest()
+            unchanged = bool(fresh) and local.exists() and fresh.is_fresh(key, digest, str(local))
+            if unchanged:
+                st.caption("🗃️ İçerik değişmemiş; yerel kopya korunuyor.")
+            else:
+                local.parent.mkdir(parents=True, exist_ok=True)
+                with open(local, "wb") as f:
+                    f.write(r.content)
+            if fresh:
+                fresh.update(key, token=digest, from_cache=unchanged,
+                             etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"))
         if is_json:
-            Path(file_path).write_text(r.text, encoding="utf-8")
-            data = json.loads(r.text)
+            data = json.loads(local.read_text(encoding="utf-8"))
             st.json(data if isinstance(data, dict) else (data[:3] if isinstance(data, list) else data))
         else:
-            with open(file_path, "wb") as f:
-                f.write(r.content)
             df = pd.read_csv(file_path, nrows=3)
             cols = pd.read_csv(file_path, nrows=0).columns.tolist()
             st.dataframe(df)
@@ -104,8 +123,12 @@ def download_and_preview(name, url, file_path, is_json=False):
 
 st.markdown("### 1) (Opsiyonel) Verileri indir ve önizle")
 if st.button("📥 Verileri İndir ve Önizle (İlk 3 Satır)"):
+    fresh = FreshnessRegistry(str(ROOT / "crime_data" / "source_freshness.json"))
     for name, info in DOWNLOADS.items():
-        download_and_preview(name, info["url"], info["path"], is_json=info.get("is_json", False))
+        download_and_preview(name, info["url"], info["path"], is_json=info.get("is_json", False), fresh=fresh)
+    fresh.save("app_downloads")
+    if fresh.cached:
+        st.info(f"🗃️ Önbellekten sunulan: {len(fresh.cached)} / {len(DOWNLOADS)} kaynak")
     st.success("✅ İndirme tamamlandı.")
 
 # -----------------------------
@@ -0,0 +1,363 @@
+# block_index.py
+# Nüfus blokları (sf_census_blocks_with_population.geojson) için kalıcı mekânsal dizin.
+# - GeoJSON bir kez okunur; GEOID'ler normalize edilir, geometriler + STRtree + GEOID uzunluğu
+#   ikili (pickle) önbelleğe yazılır: crime_data/_cache/block_index.pkl
+# - Önbellek blok dosyasının içerik özetiyle (blake2b) geçersiz kılınır.
+# - crime_data/_cache gitignore'dadır; CI'da iş akışlarındaki actions/cache adımı (blok dosyası
+#   özetine bağlı anahtar) dizini çalıştırmalar arasında korur.
+# - Tüm adımlar aynı API'yi kullanır: assign_geoid(lon, lat) → GEOID dizisi
+#   (sjoin(predicate="within") ile aynı anlam: sınır üstündeki / dışarıdaki noktalar → NaN).
+# - Hızlı yol: SF kutusu üzerinde ince bir raster (piksel → blok sırası). Tamamen tek bir bloğun
+#   içinde/dışında kalan pikseller tek dizi erişimiyle çözülür; sınır pikselleri (ve kutu dışı)
+#   kesin poligon testine (STRtree) düşer. Raster de blok dosyası özetiyle önbelleğe alınır.
+# - Koordinat hafızası: aynı (lon, lat) çiftleri (kavşağa oturtulmuş olaylar) tekilleştirilir;
+#   çözülen çiftler çalıştırmalar arası kalıcı bir haritada (coord_geoid_memo.npz) tutulur ve
+#   yalnızca yeni çiftler mekânsal sorguya gider. Harita da blok dosyası özetine bağlıdır.
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from source_freshness import file_token
+
+CACHE_DIR = os.environ.get("BLOCK_INDEX_DIR", os.path.join("crime_data", "_cache"))
+RASTER_BOX = (-123.2, 37.6, -122.3, 37.9)  # update_crime.py'deki koordinat filtresiyle aynı kutu
+RASTER_RES = float(os.environ.get("BLOCK_RASTER_RES", "0.0001"))  # derece (~10 m)
+OUTSIDE, BOUNDARY = -1, -2
+CACHE_VERSION = 2  # BlockIndex alanları değişince artırılır → eski önbellek yeniden kurulur
+MEMO_MAX = int(os.environ.get("GEOID_MEMO_MAX", "2000000"))  # kalıcı haritadaki en fazla çift
+BLOCK_CANDIDATES = [
+    os.path.join("crime_data", "sf_census_blocks_with_population.geojson"),
+    os.path.join(".", "sf_census_blocks_with_population.geojson"),
+]
+
+
+def normalize_geoid(series: pd.Series, target_len: int) -> pd.Series:
+    s = pd.Series(series).astype(str).str.extract(r"(\d+)")[0]
+    return s.str.zfill(target_len)
+
+
+class BlockRaster:
+    """Piksel → blok sırası; OUTSIDE: hiçbir blokta değil, BOUNDARY: kesin test gerekir."""
+
+    def __init__(self, grid: np.ndarray, box=RASTER_BOX, res: float = RASTER_RES, token: str = None):
+        self.grid = grid
+        self.box = tuple(float(v) for v in box)
+        self.res = float(res)
+        self.token = token
+
+    @classmethod
+    def build(cls, geoms: np.ndarray, box=RASTER_BOX, res: float = RASTER_RES, token: str = None) -> "BlockRaster":
+        x0, y0, x1, y1 = box
+        nx, ny = int(np.ceil((x1 - x0) / res)), int(np.ceil((y1 - y0) / res))
+        grid = np.full((ny, nx), OUTSIDE, dtype="int16" if len(geoms) < 32000 else "int32")
+        xs = x0 + (np.arange(nx) + 0.5) * res
+        ys = y0 + (np.arange(ny) + 0.5) * res
+
+        # 1) Piksel merkezleri: hangi bloğun içinde?
+        for i, geom in enumerate(geoms):
+            bx0, by0, bx1, by1 = geom.bounds
+            c0, c1 = np.searchsorted(xs, [bx0, bx1])
+            r0, r1 = np.searchsorted(ys, [by0, by1])
+            if c0 >= c1 or r0 >= r1:
+                continue
+            X, Y = np.meshgrid(xs[c0:c1], ys[r0:r1])
+            inside = shapely.contains_xy(geom, X, Y)
+            sub = grid[r0:r1, c0:c1]
+            clash = inside & (sub >= 0)      # çakışan bloklar → kesin teste bırak
+            sub[inside] = i
+            sub[clash] = BOUNDARY
+
+        # 2) Sınır çizgilerinin geçtiği pikseller (+1 piksel komşuluk) → BOUNDARY
+        lines = shapely.segmentize(shapely.boundary(geoms), res / 2)
+        xy = shapely.get_coordinates(lines)
+        ix = np.floor((xy[:, 0] - x0) / res).astype("int64")
+        iy = np.floor((xy[:, 1] - y0) / res).astype("int64")
+        ok = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        edge = np.zeros((ny, nx), dtype=bool)
+        edge[iy[ok], ix[ok]] = True
+        near = edge.copy()
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dy or dx:
+                    near[max(dy, 0):ny + min(dy, 0), max(dx, 0):nx + min(dx, 0)] |= \
+                        edge[max(-dy, 0):ny + min(-dy, 0), max(-dx, 0):nx + min(-dx, 0)]
+        grid[near] = BOUNDARY
+        return cls(grid, box, res, token)
+
+    def lookup(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """Blok sırası; BOUNDARY dönenler (sınır pikseli ya da kutu dışı) kesin teste gider."""
+        x0, y0, _, _ = self.box
+        ny, nx = self.grid.shape
+        inv = 1.0 / self.res
+        fx = (lon - x0) * inv
+        fy = (lat - y0) * inv
+        ok = (fx >= 0) & (fx < nx) & (fy >= 0) & (fy < ny)  # NaN karşılaştırmaları False → kutu dışı
+        # ok satırlarında değerler negatif değil: int dönüşümü (kesme) = floor
+        flat = np.where(ok, fy, 0).astype("int64") * nx + np.where(ok, fx, 0).astype("int64")
+        return np.where(ok, self.grid.ravel().take(flat), BOUNDARY).astype("int64", copy=False)
+
+    def save(self, path: Path):
+        tmp = path.with_suffix(".npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, grid=self.grid, box=np.asarray(self.box), res=self.res,
+                                token=np.asarray(self.token or ""))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BlockRaster":
+        with np.load(path) as z:
+            return cls(z["grid"], tuple(z["box"]), float(z["res"]), str(z["token"]) or None)
+
+
+class CoordMemo:
+    """(lon, lat) → blok sırası kalıcı haritası; anahtarlar sıralı complex128 (lon + i·lat)."""
+
+    def __init__(self, path: Path, token: str = None):
+        self.path = Path(path)
+        self.token = token
+        self.keys = np.empty(0, dtype="complex128")
+        self.vals = np.empty(0, dtype="int32")
+        self.dirty = False
+        if self.path.exists():
+            try:
+                with np.load(self.path) as z:
+                    if str(z["token"]) == (token or ""):
+                        self.keys, self.vals = z["keys"], z["vals"]
+            except Exception as e:
+                print(f"⚠️ Koordinat hafızası okunamadı ({self.path}): {e}")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, keys: np.ndarray):
+        """(bulundu_maskesi, değerler)"""
+        vals = np.full(len(keys), BOUNDARY, dtype="int64")
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=bool), vals
+        pos = np.searchsorted(self.keys, keys).clip(max=len(self.keys) - 1)
+        hit = self.keys[pos] == keys
+        vals[hit] = self.vals[pos[hit]]
+        return hit, vals
+
+    def put(self, keys: np.ndarray, vals: np.ndarray):
+        room = MEMO_MAX - len(self.keys)
+        if room <= 0 or not len(keys):
+            return
+        keys, vals = keys[:room], vals[:room]
+        all_keys = np.concatenate([self.keys, keys])
+        order = np.argsort(all_keys, kind="stable")
+        self.keys = all_keys[order]
+        self.vals = np.concatenate([self.vals, vals.astype("int32")])[order]
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, keys=self.keys, vals=self.vals, token=np.asarray(self.token or ""))
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+class BlockIndex:
+    def __init__(self, geoids: np.ndarray, tree: shapely.STRtree, target_len: int, token: str = None):
+        self.geoids = geoids          # normalize GEOID (object dizisi), ağaçtaki sırayla
+        self.tree = tree
+        self.target_len = int(target_len)
+        self.token = token
+        self.version = CACHE_VERSION
+        self.raster = None            # BlockRaster (load_block_index ayrı dosyadan bağlar)
+        self.memo = None              # CoordMemo (load_block_index ayrı dosyadan bağlar)
+        self.stats = dict.fromkeys(("points", "unique", "memo_hits", "exact"), 0)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["raster"] = None  # raster ve koordinat hafızası ayrı dosyalarda tutulur
+        state["memo"] = None
+        state["stats"] = dict.fromkeys(("points", "unique", "memo_hits", "exact"), 0)
+        return state
+
+    @property
+    def geometries(self) -> np.ndarray:
+        return self.tree.geometries
+
+    def centroids(self) -> pd.DataFrame:
+        """GEOID → blok merkezinin latitude/longitude'u (ör. negatif örneklem hücrelerine koordinat)."""
+        pts = shapely.centroid(self.geometries)
+        out = pd.DataFrame({"latitude": shapely.get_y(pts), "longitude": shapely.get_x(pts)},
+                           index=pd.Index(self.geoids, name="GEOID"))
+        return out[~out.index.duplicated(keep="first")]
+
+    @classmethod
+    def build(cls, blocks_path: str, token: str = None) -> "BlockIndex":
+        import geopandas as gpd  # yalnızca önbellek kurulurken gerekir
+
+        blocks = gpd.read_file(blocks_path)
+        if blocks.crs is not None and blocks.crs.to_epsg() != 4326:
+            blocks = blocks.to_crs("EPSG:4326")
+        if "GEOID" not in blocks.columns:
+            raise ValueError(f"Blok dosyasında 'GEOID' yok: {blocks_path}")
+        target_len = blocks["GEOID"].astype(str).str.len().mode().iat[0]
+        geoids = normalize_geoid(blocks["GEOID"], target_len).to_numpy(dtype=object)
+        return cls(geoids, shapely.STRtree(np.asarray(blocks.geometry.values)), target_len, token)
+
+    # ---------- sorgu ----------
+    def _first_match(self, geoms: np.ndarray) -> np.ndarray:
+        """Her geometri için içinde bulunduğu ilk bloğun sırası; yoksa -1."""
+        out = np.full(len(geoms), -1, dtype="int64")
+        if not len(geoms):
+            return out
+        src, blk = self.tree.query(geoms, predicate="within")
+        if len(src):
+            order = np.lexsort((blk, src))       # aynı nokta birden çok blokta ise en küçük sıra
+            src, blk = src[order], blk[order]
+            first = np.r_[True, src[1:] != src[:-1]]
+            out[src[first]] = blk[first]
+        return out
+
+    def _resolve(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """Raster (varsa) + sınır pikselleri için kesin test. Girdiler sonlu olmalı."""
+        out = self.raster.lookup(lon, lat) if self.raster is not None else np.full(len(lon), BOUNDARY, "int64")
+        exact = np.flatnonzero(out == BOUNDARY)
+        if len(exact):
+            out[exact] = self._first_match(shapely.points(lon[exact], lat[exact]))
+        self.stats["exact"] += len(exact)
+        return out
+
+    def lookup(self, lon, lat) -> np.ndarray:
+        """Nokta → blok sırası (-1: hiçbir bloğun içinde değil / koordinat eksik).
+
+        Çiftler önce tekilleştirilir; hafızada olmayan tekil çiftler çözülüp hafızaya eklenir.
+        """
+        lon = np.asarray(lon, dtype="float64")
+        lat = np.asarray(lat, dtype="float64")
+        out = np.full(len(lon), -1, dtype="int64")
+        ok = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+        self.stats["points"] += len(lon)
+        if not len(ok):
+            return out
+
+        codes, uniq = pd.factorize(lon[ok] + 1j * lat[ok])
+        uniq = np.asarray(uniq, dtype="complex128")
+        if self.memo is not None:
+            hit, res = self.memo.get(uniq)
+        else:
+            hit, res = np.zeros(len(uniq), dtype=bool), np.full(len(uniq), BOUNDARY, dtype="int64")
+        miss = np.flatnonzero(~hit)
+        if len(miss):
+            res[miss] = self._resolve(uniq.real[miss], uniq.imag[miss])
+            if self.memo is not None:
+                self.memo.put(uniq[miss], res[miss])
+        self.stats["unique"] += len(uniq)
+        self.stats["memo_hits"] += int(hit.sum())
+
+        res[res < 0] = -1
+        out[ok] = res[codes]
+        return out
+
+    def exact_share(self) -> float:
+        """Kesin poligon testine düşen noktaların oranı (raster/hafıza isabetinin tersi)."""
+        return self.stats["exact"] / self.stats["points"] if self.stats["points"] else 0.0
+
+    def report(self) -> str:
+        st = self.stats
+        n, u = st["points"], st["unique"]
+        memo_rate = st["memo_hits"] / u if u else 0.0
+        return (f"🧭 GEOID: {n} nokta → {u} tekil koordinat (%{100 * (1 - u / n) if n else 0:.1f} tekrar) | "
+                f"hafıza isabeti %{100 * memo_rate:.1f} ({st['memo_hits']}/{u}) | "
+                f"mekânsal sorgu {u - st['memo_hits']} çift, kesin poligon testi {st['exact']}")
+
+    def save_memo(self):
+        if self.memo is not None:
+            self.memo.save()
+
+    def to_geoid(self, idx: np.ndarray) -> np.ndarray:
+        out = np.full(len(idx), np.nan, dtype=object)
+        hit = idx >= 0
+        out[hit] = self.geoids[idx[hit]]
+        return out
+
+    def assign_geoid(self, lon, lat) -> np.ndarray:
+        """Nokta koordinatları → GEOID (object dizisi, eşleşmeyenler NaN)."""
+        return self.to_geoid(self.lookup(lon, lat))
+
+    def assign_geoms(self, geoms) -> np.ndarray:
+        """Herhangi bir geometri dizisi (ör. POI poligonları) → içinde bulunduğu bloğun GEOID'i."""
+        geoms = np.asarray(geoms)
+        ok = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+        idx = np.full(len(geoms), -1, dtype="int64")
+        idx[ok] = self._first_match(geoms[ok])
+        return self.to_geoid(idx)
+
+
+_LOADED = {}
+
+
+def load_block_index(blocks_path: str = None, cache_dir: str = CACHE_DIR, raster: bool = True) -> BlockIndex:
+    """Önbellekten (gerekirse yeniden kurarak) blok dizinini yükler. Dosya yoksa FileNotFoundError.
+
+    raster=True iken piksel rasteri de (önbellekten ya da kurularak) bağlanır.
+    """
+    if blocks_path is None:
+        blocks_path = next((p for p in BLOCK_CANDIDATES if os.path.exists(p)), None)
+    if blocks_path is None or not os.path.exists(blocks_path):
+        raise FileNotFoundError("❌ Nüfus blokları GeoJSON bulunamadı (crime_data/ veya kök).")
+
+    token = file_token(blocks_path)
+    cached = _LOADED.get(token)
+    if cached is not None:
+        return cached
+
+    cache_path = Path(cache_dir) / "block_index.pkl"
+    index = None
+    if cache_path.exists():
+        try:
+            with open(cache_path, "rb") as f:
+                index = pickle.load(f)
+            if (not isinstance(index, BlockIndex) or index.token != token
+                    or getattr(index, "version", None) != CACHE_VERSION):
+                index = None
+        except Exception as e:
+            print(f"⚠️ Blok dizini önbelleği okunamadı ({cache_path}): {e}")
+            index = None
+    if index is None:
+        index = BlockIndex.build(blocks_path, token)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(".pkl.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_path)
+        print(f"🧭 Blok dizini kuruldu: {len(index.geoids)} blok (GEOID uzunluğu {index.target_len}) → {cache_path}")
+    if raster and index.raster is None:
+        index.raster = _load_raster(index, Path(cache_dir) / "block_raster.npz")
+    if index.memo is None:
+        index.memo = CoordMemo(Path(cache_dir) / "coord_geoid_memo.npz", token)
+    _LOADED[token] = index
+    return index
+
+
+def _load_raster(index: BlockIndex, path: Path) -> BlockRaster:
+    if path.exists():
+        try:
+            r = BlockRaster.load(path)
+            if r.token == index.token and r.box == tuple(RASTER_BOX) and r.res == RASTER_RES:
+                return r
+        except Exception as e:
+            print(f"⚠️ Blok rasteri okunamadı ({path}): {e}")
+    r = BlockRaster.build(index.geometries, RASTER_BOX, RASTER_RES, index.token)
+    r.save(path)
+    share = float((r.grid == BOUNDARY).mean())
+    print(f"🧭 Blok rasteri kuruldu: {r.grid.shape[1]}×{r.grid.shape[0]} piksel ({RASTER_RES}°), "
+          f"sınır pikseli %{100 * share:.1f} → {path}")
+    return r
+
+
+def assign_geoid(lon, lat, blocks_path: str = None) -> np.ndarray:
+    """Kısayol: varsayılan blok dosyasıyla nokta → GEOID."""
+    return load_block_index(blocks_path).assign_geoid(lon, lat)
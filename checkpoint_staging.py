@@ -0,0 +1,82 @@
+# checkpoint_staging.py
+# Uzun süren indirmeler (5 yıllık backfill) için disk üstü ara depo + ilerleme manifesti.
+# Her tamamlanan parça (gün / sayfa aralığı) ayrı CSV olarak yazılır, manifest'e işlenir;
+# script yarıda kalırsa tekrar çalıştırıldığında tamamlanan parçalar yeniden indirilmez.
+# Parçalar işlenirken de tek tek okunur (load); ara depo hiçbir zaman bütün olarak belleğe alınmaz.
+import os
+import json
+from pathlib import Path
+
+import pandas as pd
+
+STAGING_ROOT = os.environ.get("STAGING_DIR", os.path.join("crime_data", "_staging"))
+
+
+class ChunkStaging:
+    """Parça bazlı ara depo. Parçalar bellekte biriktirilmez; commit anında diske yazılır."""
+
+    def __init__(self, name: str, root: str = STAGING_ROOT):
+        self.dir = Path(root) / name
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.dir / "manifest.json"
+        self.manifest = {"chunks": {}, "meta": {}}
+        if self.manifest_path.exists():
+            try:
+                self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+                self.manifest.setdefault("chunks", {})
+                self.manifest.setdefault("meta", {})
+            except Exception as e:
+                print(f"⚠️ Manifest okunamadı ({self.manifest_path}): {e}. Ara depo sıfırlanıyor.")
+                self.clear()
+
+    # ---- manifest ----
+    def _write_manifest(self):
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=2, default=str), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)  # atomik: yarım manifest kalmaz
+
+    @property
+    def meta(self) -> dict:
+        return self.manifest["meta"]
+
+    def set_meta(self, **kw):
+        self.manifest["meta"].update(kw)
+        self._write_manifest()
+
+    def keys(self):
+        return sorted(self.manifest["chunks"])
+
+    def done(self, key: str) -> bool:
+        key = str(key)
+        return key in self.manifest["chunks"] and (self.dir / self.manifest["chunks"][key]["file"]).exists()
+
+    # ---- parçalar ----
+    def commit(self, key: str, df: pd.DataFrame, **meta):
+        """Parçayı önce geçici dosyaya yazar, sonra yerine taşır ve manifest'e işler."""
+        key = str(key)
+        fname = f"{key}.csv"
+        tmp = self.dir / (fname + ".tmp")
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, self.dir / fname)
+        self.manifest["chunks"][key] = {"file": fname, "rows": int(len(df)), **meta}
+        self._write_manifest()
+
+    def load(self, key: str, **read_kw) -> pd.DataFrame:
+        path = self.dir / self.manifest["chunks"][str(key)]["file"]
+        read_kw.setdefault("float_precision", "round_trip")  # koordinatlar bit-bit aynı dönsün
+        try:
+            return pd.read_csv(path, **read_kw)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+    def total_rows(self) -> int:
+        return sum(int(c.get("rows", 0)) for c in self.manifest["chunks"].values())
+
+    def clear(self):
+        for p in self.dir.glob("*"):
+            try:
+                p.unlink()
+            except Exception:
+                pass
+        self.manifest = {"chunks": {}, "meta": {}}
+        self._write_manifest()
@@ -0,0 +1,448 @@
+# crime_grid.py
+# GEOID × season × day_of_week × event_hour grid'inin artımlı (birleştirilebilir) durumu.
+# Her hücre için ortalamalar yerine toplam + sayı, tarih için minimum tutulur:
+#   yeni günler eklenince hücreye toplanır, pencereden düşen günler çıkarılır.
+# Böylece her çalıştırmada 5 yıllık geçmiş yeniden gruplanmaz; yalnızca değişen
+# hücreler güncellenir ve Y_label sadece o hücreler için yeniden türetilir.
+# Durum, olay deposunun ay bazlı satır sayılarıyla birlikte saklanır; depo ile
+# uyuşmazsa (ör. yarıda kalan çalıştırma) depodan baştan kurulur.
+# Hücreler tek bir tamsayı kodla temsil edilir: ((geoid_idx * 4 + sezon) * 7 + gün) * 24 + saat.
+# Toplamlar np.bincount ile alınır; tam grid birleştirme (merge) yapılmadan doğrudan
+# indeksle doldurulur.
+# Etiketli grid seyrek (sparse) saklanır: yalnızca olay olan hücreler + GEOID/zaman boyutları
+# (Parquet üst verisinde). Tam grid gerektiğinde açılır ya da GEOID parçaları hâlinde akıtılır.
+# Eğitim için tam grid yerine dolu hücreler + zaman dilimine göre tabakalı, tohumlu negatif
+# örneklem (ağırlıklı) üretilebilir (training_sample).
+import os
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+GRID_KEYS = ["GEOID", "season", "day_of_week", "event_hour"]
+MEAN_COLS = ["latitude", "longitude", "is_weekend", "is_night", "is_holiday",
+             "is_school_hour", "is_business_hour"]
+INPUT_COLS = GRID_KEYS + MEAN_COLS + ["date", "id"]
+SUM_COLS = ["crime_count"] + [f"{c}_sum" for c in MEAN_COLS] + [f"{c}_n" for c in MEAN_COLS]
+LABEL_MIN_COUNT = 2
+
+SEASONS = ["Winter", "Spring", "Summer", "Fall"]
+N_DAYS, N_HOURS = 7, 24
+CELLS_PER_GEOID = len(SEASONS) * N_DAYS * N_HOURS  # 672
+_NAT = np.iinfo("int64").min
+ZERO_COLS = ("crime_count", "Y_label")
+SPARSE_META_KEY = b"crime_grid"
+
+
+def encode_cells(geoid_idx, season_idx, day, hour) -> np.ndarray:
+    """(GEOID sırası, sezon, gün, saat) → tek int64 hücre kodu."""
+    return ((np.asarray(geoid_idx, dtype="int64") * len(SEASONS) + season_idx) * N_DAYS + day) * N_HOURS + hour
+
+
+def decode_cells(codes: np.ndarray):
+    """encode_cells'in tersi: (geoid_idx, season_idx, day, hour)."""
+    codes = np.asarray(codes, dtype="int64")
+    rest, hour = np.divmod(codes, N_HOURS)
+    rest, day = np.divmod(rest, N_DAYS)
+    geoid_idx, season_idx = np.divmod(rest, len(SEASONS))
+    return geoid_idx, season_idx, day, hour
+
+
+def cell_sums(df: pd.DataFrame) -> pd.DataFrame:
+    """Olay satırlarını hücre bazında birleştirilebilir toplamlara indirger (indeks: GRID_KEYS).
+
+    groupby yerine hücre kodu + np.bincount kullanılır; anahtarı eksik satırlar (GEOID,
+    sezon, gün, saat) groupby'daki gibi dışarıda kalır.
+    """
+    season_idx = pd.Categorical(df["season"], categories=SEASONS).codes
+    day = pd.to_numeric(df["day_of_week"], errors="coerce").to_numpy(dtype="float64")
+    hour = pd.to_numeric(df["event_hour"], errors="coerce").to_numpy(dtype="float64")
+    geoid_idx, geoids = pd.factorize(df["GEOID"])
+    ok = (geoid_idx >= 0) & (season_idx >= 0) & ~np.isnan(day) & ~np.isnan(hour)
+
+    codes = encode_cells(geoid_idx[ok], season_idx[ok], day[ok].astype("int64"), hour[ok].astype("int64"))
+    uniq, inv = np.unique(codes, return_inverse=True)
+    k = len(uniq)
+
+    out = {"crime_count": np.bincount(inv, weights=df["id"].notna().to_numpy()[ok], minlength=k).astype("int64")}
+    dates = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ns]")[ok].view("int64")
+    dmin = np.full(k, np.iinfo("int64").max)
+    valid = dates != _NAT
+    np.minimum.at(dmin, inv[valid], dates[valid])
+    dmin[dmin == np.iinfo("int64").max] = _NAT
+    out["date_min"] = dmin.view("datetime64[ns]")
+    for c in MEAN_COLS:
+        vals = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype="float64")[ok]
+        has = ~np.isnan(vals)
+        out[f"{c}_sum"] = np.bincount(inv, weights=np.where(has, vals, 0.0), minlength=k)
+        out[f"{c}_n"] = np.bincount(inv, weights=has, minlength=k).astype("int64")
+
+    g, s, d, h = decode_cells(uniq)
+    index = pd.MultiIndex.from_arrays(
+        [np.asarray(geoids, dtype=object)[g], np.asarray(SEASONS, dtype=object)[s], d, h], names=GRID_KEYS)
+    return pd.DataFrame(out, index=index)
+
+
+def _label(counts: pd.Series) -> pd.Series:
+    return (counts >= LABEL_MIN_COUNT).astype(int)
+
+
+class GridState:
+    def __init__(self, path: str):
+        self.path = path
+        self.meta_path = path + ".json"
+        self.cells = None
+        self.meta = {}
+
+    # ---------- kalıcılık ----------
+    def load(self) -> bool:
+        if not (os.path.exists(self.path) and os.path.exists(self.meta_path)):
+            return False
+        try:
+            self.meta = json.loads(Path(self.meta_path).read_text(encoding="utf-8"))
+            self.cells = pd.read_parquet(self.path).set_index(GRID_KEYS)
+            return True
+        except Exception as e:
+            print(f"⚠️ Grid durumu okunamadı ({self.path}): {e}")
+            self.cells, self.meta = None, {}
+            return False
+
+    def in_sync(self, row_counts: dict) -> bool:
+        """Durum, deponun şu anki ay/satır sayılarından türetilmiş mi?"""
+        return self.cells is not None and self.meta.get("months") == row_counts
+
+    def save(self, row_counts: dict):
+        tmp = self.path + ".tmp"
+        self.cells.reset_index().to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+        self.meta = {"months": row_counts, "cells": int(len(self.cells))}
+        tmp = self.meta_path + ".tmp"
+        Path(tmp).write_text(json.dumps(self.meta, indent=2), encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+
+    # ---------- güncelleme ----------
+    def rebuild(self, store):
+        """Tüm olay deposundan (yalnızca gerekli kolonlar) baştan kurar."""
+        cells = cell_sums(store.read(columns=INPUT_COLS))
+        cells["Y_label"] = _label(cells["crime_count"])
+        self.cells = cells
+
+    def apply(self, added: pd.DataFrame, removed: pd.DataFrame, store) -> int:
+        """Eklenen satırları toplar, silinenleri çıkarır; yalnızca etkilenen hücreleri yazar.
+
+        Dönüş: güncellenen hücre sayısı.
+        """
+        plus, minus = cell_sums(added), cell_sums(removed)
+        touched = plus.index.union(minus.index)
+        if touched.empty:
+            return 0
+
+        cur = self.cells.reindex(touched)
+        new = (cur[SUM_COLS].fillna(0)
+               .add(plus[SUM_COLS].reindex(touched, fill_value=0))
+               .sub(minus[SUM_COLS].reindex(touched, fill_value=0)))
+        new["date_min"] = pd.concat([cur["date_min"], plus["date_min"].reindex(touched)], axis=1).min(axis=1)
+        new = new[new["crime_count"] > 0]
+
+        # Hücrenin en eski günü silindiyse yeni minimum depodan bulunur.
+        lost = minus["date_min"].reindex(new.index)
+        stale = new.index[(lost.notna() & (lost <= cur["date_min"].reindex(new.index))).to_numpy()]
+        if len(stale):
+            new.loc[stale, "date_min"] = self._scan_min_dates(store, stale)
+
+        new["Y_label"] = _label(new["crime_count"])
+        new = new.astype({c: "int64" for c in ["crime_count"] + [f"{c}_n" for c in MEAN_COLS]})
+        keep = self.cells.drop(index=cur.index[cur["crime_count"].notna()])
+        self.cells = pd.concat([keep, new[self.cells.columns]])
+        return len(touched)
+
+    @staticmethod
+    def _scan_min_dates(store, cells: pd.MultiIndex) -> pd.Series:
+        """Ayları eskiden yeniye tarar; tüm hücrelerin minimumu bulununca durur."""
+        found = pd.Series(pd.NaT, index=cells, dtype="datetime64[ns]")
+        pending = cells
+        for ym in store.months():
+            part = store.read_month(ym, columns=GRID_KEYS + ["date"]).dropna(subset=["GEOID"])
+            hit = part.set_index(GRID_KEYS)["date"]
+            hit = hit[hit.index.isin(pending)]
+            if hit.empty:
+                continue
+            mins = hit.groupby(level=GRID_KEYS).min()
+            found.loc[mins.index] = mins.to_numpy()
+            pending = pending.difference(mins.index)
+            if pending.empty:
+                break
+        return found
+
+    # ---------- çıktı ----------
+    def summary(self) -> pd.DataFrame:
+        """Grup bazlı özet: GRID_KEYS + ortalamalar + date (min) + crime_count + Y_label."""
+        out = self.cells.sort_index().reset_index()
+        for c in MEAN_COLS:
+            out[c] = out[f"{c}_sum"] / out[f"{c}_n"].where(out[f"{c}_n"] > 0)
+        out["date"] = out["date_min"]
+        return out[GRID_KEYS + MEAN_COLS + ["date", "crime_count", "Y_label"]]
+
+
+def dense_grid(summary: pd.DataFrame, geoids=None, zero_cols=ZERO_COLS) -> pd.DataFrame:
+    """Özeti GEOID × sezon × gün × saat tam grid'ine açar (merge yok, doğrudan indeksleme).
+
+    Satır sırası itertools.product(geoids, SEASONS, range(7), range(24)) ile aynıdır;
+    olay olmayan hücrelerde `zero_cols` 0, diğer kolonlar boştur.
+    """
+    if geoids is None:
+        geoids = summary["GEOID"].unique()
+    geoids = pd.Index(geoids)
+    size = len(geoids) * CELLS_PER_GEOID
+
+    gi = geoids.get_indexer(summary["GEOID"])
+    si = pd.Categorical(summary["season"], categories=SEASONS).codes
+    keep = (gi >= 0) & (si >= 0)
+    pos = encode_cells(gi[keep], si[keep], summary["day_of_week"].to_numpy()[keep],
+                       summary["event_hour"].to_numpy()[keep])
+
+    g, s, d, h = decode_cells(np.arange(size, dtype="int64"))
+    out = {
+        "GEOID": pd.Categorical.from_codes(g, categories=geoids),
+        "season": pd.Categorical.from_codes(s, categories=SEASONS),
+        "day_of_week": d,
+        "event_hour": h,
+    }
+    for c in summary.columns:
+        if c in GRID_KEYS:
+            continue
+        vals = summary[c].to_numpy()[keep]
+        if c in zero_cols:
+            col = np.zeros(size, dtype="int64")
+        elif np.issubdtype(vals.dtype, np.datetime64):
+            col = np.full(size, np.datetime64("NaT"), dtype=vals.dtype)
+        elif vals.dtype.kind in "iufb":
+            col = np.full(size, np.nan, dtype="float64")
+        else:
+            col = np.full(size, np.nan, dtype=object)
+        col[pos] = vals
+        out[c] = col
+    return pd.DataFrame(out)
+
+
+def first_seen_geoids(store, among=None) -> np.ndarray:
+    """GEOID'ler olay deposundaki ilk görülme sırasıyla (aylar eskiden yeniye, ay içinde ekleme sırası).
+
+    Tam grid'in satır sırası bu diziyi izler (eski tek parça CSV'deki `GEOID.unique()` sırası).
+    Depo ay ay, yalnızca GEOID kolonu okunarak taranır. `among` verilirse yalnızca o GEOID'ler döner.
+    """
+    seen = [pd.unique(store.read_month(ym, columns=["GEOID"])["GEOID"].dropna()) for ym in store.months()]
+    order = pd.unique(np.concatenate(seen)) if seen else np.array([], dtype=object)
+    if among is None:
+        return order
+    among = pd.Index(pd.unique(np.asarray(among, dtype=object)))
+    order = order[pd.Index(order).isin(among)]
+    return np.concatenate([order, among.difference(order, sort=False).to_numpy(dtype=object)])
+
+
+# ---------- seyrek grid dosyası ----------
+def write_sparse_grid(summary: pd.DataFrame, path: str, geoids=None, **extra_meta):
+    """Sıfır olmayan hücreleri ve grid boyutlarını tek Parquet dosyasına yazar (atomik)."""
+    if geoids is None:
+        geoids = summary["GEOID"].unique()
+    dims = {"geoids": [str(g) for g in geoids], "seasons": SEASONS, "days": N_DAYS, "hours": N_HOURS,
+            **extra_meta}
+    table = pa.Table.from_pandas(summary, preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[SPARSE_META_KEY] = json.dumps(dims).encode("utf-8")
+    Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table.replace_schema_metadata(meta), tmp)
+    os.replace(tmp, path)
+
+
+def read_sparse_grid(path: str, columns=None):
+    """(sıfır olmayan hücreler, geoids) döndürür; tam grid kurulmaz."""
+    meta = pq.read_schema(path).metadata or {}
+    if SPARSE_META_KEY not in meta:
+        raise ValueError(f"Seyrek grid dosyası değil: {path}")
+    dims = json.loads(meta[SPARSE_META_KEY])
+    if columns is not None:
+        columns = list(dict.fromkeys(GRID_KEYS + list(columns)))
+    cells = pd.read_parquet(path, columns=columns)
+    return cells, dims["geoids"]
+
+
+def iter_dense(cells: pd.DataFrame, geoids, chunk_geoids: int = 2000, zero_cols=ZERO_COLS):
+    """Tam grid'i GEOID parçaları hâlinde üretir; bellekte aynı anda tek parça bulunur."""
+    geoids = pd.Index(geoids)
+    gi = geoids.get_indexer(cells["GEOID"])
+    order = np.argsort(gi, kind="stable")
+    cells, gi = cells.iloc[order], gi[order]
+    for lo in range(0, max(len(geoids), 1), chunk_geoids):  # boş gridde de başlıklı tek parça
+        hi = min(lo + chunk_geoids, len(geoids))
+        a, b = np.searchsorted(gi, [lo, hi])
+        yield dense_grid(cells.iloc[a:b], geoids=geoids[lo:hi], zero_cols=zero_cols)
+
+
+def densify(path: str, columns=None) -> pd.DataFrame:
+    """Seyrek grid dosyasını tam grid'e açar (küçük gridler / geriye dönük uyumluluk için)."""
+    cells, geoids = read_sparse_grid(path, columns)
+    return dense_grid(cells, geoids=geoids)
+
+
+def write_dense_csv(chunks, path: str) -> int:
+    """iter_dense parçalarını tek CSV'ye akıtır (geçici dosya + yerine taşıma). Dönüş: satır sayısı."""
+    Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
+    tmp = path + ".tmp"
+    n = 0
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=(i == 0))
+            n += len(chunk)
+    os.replace(tmp, path)
+    return n
+
+
+# ---------- negatif örneklemli eğitim kümesi ----------
+SEASON_OF_MONTH = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])  # Ocak..Aralık → SEASONS sırası
+
+
+def _time_flags(day, hour) -> dict:
+    """Hücrenin gün/saatinden türeyen bayraklar (update_crime.add_time_features ile aynı tanımlar)."""
+    day, hour = np.asarray(day), np.asarray(hour)
+    return {
+        "is_weekend": (day >= 5).astype(int),
+        "is_night": ((hour >= 20) | (hour < 4)).astype(int),
+        "is_school_hour": ((hour >= 7) & (hour <= 16)).astype(int),
+        "is_business_hour": ((hour >= 9) & (hour <= 17) & (day < 5)).astype(int),
+    }
+
+
+def _draw_dates(season_idx, day, date_range, rng) -> np.ndarray:
+    """Her negatif için pencereden aynı sezona ve haftanın gününe düşen rastgele bir tarih."""
+    days = pd.date_range(date_range[0], date_range[1], freq="D")
+    stratum = SEASON_OF_MONTH[days.month.to_numpy() - 1] * N_DAYS + days.dayofweek.to_numpy()
+    order = np.argsort(stratum, kind="stable")
+    bounds = np.searchsorted(stratum[order], np.arange(len(SEASONS) * N_DAYS + 1))
+    want = np.asarray(season_idx, dtype="int64") * N_DAYS + np.asarray(day, dtype="int64")
+    lo, size = bounds[want], bounds[want + 1] - bounds[want]
+    out = np.full(len(want), np.datetime64("NaT"), dtype="datetime64[ns]")
+    ok = size > 0
+    pick = lo[ok] + np.floor(rng.random(int(ok.sum())) * size[ok]).astype("int64")
+    out[ok] = days.to_numpy()[order[pick]]
+    return out
+
+
+def training_sample(summary: pd.DataFrame, geoids=None, neg_ratio: float = 3.0, seed: int = 42,
+                    coords: pd.DataFrame = None, date_range=None, holidays=None) -> pd.DataFrame:
+    """Dolu hücrelerin tamamı + boş hücrelerden tabakalı, tohumlu örneklem.
+
+    Tabakalar zaman dilimleridir (sezon × gün × saat = 672). Negatif sayısı
+    neg_ratio × dolu hücre sayısıdır; boş hücresi olan her dilime önce bir çekiliş verilir
+    (negatif sayısı en az bu dilim sayısıdır), kalanı boş hücre sayılarıyla orantılı dağıtılır.
+    Boş hücreler hücre kodu üzerinden çekilir; tam grid kurulmaz.
+    `sample_weight`: dolu hücrelerde 1, negatiflerde tabakadaki boş hücre / çekilen
+    (ağırlıklar toplamı tam grid boyutuna eşittir → modeller yansız kalır).
+
+    Negatifler sonraki adımlardan (koordinat/tarih isteyen birleştirmeler) sağ çıksın diye:
+    - latitude/longitude: `coords` (indeks GEOID; ör. blok merkezleri), yoksa GEOID'in dolu
+      hücrelerinin olay sayısıyla ağırlıklı ortalaması
+    - date: `date_range` (başlangıç, bitiş) içinden hücrenin sezonu ve gününe uyan rastgele gün
+      (verilmezse özetteki tarih aralığı)
+    - is_* bayrakları hücrenin gün/saatinden; is_holiday `holidays` verilirse tarihten
+    """
+    if geoids is None:
+        geoids = summary["GEOID"].unique()
+    geoids = pd.Index(geoids)
+    n_geo = len(geoids)
+    gi = geoids.get_indexer(summary["GEOID"])
+    si = pd.Categorical(summary["season"], categories=SEASONS).codes
+    keep = (gi >= 0) & (si >= 0)
+    pos = summary[keep].copy()
+    codes = encode_cells(gi[keep], si[keep], pos["day_of_week"].to_numpy(), pos["event_hour"].to_numpy())
+    slot = codes % CELLS_PER_GEOID
+
+    occupied = np.bincount(slot, minlength=CELLS_PER_GEOID)
+    empty = n_geo - occupied
+    total_empty = int(empty.sum())
+    want = int(round(neg_ratio * len(pos)))
+    n_neg = 0 if want <= 0 else int(min(max(want, np.count_nonzero(empty)), total_empty))
+
+    # Boş hücreli her dilime en az bir çekiliş (yoksa o dilimin boş hücre ağırlığı kaybolur ve
+    # ağırlık toplamı tam grid'in altında kalır); kalan orantılı, en büyük kalan yöntemiyle (toplam tam n_neg)
+    alloc = np.zeros(CELLS_PER_GEOID, dtype="int64")
+    if n_neg > 0:
+        alloc = (empty > 0).astype("int64")
+        rest = n_neg - int(alloc.sum())
+        if rest > 0:
+            room = empty - alloc
+            quota = rest * room / room.sum()
+            add = np.floor(quota).astype("int64")
+            extra = rest - int(add.sum())
+            if extra > 0:
+                add[np.argsort(-(quota - add), kind="stable")[:extra]] += 1
+            alloc += add
+
+    rng = np.random.default_rng(seed)
+    order = np.argsort(slot, kind="stable")
+    bounds = np.searchsorted(slot[order], np.arange(CELLS_PER_GEOID + 1))
+    neg_codes, neg_w = [], []
+    for t in np.flatnonzero(alloc):
+        taken = gi[keep][order[bounds[t]:bounds[t + 1]]]
+        k = int(alloc[t])
+        cand = rng.choice(n_geo, size=k + len(taken), replace=False)
+        cand = cand[~np.isin(cand, taken)][:k]
+        neg_codes.append(cand.astype("int64") * CELLS_PER_GEOID + t)
+        neg_w.append(np.full(k, empty[t] / k))
+    neg_codes = np.concatenate(neg_codes) if neg_codes else np.array([], dtype="int64")
+    neg_w = np.concatenate(neg_w) if neg_w else np.array([], dtype="float64")
+
+    g, s, d, h = decode_cells(neg_codes)
+    neg = pd.DataFrame({
+        "GEOID": np.asarray(geoids, dtype=object)[g],
+        "season": np.asarray(SEASONS, dtype=object)[s],
+        "day_of_week": d,
+        "event_hour": h,
+    })
+    for c in pos.columns:
+        if c in GRID_KEYS:
+            continue
+        if c in ZERO_COLS:
+            neg[c] = 0
+        elif np.issubdtype(pos[c].dtype, np.datetime64):
+            neg[c] = pd.Series(pd.NaT, index=neg.index, dtype=pos[c].dtype)
+        else:
+            neg[c] = np.nan
+
+    # Koordinat: önce verilen blok merkezleri, eksik kalanlar için dolu hücrelerin ağırlıklı ortalaması
+    if {"latitude", "longitude"} <= set(pos.columns):
+        w = pos["crime_count"].to_numpy(dtype="float64") if "crime_count" in pos.columns else np.ones(len(pos))
+        gk = gi[keep]
+        for c in ("latitude", "longitude"):
+            v = pos[c].to_numpy(dtype="float64")
+            has = ~np.isnan(v)
+            num = np.bincount(gk[has], weights=(v * w)[has], minlength=n_geo)
+            den = np.bincount(gk[has], weights=w[has], minlength=n_geo)
+            mean = np.divide(num, den, out=np.full(n_geo, np.nan), where=den > 0)
+            if coords is not None and c in coords.columns:
+                given = pd.to_numeric(coords[c].reindex(geoids), errors="coerce").to_numpy(dtype="float64")
+                mean = np.where(np.isnan(given), mean, given)
+            neg[c] = mean[g]
+    if "date" in pos.columns:
+        if date_range is None:
+            dates = pd.to_datetime(pos["date"]).dropna()
+            date_range = (dates.min(), dates.max()) if len(dates) else None
+        if date_range is not None:
+            neg["date"] = pd.Series(_draw_dates(s, d, date_range, rng), index=neg.index).astype(pos["date"].dtype)
+    for c, v in _time_flags(d, h).items():
+        if c in pos.columns:
+            neg[c] = v
+    if holidays is not None and "is_holiday" in pos.columns and "date" in neg.columns:
+        hol = pd.DatetimeIndex(pd.to_datetime(list(holidays))).normalize()
+        neg["is_holiday"] = pd.to_datetime(neg["date"]).dt.normalize().isin(hol).astype(int)
+
+    pos["sample_weight"] = 1.0
+    neg["sample_weight"] = neg_w
+
+    out = pd.concat([pos, neg], ignore_index=True)
+    out_codes = np.concatenate([codes, neg_codes])
+    return out.iloc[np.argsort(out_codes, kind="stable")].reset_index(drop=True)
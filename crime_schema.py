@@ -0,0 +1,107 @@
+# crime_schema.py
+# sf_crime_01 … sf_crime_08 zincir tabloları için ortak, kompakt dtype şeması.
+# - Tekrarlayan etiketler (GEOID, season, *_range, poi_dominant_type) → category
+# - Tarih → datetime64 (CSV'de yine 'YYYY-MM-DD')
+# - Gerçek 0/1 bayraklar ve küçük tamsayılar → int8, sayaçlar → int32
+# - Mesafeler, skorlar, hava ölçümleri ve grid ortalaması olan is_* oranları → float32
+# - latitude/longitude float64 kalır (mekânsal eşleme/mesafe hesapları bunlara dayanır)
+# Her adım okurken read_crime_csv, yazmadan önce compact kullanır; bellek önce/sonra yazdırılır.
+import numpy as np
+import pandas as pd
+
+LABEL_COLS = [
+    "GEOID", "season", "hour_range",
+    "distance_to_bus_range", "bus_stop_count_range",
+    "distance_to_train_range", "train_stop_count_range",
+    "poi_dominant_type", "poi_total_count_range", "poi_risk_score_range",
+    "distance_to_police_range", "distance_to_government_building_range",
+]
+DATE_COLS = ["date"]
+INT8_COLS = ["day_of_week", "event_hour", "Y_label", "is_near_police", "is_near_government"]
+INT32_COLS = [
+    "crime_count",
+    "911_request_count_hour_range", "911_request_count_daily(before_24_hours)",
+    "311_request_count", "population",
+    "bus_stop_count", "train_stop_count", "poi_total_count",
+]
+FLOAT32_COLS = [
+    "is_weekend", "is_night", "is_holiday", "is_school_hour", "is_business_hour",
+    "distance_to_bus", "distance_to_train", "distance_to_police", "distance_to_government_building",
+    "poi_risk_score",
+    "temp_max", "temp_min", "temp_range", "precipitation_mm",
+]
+SCHEMA = {
+    **{c: "category" for c in LABEL_COLS},
+    **{c: "date" for c in DATE_COLS},
+    **{c: "int8" for c in INT8_COLS},
+    **{c: "int32" for c in INT32_COLS},
+    **{c: "float32" for c in FLOAT32_COLS},
+}
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def _to_int(s: pd.Series, dtype: str) -> pd.Series:
+    """Eksik ya da tam sayı olmayan değer varsa float32'ye, taşma varsa olduğu gibi bırakır."""
+    num = pd.to_numeric(s, errors="coerce")
+    if num.isna().any() or (num.dtype.kind == "f" and not np.array_equal(num, np.round(num))):
+        return num.astype("float32")
+    info = np.iinfo(dtype)
+    if len(num) and (num.min() < info.min or num.max() > info.max):
+        return num
+    return num.astype(dtype)
+
+
+def _to_date(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_dtype(s):
+        return s
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype("category")
+    cats = pd.to_datetime(pd.Series(s.cat.categories), errors="coerce").to_numpy()
+    codes = s.cat.codes.to_numpy()
+    return pd.Series(np.where(codes >= 0, cats[codes.clip(0)] if len(cats) else np.datetime64("NaT"),
+                              np.datetime64("NaT")), index=s.index).astype("datetime64[ns]")
+
+
+def cast_column(s: pd.Series, kind: str) -> pd.Series:
+    if kind == "category":
+        return s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+    if kind == "date":
+        return _to_date(s)
+    if kind == "float32":
+        return pd.to_numeric(s, errors="coerce").astype("float32")
+    return _to_int(s, kind)
+
+
+def compact(df: pd.DataFrame, name: str = None) -> pd.DataFrame:
+    """Şemadaki kolonları kompakt tiplere çevirir (şemada olmayanlar aynen kalır)."""
+    before = memory_mb(df) if name else 0.0
+    casts = {c: cast_column(df[c], kind) for c, kind in SCHEMA.items()
+             if c in df.columns and not isinstance(df[c], pd.DataFrame)}
+    df = df.assign(**casts) if casts else df
+    if name:
+        print(f"🧮 {name}: bellek {before:.1f} MB → {memory_mb(df):.1f} MB")
+    return df
+
+
+def read_dtypes(columns=None) -> dict:
+    """read_csv için açık dtype eşlemesi (etiket/tarih → category, float32 kolonlar doğrudan)."""
+    out = {}
+    for c, kind in SCHEMA.items():
+        if columns is not None and c not in columns:
+            continue
+        if kind in ("category", "date"):
+            out[c] = "category"
+        elif kind == "float32":
+            out[c] = "float32"
+    return out
+
+
+def read_crime_csv(path: str, usecols=None) -> pd.DataFrame:
+    """Zincir tablosunu şema tipleriyle okur (tip çıkarımı yalnızca şema dışı kolonlarda)."""
+    df = pd.read_csv(path, dtype=read_dtypes(usecols), usecols=usecols, low_memory=False)
+    df = compact(df)
+    print(f"📥 {path}: {len(df):,} satır, {df.shape[1]} kolon, {memory_mb(df):.1f} MB")
+    return df
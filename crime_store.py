@@ -0,0 +1,178 @@
+# crime_store.py
+# Yıl-ay bölümlü, sadece-ekleme (append-only) suç olay deposu (Parquet).
+#   crime_events/ym=2024-05.parquet, ym=2024-06.parquet, ...
+# - Yeni günler yalnızca ilgili ay dosyalarını (yeniden) yazar; geçmişin tamamı yeniden yazılmaz.
+# - 5 yıllık pencerenin dışına düşen aylar dosya olarak silinir.
+# - Okuyucular sadece ihtiyaç duydukları ayları ve kolonları tarar.
+# - track() açıkken eklenen/silinen satırlar toplanır (artımlı grid gibi türetilmiş durumlar için).
+# - Tekrar eden kayıtlar kalıcı 64-bit kimlik dizini (IdIndex) ile yalnızca yeni satırlar
+#   üzerinden elenir; ay dosyaları birleştirilip drop_duplicates yapılmaz.
+import os
+import re
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from id_index import IdIndex, hash_ids
+
+PART_RE = re.compile(r"^ym=(\d{4}-\d{2})\.parquet$")
+
+
+def month_key(d) -> str:
+    d = pd.Timestamp(d)
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+class CrimeEventStore:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._track = None
+        self._added, self._removed = [], []
+        self._index = None
+
+    @property
+    def index(self) -> IdIndex:
+        """Kimlik dizini; ilk kullanımda yüklenir ve depoyla hizalanır."""
+        if self._index is None:
+            self._index = IdIndex(self.root / "_id_index.npz")
+            rebuilt = self._index.sync(self)
+            if rebuilt:
+                print(f"🔑 Kimlik dizini {len(rebuilt)} ay için yeniden kuruldu ({len(self._index)} kimlik)")
+                self._index.save()
+        return self._index
+
+    # ---------- bölümler ----------
+    def path_for(self, ym: str) -> Path:
+        return self.root / f"ym={ym}.parquet"
+
+    def months(self) -> list:
+        out = []
+        for p in self.root.iterdir():
+            m = PART_RE.match(p.name)
+            if m:
+                out.append(m.group(1))
+        return sorted(out)
+
+    def is_empty(self) -> bool:
+        return not self.months()
+
+    def row_counts(self) -> dict:
+        """{ay: satır_sayısı}; yalnızca Parquet üst verisi okunur."""
+        return {ym: int(pq.read_metadata(self.path_for(ym)).num_rows) for ym in self.months()}
+
+    # ---------- değişiklik takibi ----------
+    def track(self, columns):
+        """Bundan sonraki upsert/expire çağrılarında eklenen ve silinen satırları (bu kolonlarla) toplar."""
+        self._track = list(columns)
+        self._added, self._removed = [], []
+
+    def changes(self):
+        """(eklenen_satırlar, silinen_satırlar) — track() sonrası biriken değişiklikler."""
+        def _cat(frames):
+            frames = [f for f in frames if not f.empty]
+            if not frames:
+                return pd.DataFrame(columns=self._track or [])
+            return pd.concat(frames, ignore_index=True)
+        return _cat(self._added), _cat(self._removed)
+
+    # ---------- okuma ----------
+    def read_month(self, ym: str, columns=None) -> pd.DataFrame:
+        path = self.path_for(ym)
+        if not path.exists():
+            return pd.DataFrame(columns=columns or [])
+        return pd.read_parquet(path, columns=columns)
+
+    def read(self, start=None, end=None, columns=None) -> pd.DataFrame:
+        """[start, end] ay aralığındaki bölümleri (istenen kolonlarla) okur."""
+        lo = month_key(start) if start is not None else None
+        hi = month_key(end) if end is not None else None
+        parts = [
+            self.read_month(ym, columns)
+            for ym in self.months()
+            if (lo is None or ym >= lo) and (hi is None or ym <= hi)
+        ]
+        parts = [p for p in parts if not p.empty]
+        if not parts:
+            return pd.DataFrame(columns=columns or [])
+        return pd.concat(parts, ignore_index=True)
+
+    def max_date(self):
+        """En son bölümdeki en büyük tarih (yalnızca son ayın 'date' kolonu okunur)."""
+        for ym in reversed(self.months()):
+            d = self.read_month(ym, columns=["date"])["date"]
+            d = pd.to_datetime(d, errors="coerce").dropna()
+            if not d.empty:
+                return d.max().date()
+        return None
+
+    # ---------- yazma ----------
+    def write_month(self, ym: str, df: pd.DataFrame):
+        path = self.path_for(ym)
+        if df.empty:
+            if path.exists():
+                path.unlink()
+            return
+        tmp = path.with_suffix(".parquet.tmp")
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)  # atomik: yarım yazılmış bölüm kalmaz
+
+    def upsert(self, df_new: pd.DataFrame, key: str = "id") -> dict:
+        """Yeni satırları ay bölümlerine ekler. Aynı kimlik (`id`) varsa mevcut satır korunur.
+
+        Tekrarlar kimlik dizininden elenir; maliyet geçmişle değil yeni satır sayısıyla büyür.
+        Dönüş: {ay: eklenen_satır_sayısı}
+        """
+        if df_new.empty:
+            return {}
+        df_new = df_new.drop_duplicates(subset=key, keep="first")
+        hashes = hash_ids(df_new[key])
+        fresh = ~self.index.seen(df_new[key], hashes, self)
+        df_new, hashes = df_new[fresh], hashes[fresh]
+        if df_new.empty:
+            return {}
+
+        yms = pd.to_datetime(df_new["date"]).dt.strftime("%Y-%m").to_numpy()
+        added = {}
+        for ym in sorted(set(yms)):
+            sel = yms == ym
+            part = df_new[sel]
+            old = self.read_month(ym)
+            merged = pd.concat([old, part], ignore_index=True) if not old.empty else part.reset_index(drop=True)
+            added[ym] = len(part)
+            if self._track is not None:
+                self._added.append(part[self._track])
+            self.write_month(ym, merged)
+            self.index.add(ym, hashes[sel])
+        self.index.save()
+        return added
+
+    def expire(self, start_date: date) -> list:
+        """start_date'ten eski ayları siler; sınır ayında sadece eski satırları ayıklar."""
+        start_ym = month_key(start_date)
+        dropped, dropped_rows = [], False
+        for ym in self.months():
+            if ym < start_ym:
+                if self._track is not None:
+                    self._removed.append(self.read_month(ym, columns=self._track))
+                self.path_for(ym).unlink()
+                self.index.drop_month(ym)
+                dropped.append(ym)
+            elif ym == start_ym:
+                part = self.read_month(ym)
+                keep = pd.to_datetime(part["date"]).dt.date >= start_date
+                if not keep.all():
+                    if self._track is not None:
+                        self._removed.append(part.loc[~keep, self._track])
+                    self.write_month(ym, part[keep].reset_index(drop=True))
+                    self.index.set_month(ym, part.loc[keep, "id"])
+                    dropped_rows = True
+        if dropped or dropped_rows:
+            self.index.save()  # pencere dışına düşen kimlikler dizinden de çıkar
+        return dropped
+
+    def export_csv(self, path: str, columns=None):
+        """Eski araçlar için tek parça CSV dışa aktarımı (isteğe bağlı)."""
+        self.read(columns=columns).to_csv(path, index=False)
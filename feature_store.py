@@ -0,0 +1,287 @@
+# feature_store.py
+# sf_crime_01 → 08 CSV zincirinin yerine satır hizalı, kolon bazlı özellik deposu.
+#   crime_data/features/base.parquet        ← update_911 (grid + 911 kolonları; sf_crime_01'in karşılığı)
+#   crime_data/features/<adım>.parquet      ← her adımın yalnızca kendi kolonları (+ varsa _keep)
+#   crime_data/features/_manifest.json      ← dosya özetleri, kolon listeleri, base bağlantısı
+# - Yan dosyalar (sidecar) base ile satır konumu üzerinden hizalıdır; anahtar kolonu yoktur.
+# - Satır eleyen adımlar `_keep` kolonu yazar; sonraki adımların görünümü bu maskelerle süzülür.
+# - Base yeniden yazılınca eski base'e bağlı yan dosyalar bayat sayılır ve görünüme girmez.
+# - Her adım yalnızca bildirdiği giriş kolonlarını okur (CRIME_INPUT_COLS) ve yalnızca kendi çıkış
+#   kolonlarını yazar; önceki kolonlar yeniden ayrıştırılmaz/biçimlendirilmez.
+# - sf_crime_08 en sonda update_weather'da export_csv ile dışa aktarılır. Ara tablolar
+#   (crime_data/sf_crime_01..07.csv) run_full_pipeline.py ve dış okuyucular için varsayılan olarak
+#   her adımın ardından görünümden yazılmaya devam eder; FEATURE_EXPORT_CHAIN_CSV=0 ile kapatılır.
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from crime_schema import compact, memory_mb
+from source_freshness import file_token
+
+ROOT = os.path.join("crime_data", "features")
+STEPS = ("311", "population", "bus", "train", "poi", "police_gov", "weather")
+KEEP_COL = "_keep"
+EXPORT_ROWS = 500_000  # dışa aktarımda bellekte aynı anda tutulan satır sayısı
+EXPORT_DIR = "crime_data"  # ara zincir CSV'lerinin (sf_crime_01..07) yeri
+EXPORT_CHAIN = os.environ.get("FEATURE_EXPORT_CHAIN_CSV", "1") == "1"
+
+
+def _arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Kategorikler sabit (int32) indeksli sözlük olarak yazılır → parçalar arası şema aynı kalır."""
+    arrays = {}
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy().astype("int32")
+            arrays[c] = pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=codes < 0),
+                pa.array(s.cat.categories.astype(str).to_numpy(dtype=object), type=pa.string()),
+            )
+        else:
+            arrays[c] = pa.array(s.to_numpy(), from_pandas=True)
+    return pa.table(arrays)
+
+
+def _scatter(s: pd.Series, rows: np.ndarray, n: int) -> pd.Series:
+    """Görünüm satırlarındaki değerleri base uzunluğuna yayar (görünüm dışı satırlar doldurulur)."""
+    if len(rows) == n:
+        return s.reset_index(drop=True)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = np.full(n, -1, dtype="int32")
+        codes[rows] = s.cat.codes.to_numpy()
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=s.dtype))
+    vals = s.to_numpy()
+    if vals.dtype.kind in "iub":
+        out = np.zeros(n, dtype=vals.dtype)  # görünüm dışı satırlar zaten maskeli; tip korunur
+    elif vals.dtype.kind in "fMm":
+        out = np.full(n, np.nan if vals.dtype.kind == "f" else np.datetime64("NaT"), dtype=vals.dtype)
+    else:
+        out = np.full(n, None, dtype=object)
+    out[rows] = vals
+    return pd.Series(out)
+
+
+def _write_parquet(df_or_chunks, path: Path, meta: dict = None) -> int:
+    """Tek çerçeve ya da parça akışını atomik olarak Parquet'e yazar. Dönüş: satır sayısı."""
+    chunks = [df_or_chunks] if isinstance(df_or_chunks, pd.DataFrame) else df_or_chunks
+    tmp = path.with_suffix(".parquet.tmp")
+    writer, n = None, 0
+    try:
+        for chunk in chunks:
+            table = _arrow_table(chunk)
+            if writer is None:
+                schema = table.schema.with_metadata({"feature_store": json.dumps(meta or {})})
+                writer = pq.ParquetWriter(tmp, schema)
+            writer.write_table(table.cast(writer.schema))
+            n += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, path)
+    return n
+
+
+class FeatureStore:
+    def __init__(self, root: str = ROOT):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / "_manifest.json"
+        self.manifest = {"base": None, "sidecars": {}}
+        self._warned = set()
+        if self.manifest_path.exists():
+            try:
+                self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+                self.manifest.setdefault("sidecars", {})
+            except Exception as e:
+                print(f"⚠️ Özellik deposu manifest'i okunamadı ({self.manifest_path}): {e}")
+
+    # ---------- yollar / durum ----------
+    @property
+    def base_path(self) -> Path:
+        return self.root / "base.parquet"
+
+    def sidecar_path(self, step: str) -> Path:
+        return self.root / f"{step}.parquet"
+
+    def _save_manifest(self):
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def n_rows(self) -> int:
+        base = self.manifest.get("base")
+        if not base or not self.base_path.exists():
+            raise FileNotFoundError(f"❌ Özellik deposunda base yok: {self.base_path} (önce update_911.py)")
+        return int(base["rows"])
+
+    def _live_steps(self, upto: str = None) -> list:
+        """upto'dan önceki (upto=None → tümü), base ile güncel yan dosyalar (STEPS sırasıyla)."""
+        base_token = (self.manifest.get("base") or {}).get("token")
+        out = []
+        for step in STEPS:
+            if step == upto:
+                break
+            entry = self.manifest["sidecars"].get(step)
+            if not entry or not self.sidecar_path(step).exists():
+                continue
+            if entry.get("base") != base_token:
+                if step not in self._warned:
+                    self._warned.add(step)
+                    print(f"⚠️ {step} yan dosyası eski bir base'e ait; görünüme alınmadı.")
+                continue
+            out.append(step)
+        return out
+
+    def _providers(self, upto: str = None) -> dict:
+        """kolon → (dosya yolu, adım); sonraki adımın aynı adlı kolonu öncekinin yerine geçer."""
+        prov = {c: (self.base_path, None) for c in self.manifest["base"]["columns"]}
+        for step in self._live_steps(upto):
+            for c in self.manifest["sidecars"][step]["columns"]:
+                prov.pop(c, None)
+                prov[c] = (self.sidecar_path(step), step)
+        return prov
+
+    def columns(self, upto: str = None) -> list:
+        self.n_rows()
+        return list(self._providers(upto))
+
+    def _mask(self, upto: str = None) -> np.ndarray:
+        mask = np.ones(self.n_rows(), dtype=bool)
+        for step in self._live_steps(upto):
+            if self.manifest["sidecars"][step].get("filters"):
+                mask &= pq.read_table(self.sidecar_path(step), columns=[KEEP_COL])[KEEP_COL].to_numpy()
+        return mask
+
+    def token(self, columns, upto: str) -> str | None:
+        """Adımın girdisini belirleyen dosyaların birleşik özeti (tazelik kontrolü için); base yoksa None."""
+        if not self.manifest.get("base") or not self.base_path.exists():
+            return None
+        prov = self._providers(upto)
+        parts = [self.manifest["base"]["token"]]
+        for step in self._live_steps(upto):
+            entry = self.manifest["sidecars"][step]
+            if entry.get("filters") or any(prov.get(c, (None, None))[1] == step for c in columns):
+                parts.append(f"{step}:{entry['token']}")
+        return "|".join(parts)
+
+    # ---------- yazma ----------
+    def write_base(self, chunks, name: str = None) -> int:
+        """Base tabloyu (parça akışı ya da tek çerçeve) yazar; yan dosyalar bu base'e göre bayatlar.
+        name verilirse (sf_crime_01) base görünümü ayrıca zincir CSV'si olarak dışa aktarılır."""
+        cols = []
+
+        def _track(it):
+            for chunk in ([it] if isinstance(it, pd.DataFrame) else it):
+                if not cols:
+                    cols.extend(chunk.columns)
+                yield chunk
+
+        n = _write_parquet(_track(chunks), self.base_path)
+        self.manifest["base"] = {"token": file_token(str(self.base_path)), "rows": n, "columns": cols}
+        self._save_manifest()
+        print(f"🧱 Özellik deposu base → {self.base_path} ({n:,} satır, {len(cols)} kolon)")
+        self.export_chain(name)
+        return n
+
+    def write(self, step: str, new_cols: pd.DataFrame, keep=None, name: str = None) -> int:
+        """Adımın yeni kolonlarını yan dosya olarak yazar.
+
+        new_cols satırları adımın okuduğu görünümle (keep verilmişse görünümde kalan satırlarla)
+        aynı sıradadır. Dönüş: adım sonrası görünümdeki satır sayısı.
+        """
+        if step not in STEPS:
+            raise ValueError(f"Bilinmeyen adım: {step}")
+        n = self.n_rows()
+        view_pos = np.flatnonzero(self._mask(step))
+        rows = view_pos if keep is None else view_pos[np.asarray(keep, dtype=bool)]
+        if len(rows) != len(new_cols):
+            raise ValueError(f"{step}: görünümde {len(rows)} satır var ama {len(new_cols)} yeni satır geldi")
+
+        new_cols = compact(new_cols.reset_index(drop=True), name)
+        full = pd.DataFrame({c: _scatter(new_cols[c], rows, n) for c in new_cols.columns})
+        if keep is not None:
+            flag = np.ones(n, dtype=bool)
+            flag[view_pos] = False
+            flag[rows] = True
+            full[KEEP_COL] = flag
+        path = self.sidecar_path(step)
+        _write_parquet(full, path, meta={"step": step})
+        self.manifest["sidecars"][step] = {
+            "token": file_token(str(path)),
+            "base": self.manifest["base"]["token"],
+            "columns": list(new_cols.columns),
+            "filters": keep is not None,
+        }
+        self._save_manifest()
+        if step != STEPS[-1]:  # son adımın tablosu (sf_crime_08) update_weather'da her zaman yazılır
+            self.export_chain(name, step)
+        return len(rows)
+
+    def export_chain(self, name: str, step: str = None):
+        """Adım sonrası görünümü (step=None → base) crime_data/<name>.csv zincir tablosu olarak yazar."""
+        if not name or not EXPORT_CHAIN:
+            return
+        i = STEPS.index(step) + 1 if step is not None else 0
+        path = os.path.join(EXPORT_DIR, f"{name}.csv")
+        n = self.export_csv(path, upto=STEPS[i] if i < len(STEPS) else None)
+        print(f"📄 Zincir CSV → {path} ({n:,} satır)")
+
+    # ---------- okuma ----------
+    def read(self, columns, upto: str = None) -> pd.DataFrame:
+        """Görünümden (upto adımından önceki hâl) yalnızca istenen kolonları okur; satırlar 0..n-1."""
+        prov = self._providers(upto)
+        by_file = {}
+        for c in columns:
+            if c in prov:
+                by_file.setdefault(prov[c][0], []).append(c)
+        parts = [pq.read_table(path, columns=cols).to_pandas() for path, cols in by_file.items()]
+        df = pd.concat(parts, axis=1) if parts else pd.DataFrame(index=pd.RangeIndex(self.n_rows()))
+        df = df[[c for c in columns if c in df.columns]]
+        mask = self._mask(upto)
+        if not mask.all():
+            df = df[mask].reset_index(drop=True)
+        df = compact(df)
+        print(f"📥 Özellik deposu ({upto or 'son'}): {len(df):,} satır, {df.shape[1]} kolon, {memory_mb(df):.1f} MB")
+        return df
+
+    def export_csv(self, path: str, upto: str = None, rows_per_chunk: int = EXPORT_ROWS) -> int:
+        """Görünümü tek CSV olarak parça parça dışa aktarır (geçici dosya + yerine taşıma)."""
+        prov = self._providers(upto)
+        by_file = {}
+        for c, (p, _) in prov.items():
+            by_file.setdefault(p, []).append(c)
+        mask = self._mask(upto)
+        readers = [pq.ParquetFile(p).iter_batches(batch_size=rows_per_chunk, columns=cols)
+                   for p, cols in by_file.items()]
+        Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
+        tmp = path + ".tmp"
+        n, lo = 0, 0
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            pd.DataFrame(columns=list(prov)).to_csv(f, index=False)  # başlık
+            for frames in zip(*(_fixed_slices(r, rows_per_chunk) for r in readers)):
+                chunk = pd.concat(frames, axis=1)[list(prov)]
+                m = mask[lo:lo + len(chunk)]
+                lo += len(chunk)
+                chunk = chunk[m]
+                chunk.to_csv(f, index=False, header=False)
+                n += len(chunk)
+        os.replace(tmp, path)
+        return n
+
+
+def _fixed_slices(batches, size: int):
+    """Parquet parçalarını tam `size` satırlık DataFrame'lere böler (dosyalar arası hizalama için)."""
+    buf = None
+    for b in batches:
+        t = pa.Table.from_batches([b])
+        buf = t if buf is None else pa.concat_tables([buf, t])
+        while buf.num_rows >= size:
+            yield buf.slice(0, size).to_pandas().reset_index(drop=True)
+            buf = buf.slice(size)
+    if buf is not None and buf.num_rows:
+        yield buf.to_pandas().reset_index(drop=True)
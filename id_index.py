@@ -0,0 +1,80 @@
+# id_index.py
+# Olay kimlikleri için kalıcı, kompakt 64-bit özet (hash) dizini.
+# - Ay bölümü başına sıralı uint64 dizisi (crime_events/_id_index.npz); 5 yılda ~birkaç MB.
+# - Yeni kayıtlar O(yeni satır · log n) ile elenir: geçmiş okunup drop_duplicates yapılmaz.
+# - Özet eşleşmesi kesin sayılmaz: yalnızca eşleşen aylardan `id` kolonu okunup birebir
+#   karşılaştırılır (çakışma/collision güvenliği).
+# - Bölüm silinince ya da satır sayısı dizinle uyuşmayınca o ayın dizisi yeniden kurulur.
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def hash_ids(ids) -> np.ndarray:
+    """Kimlik metinlerinin sabit (çalıştırmalar arası aynı) 64-bit özetleri."""
+    s = pd.Series(ids, dtype=object).astype(str)
+    return pd.util.hash_pandas_object(s, index=False).to_numpy(dtype="uint64")
+
+
+class IdIndex:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.parts = {}  # ay → sıralı uint64 özetler
+        self.collisions = 0
+        if self.path.exists():
+            try:
+                with np.load(self.path) as z:
+                    self.parts = {ym: z[ym] for ym in z.files}
+            except Exception as e:
+                print(f"⚠️ Kimlik dizini okunamadı ({self.path}): {e}. Yeniden kurulacak.")
+                self.parts = {}
+
+    def __len__(self):
+        return sum(len(a) for a in self.parts.values())
+
+    # ---------- bakım ----------
+    def set_month(self, ym: str, ids):
+        self.parts[ym] = np.sort(hash_ids(ids))
+
+    def add(self, ym: str, hashes: np.ndarray):
+        cur = self.parts.get(ym, np.empty(0, dtype="uint64"))
+        self.parts[ym] = np.sort(np.concatenate([cur, hashes]))
+
+    def drop_month(self, ym: str):
+        self.parts.pop(ym, None)
+
+    def sync(self, store) -> list:
+        """Dizini deponun ay/satır sayılarıyla hizalar; uyuşmayan ayları `id` kolonundan yeniden kurar."""
+        counts = store.row_counts()
+        for ym in set(self.parts) - set(counts):
+            self.drop_month(ym)
+        rebuilt = [ym for ym, n in counts.items() if len(self.parts.get(ym, ())) != n]
+        for ym in rebuilt:
+            self.set_month(ym, store.read_month(ym, columns=["id"])["id"])
+        return rebuilt
+
+    def save(self):
+        tmp = self.path.with_suffix(".npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **self.parts)
+        os.replace(tmp, self.path)  # atomik
+
+    # ---------- sorgu ----------
+    def seen(self, ids: pd.Series, hashes: np.ndarray, store) -> np.ndarray:
+        """Her kimlik daha önce depoya yazılmış mı? (özet adayı + birebir doğrulama)"""
+        ids = ids.astype(str).to_numpy()
+        out = np.zeros(len(ids), dtype=bool)
+        for ym, arr in self.parts.items():
+            if not len(arr):
+                continue
+            pos = np.searchsorted(arr, hashes).clip(max=len(arr) - 1)
+            cand = (arr[pos] == hashes) & ~out
+            if not cand.any():
+                continue
+            month_ids = set(store.read_month(ym, columns=["id"])["id"].astype(str))
+            exact = np.fromiter((i in month_ids for i in ids[cand]), dtype=bool, count=int(cand.sum()))
+            self.collisions += int((~exact).sum())
+            out[np.flatnonzero(cand)[exact]] = True
+        return out
@@ -0,0 +1,110 @@
+# join_keys.py
+# Adımlar arası ortak, tamsayı kodlu birleştirme anahtarları.
+#   GEOID      → int64 (rakamların sayısal değeri; baştaki sıfırlar etikette geri eklenir)
+#   date       → int32 (1970-01-01'den beri gün)
+#   hour_range → int8  (3 saatlik dilim no: 0 = "0-3", ..., 7 = "21-24")
+# Eksik değerler sabit bir işaretçiye (NA_*) kodlanır; böylece pandas'ın NaN anahtarları
+# birbirine eşleme davranışı korunur.
+# Birleştirmeler (merge/groupby) bu sayısal kolonlarla yapılır; "060750101001", "2024-05-01",
+# "3-6" gibi okunur etiketler yalnızca dışa aktarımda (geoid_label, date_label,
+# hour_range_label) üretilir.
+import numpy as np
+import pandas as pd
+
+GEOID_KEY, DATE_KEY, HOUR_KEY = "_geoid_k", "_date_k", "_hour_k"
+NA_GEOID = np.int64(-1)
+NA_DATE = np.int32(np.iinfo(np.int32).min)
+NA_HOUR = np.int8(-1)
+HOURS_PER_RANGE = 3
+HOUR_RANGE_LABELS = np.array(
+    [f"{h}-{h + HOURS_PER_RANGE}" for h in range(0, 24, HOURS_PER_RANGE)], dtype=object
+)
+
+
+# ---------- kodlama ----------
+def _by_category(s: pd.Series, encode, na) -> np.ndarray:
+    """Kategorik kolonda her kategori bir kez kodlanır, satırlara kategori kodlarıyla dağıtılır."""
+    cats = np.append(encode(pd.Series(s.cat.categories)), na)
+    return cats[np.where(s.cat.codes.to_numpy() >= 0, s.cat.codes.to_numpy(), len(cats) - 1)]
+
+
+def geoid_code(s) -> np.ndarray:
+    """GEOID → int64. Metin, sayı ya da '6075...0.0' gibi ondalıklı biçimler aynı koda düşer."""
+    s = pd.Series(s).reset_index(drop=True)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return _by_category(s, geoid_code, NA_GEOID).astype("int64")
+    if pd.api.types.is_numeric_dtype(s):
+        num = s.astype("float64")
+    else:
+        num = pd.to_numeric(s, errors="coerce")
+        odd = num.isna() & s.notna()
+        if odd.any():  # rakam dışı karakter içerenler: ilk rakam dizisi (normalize_geoid ile aynı)
+            digits = s[odd].astype(str).str.extract(r"(\d+)")[0]
+            num = num.astype("float64")
+            num[odd] = pd.to_numeric(digits, errors="coerce")
+    return num.fillna(NA_GEOID).to_numpy().astype("int64")
+
+
+def date_code(s) -> np.ndarray:
+    """Tarih/zaman → int32 gün sayısı (1970-01-01 = 0). Saat kısmı atılır."""
+    s = pd.Series(s).reset_index(drop=True)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return _by_category(s, date_code, NA_DATE).astype("int32")
+    d = pd.to_datetime(s, errors="coerce")
+    days = d.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype("int64")
+    return np.where(d.isna().to_numpy(), NA_DATE, days).astype("int32")
+
+
+def hour_code(hours) -> np.ndarray:
+    """Saat (0-23) → int8 dilim no (saat // 3)."""
+    h = pd.to_numeric(pd.Series(hours).reset_index(drop=True), errors="coerce")
+    return (h // HOURS_PER_RANGE).fillna(NA_HOUR).to_numpy().astype("int8")
+
+
+def hour_range_code(labels) -> np.ndarray:
+    """"3-6" gibi hour_range etiketi → int8 dilim no."""
+    labels = pd.Series(labels).reset_index(drop=True)
+    if isinstance(labels.dtype, pd.CategoricalDtype):
+        return _by_category(labels, hour_range_code, NA_HOUR).astype("int8")
+    start = labels.astype(str).str.split("-", n=1).str[0]
+    return hour_code(pd.to_numeric(start, errors="coerce"))
+
+
+def with_keys(frame: pd.DataFrame, geoid=None, date=None, hour=None, hour_range=None) -> pd.DataFrame:
+    """Verilen kaynaklardan anahtar kolonlarını (GEOID_KEY, DATE_KEY, HOUR_KEY) ekler."""
+    keys = {}
+    if geoid is not None:
+        keys[GEOID_KEY] = geoid_code(geoid)
+    if date is not None:
+        keys[DATE_KEY] = date_code(date)
+    if hour is not None:
+        keys[HOUR_KEY] = hour_code(hour)
+    elif hour_range is not None:
+        keys[HOUR_KEY] = hour_range_code(hour_range)
+    return frame.assign(**keys)
+
+
+def drop_keys(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.drop(columns=[c for c in (GEOID_KEY, DATE_KEY, HOUR_KEY) if c in frame.columns])
+
+
+# ---------- etiketler (yalnızca dışa aktarımda) ----------
+def geoid_label(codes, target_len: int) -> pd.Series:
+    """int64 kod → baştaki sıfırları tamamlanmış GEOID metni (eksikler NaN)."""
+    uniq, inv = np.unique(np.asarray(codes, dtype="int64"), return_inverse=True)
+    labels = pd.Series(uniq.astype(str), dtype=object).str.zfill(int(target_len)).where(uniq != NA_GEOID)
+    return pd.Series(labels.to_numpy()[inv.ravel()])
+
+
+def date_label(codes) -> pd.Series:
+    """int32 gün → datetime64 (gece yarısı; CSV'ye 'YYYY-MM-DD' olarak yazılır)."""
+    codes = np.asarray(codes, dtype="int64")
+    d = pd.Series(codes.astype("datetime64[D]").astype("datetime64[ns]"))
+    return d.where(codes != NA_DATE)
+
+
+def hour_range_label(codes) -> pd.Series:
+    """int8 dilim no → "0-3", ..., "21-24" (eksikler NaN)."""
+    codes = np.asarray(codes, dtype="int64")
+    ok = (codes >= 0) & (codes < len(HOUR_RANGE_LABELS))
+    return pd.Series(HOUR_RANGE_LABELS[np.where(ok, codes, 0)]).where(ok)
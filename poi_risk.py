@@ -0,0 +1,92 @@
+# poi_risk.py
+# Dinamik POI riski için kalıcı, artımlı durum: POI başına yarıçap içindeki suç noktası sayısı.
+#   crime_data/_cache/poi_risk_state.npz  ← POI koordinatları, sayılar, sayıların hesaplandığı suç noktaları
+#   (gitignore'daki önbellek dizini; CI'da actions/cache ile korunur, git'e işlenmez)
+# - Yeni çalıştırmada suç noktaları önceki kümeyle (çoklu küme olarak) karşılaştırılır; yalnızca eklenen
+#   noktalar POI ağacında sorgulanıp sayılara eklenir, çıkan noktalar çıkarılır. Yeni günler yalnızca
+#   dokundukları grid hücrelerinin noktalarını, pencereden düşen günler de kendi hücrelerini değiştirir.
+# - POI kümesi ya da yarıçap değişirse (key) durum baştan kurulur; tam kurulum ve artımlı güncelleme
+#   aynı tamsayı sayıları verir (her ikisi de "mesafe <= r" çiftlerini sayar).
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+
+def _as_keys(pts: np.ndarray) -> np.ndarray:
+    """(n, 2) radyan koordinat → n adet complex128 (bit düzeyinde aynı; tekil/çoklu küme işlemleri için)."""
+    return np.ascontiguousarray(pts, dtype="float64").view("complex128").ravel()
+
+
+def _from_keys(keys: np.ndarray) -> np.ndarray:
+    return keys.view("float64").reshape(-1, 2)
+
+
+def poi_key(poi_pts: np.ndarray, r: float) -> str:
+    """POI koordinatları + yarıçap özeti; değişirse sayılar geçersizdir."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(poi_pts, dtype="float64").tobytes())
+    h.update(np.float64(r).tobytes())
+    return h.hexdigest()
+
+
+class PoiRiskState:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.key = None
+        self.poi = np.zeros((0, 2))
+        self.counts = np.zeros(0, dtype="int64")
+        self.points = np.zeros(0, dtype="complex128")
+        self.r = 0.0
+
+    # ---------- kalıcılık ----------
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        try:
+            with np.load(self.path) as z:
+                self.key = str(z["key"])
+                self.r = float(z["r"])
+                self.poi, self.counts, self.points = z["poi"], z["counts"], z["points"]
+            return True
+        except Exception as e:
+            print(f"⚠️ POI risk durumu okunamadı ({self.path}): {e}. Yeniden kurulacak.")
+            self.key = None
+            return False
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, key=np.array(self.key), r=np.float64(self.r),
+                     poi=self.poi, counts=self.counts, points=self.points)
+        os.replace(tmp, self.path)  # atomik
+
+    # ---------- güncelleme ----------
+    def reset(self, key: str, poi_pts: np.ndarray, r: float, crime_pts: np.ndarray, counts: np.ndarray):
+        """Tam kurulum sonucunu (tüm suç noktaları üzerinden sayılar) durum olarak alır."""
+        self.key, self.r = key, float(r)
+        self.poi = np.ascontiguousarray(poi_pts, dtype="float64")
+        self.counts = np.asarray(counts, dtype="int64")
+        self.points = _as_keys(crime_pts).copy()
+
+    def update(self, crime_pts: np.ndarray) -> tuple:
+        """Suç noktalarını yeni kümeye taşır: eklenenleri sayar, çıkanları düşer.
+
+        Dönüş: (eklenen nokta sayısı, çıkan nokta sayısı).
+        """
+        new = _as_keys(crime_pts)
+        uniq, inv = np.unique(np.concatenate([self.points, new]), return_inverse=True)
+        sign = np.r_[np.full(len(self.points), -1, dtype="int64"), np.ones(len(new), dtype="int64")]
+        net = np.bincount(inv.ravel(), weights=sign, minlength=len(uniq)).astype("int64")
+        changed = np.flatnonzero(net)
+        if len(changed) and len(self.poi):
+            ids = BallTree(self.poi, metric="haversine").query_radius(_from_keys(uniq[changed]), r=self.r)
+            hits = np.fromiter((len(i) for i in ids), dtype="int64", count=len(ids))
+            flat = np.concatenate(ids).astype("int64") if hits.sum() else np.zeros(0, dtype="int64")
+            delta = np.bincount(flat, weights=np.repeat(net[changed], hits), minlength=len(self.poi))
+            self.counts = self.counts + delta.astype("int64")
+        self.points = new.copy()
+        return int(net[net > 0].sum()), int(-net[net < 0].sum())
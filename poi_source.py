@@ -0,0 +1,179 @@
+# poi_source.py
+# POI GeoJSON'u (OSM dökümü) için sütunlu okuyucu + kaynak özetine bağlı önbellek.
+# - GDAL/ogr2ogr düzenindeki dosyalar (satır başına bir Feature) satır satır akıtılır; her Feature tek
+#   json.loads ile çözülür ve amenity/shop/leisure/name doğrudan tipli kolon listelerine alınır
+#   (GeoDataFrame'e okuma, tag metnini yeniden ayrıştırma ve satır satır .apply yok).
+# - Başka düzendeki dosyalar (çok satırlı/tek satır) bir kez json.load ile okunur, aynı çıkarım uygulanır.
+# - tags metin olarak gelirse (ör. Python dict repr'i) yalnızca o satırlar eski yedek ayrıştırıcıya
+#   (json → literal_eval) düşer; normal GeoJSON'da bu yol hiç çalışmaz.
+# - Sonuç tablo crime_data/_cache/poi_features.parquet'e kaynak dosyanın içerik özetiyle yazılır;
+#   dosya değişmedikçe yeniden ayrıştırılmaz.
+#   CI'da aynı dizin actions/cache ile korunur (anahtar: blok + POI geojson özetleri).
+import ast
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+from source_freshness import file_token
+
+CACHE_DIR = os.environ.get("POI_CACHE_DIR", os.path.join("crime_data", "_cache"))
+CATEGORY_KEYS = ("amenity", "shop", "leisure")
+COLUMNS = ["id", "lat", "lon", "poi_category", "poi_subcategory", "poi_name"]
+WGS84_NAMES = {"urn:ogc:def:crs:OGC:1.3:CRS84", "urn:ogc:def:crs:EPSG::4326", "EPSG:4326", "CRS84"}
+CACHE_VERSION = 1  # kolonlar/çıkarım değişince artırılır → eski önbellek yeniden kurulur
+
+
+def _tags_from_text(val: str) -> dict:
+    """Metin tags için yedek yol: önce json, olmazsa Python literal'i (dict değilse boş)."""
+    for loader in (json.loads, ast.literal_eval):
+        try:
+            x = loader(val)
+            return x if isinstance(x, dict) else {}
+        except Exception:
+            pass
+    return {}
+
+
+class _Columns:
+    """Feature'lardan doğrudan kolon listeleri toplar."""
+
+    def __init__(self):
+        self.cols = {c: [] for c in COLUMNS}
+        self.x, self.y, self.other_geoms = [], [], {}
+        self.text_tags = 0
+
+    def add(self, feat: dict):
+        props = feat.get("properties") or {}
+        tags = props.get("tags")
+        if isinstance(tags, str):
+            tags = _tags_from_text(tags)
+            self.text_tags += 1
+        elif not isinstance(tags, dict):
+            tags = {}
+        cat = sub = None
+        for key in CATEGORY_KEYS:
+            if tags.get(key):
+                cat, sub = key, tags[key]
+                break
+        c = self.cols
+        c["id"].append(props.get("id"))
+        c["lat"].append(props.get("lat"))
+        c["lon"].append(props.get("lon"))
+        c["poi_category"].append(cat)
+        c["poi_subcategory"].append(sub)
+        c["poi_name"].append(tags.get("name"))
+
+        geom = feat.get("geometry") or {}
+        coords = geom.get("coordinates")
+        if geom.get("type") == "Point" and coords:
+            self.x.append(coords[0]); self.y.append(coords[1])
+        else:  # nokta olmayan / eksik geometri: GEOID için şekil olarak tutulur
+            if geom:
+                self.other_geoms[len(self.x)] = json.dumps(geom)
+            self.x.append(np.nan); self.y.append(np.nan)
+
+    def frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.cols)
+        for c in ("lat", "lon"):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+        df["geom_x"] = np.asarray(self.x, dtype="float64")
+        df["geom_y"] = np.asarray(self.y, dtype="float64")
+        wkb = np.full(len(df), None, dtype=object)
+        for i, text in self.other_geoms.items():
+            wkb[i] = shapely.to_wkb(shapely.from_geojson(text))
+        df["geom_wkb"] = wkb
+        return df
+
+
+def _crs_name(header: str):
+    m = re.search(r'"crs"\s*:\s*\{.*?"name"\s*:\s*"([^"]+)"', header, re.S)
+    return m.group(1) if m else None
+
+
+def _iter_lines(path: str):
+    """(crs adı, Feature üreteci) — satır başına bir Feature düzeni. Düzen uymazsa ValueError."""
+    f = open(path, encoding="utf-8")
+    header = []
+    for line in f:
+        header.append(line)
+        if line.lstrip().startswith('"features"'):
+            break
+    if not header or not header[-1].rstrip().endswith("["):
+        f.close()
+        raise ValueError("satır başına Feature düzeni değil")
+
+    def _feats():
+        with f:
+            for line in f:
+                s = line.strip().rstrip(",")
+                if s.startswith("{"):
+                    yield json.loads(s)  # çok satırlı Feature → JSONDecodeError (ValueError)
+                elif s and not s.startswith("]") and s != "}":
+                    raise ValueError("satır başına Feature düzeni değil")
+    return _crs_name("".join(header)), _feats()
+
+
+def parse_poi_geojson(path: str) -> pd.DataFrame:
+    """GeoJSON → id, lat, lon, poi_category, poi_subcategory, poi_name (+ geometri kolonları)."""
+    try:
+        crs, feats = _iter_lines(path)
+        cols = _Columns()
+        for feat in feats:
+            cols.add(feat)
+    except ValueError:  # başka düzen: belge bir kez bütün olarak okunur
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f)
+        crs = ((doc.get("crs") or {}).get("properties") or {}).get("name")
+        cols = _Columns()
+        for feat in doc.get("features") or []:
+            cols.add(feat)
+    df = cols.frame()
+    if cols.text_tags:
+        print(f"ℹ️ {cols.text_tags} POI'de tags metin olarak geldi (yedek ayrıştırıcı kullanıldı).")
+    if crs and crs not in WGS84_NAMES:  # geometri başka CRS'te → WGS84'e (lat/lon özellikleri zaten WGS84)
+        from pyproj import Transformer
+        tr = Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
+        df["geom_x"], df["geom_y"] = tr.transform(df["geom_x"].to_numpy(), df["geom_y"].to_numpy())
+    return df
+
+
+def geometries(df: pd.DataFrame) -> np.ndarray:
+    """Tablodaki geometri kolonlarından shapely dizisi (noktalar vektörel kurulur)."""
+    geoms = shapely.points(df["geom_x"].to_numpy(), df["geom_y"].to_numpy())
+    geoms[np.isnan(df["geom_x"].to_numpy())] = None
+    other = df["geom_wkb"].notna().to_numpy()
+    if other.any():
+        geoms[other] = shapely.from_wkb(df["geom_wkb"].to_numpy()[other])
+    return geoms
+
+
+def load_poi_features(path: str, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """parse_poi_geojson sonucu; kaynak dosya özeti aynıysa önbellekten okunur."""
+    token = f"{CACHE_VERSION}:{file_token(path)}"
+    cache_path = Path(cache_dir) / "poi_features.parquet"
+    if cache_path.exists():
+        try:
+            meta = pq.read_schema(cache_path).metadata or {}
+            if meta.get(b"source_token", b"").decode() == token:
+                df = pd.read_parquet(cache_path)
+                print(f"🗃️ POI tablosu önbellekten: {len(df):,} satır ({cache_path})")
+                return df
+        except Exception as e:
+            print(f"⚠️ POI önbelleği okunamadı ({cache_path}): {e}")
+
+    df = parse_poi_geojson(path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"source_token": token.encode()})
+    tmp = cache_path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, cache_path)
+    print(f"🧾 POI tablosu ayrıştırıldı: {len(df):,} satır → {cache_path}")
+    return df
@@ -0,0 +1,59 @@
+# bench_poi_metrics.py
+# update_poi._neighbor_metrics ile eski satır döngüsünün (pandas .sum() / value_counts().idxmax())
+# karşılaştırması: süre + sonuç denetimi (sentetik CSR komşu listeleri, tohumlu).
+# Sayı, risk toplamı (bit düzeyinde) ve baskın alt-kategori (eşitlikler dahil) birebir aynı olmalı;
+# tek bir fark bile çıkış kodunu 1 yapar. Doğruluk sınaması tests/test_poi_equivalence.py'dedir.
+# Kullanım (depo kökünden): python -m scripts.bench_poi_metrics [--rows 50000] [--pois 3000] [--subs 40] [--max-nb 120]
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from tests.poi_baseline import neighbor_metrics_loop
+from update_poi import _neighbor_metrics
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--pois", type=int, default=3_000)
+    ap.add_argument("--subs", type=int, default=40)
+    ap.add_argument("--max-nb", type=int, default=120)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sub_names = np.array([f"sub_{i}" for i in range(args.subs)], dtype=object)
+    poi_types = pd.Series(sub_names[rng.integers(0, args.subs, args.pois)])
+    poi_risks = pd.Series(np.round(rng.uniform(0, 3, args.pois), 2))
+    counts = rng.integers(0, args.max_nb + 1, args.rows)
+    counts[rng.random(args.rows) < 0.1] = 0  # komşusuz satırlar
+    flat = rng.integers(0, args.pois, int(counts.sum()))
+    idxs = np.split(flat, np.cumsum(counts)[:-1])
+
+    t0 = time.perf_counter()
+    ref_tot, ref_risk, ref_dom = map(np.asarray, neighbor_metrics_loop(idxs, poi_types, poi_risks))
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    sub_codes, names = pd.factorize(poi_types)
+    tot, risk, dom = _neighbor_metrics(counts, flat, sub_codes, poi_risks.to_numpy())
+    dom = np.append(np.asarray(names, dtype=object), "No_POI")[dom]
+    t_new = time.perf_counter() - t0
+
+    n_tot = int((tot != ref_tot).sum())
+    n_risk = int((risk != ref_risk).sum())
+    n_dom = int((dom != ref_dom.astype(object)).sum())
+
+    print(f"📏 {args.rows:,} satır, {int(counts.sum()):,} komşu, {args.subs} alt-kategori")
+    print(f"⏱️ eski döngü {t_ref:.2f}s → vektörel {t_new:.3f}s (~{t_ref / max(t_new, 1e-9):.0f}x)")
+    print(f"🔍 farklı satırlar → sayı: {n_tot} | risk: {n_risk} | baskın tür: {n_dom}")
+    ok = not (n_tot or n_risk or n_dom)
+    print("✅ Sonuçlar uyumlu." if ok else "❌ Sonuçlar eski döngüyle uyumsuz!")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
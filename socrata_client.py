@@ -0,0 +1,278 @@
+# socrata_client.py
+# data.sfgov.org (Socrata SODA) için ortak, havuzlu HTTP istemcisi.
+# - Kalıcı keep-alive oturum (requests.Session + bağlantı havuzu), gzip
+# - 429/5xx ve ağ hatalarında üstel geri çekilme (exponential backoff)
+# - Keyset sayfalama: $order=:id + $where=:id > 'son_id' (büyük offset'lerde yavaşlamaz)
+# - Thread'ler arası ortak istek/sn sınırlayıcı
+# - Verim sayaçları: sayfa, bayt, satır, satır/sn
+# - Veri kümesi başına beyan edilmiş şema ile tipli, kolon bazlı çözümleme (TypedBuffer)
+import os
+import time
+import threading
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+SOCRATA_DOMAIN = "https://data.sfgov.org"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Veri kümesi şemaları: kolon → tür ("str", "float", "int", "datetime", "category").
+# Sayfalar bu şemaya göre doğrudan kolon tamponlarına yazılır; tip tahmini yapılmaz,
+# böylece sayfadan sayfaya object/float kayması olmaz.
+SCHEMAS = {
+    # SFPD olay raporları
+    "wg3w-h783": {
+        "incident_datetime": "datetime",
+        "row_id": "str",
+        "incident_id": "str",
+        "incident_number": "str",
+        "cad_number": "str",
+        "latitude": "float",
+        "longitude": "float",
+        "incident_category": "category",
+        "incident_subcategory": "category",
+    },
+    # 311 talepleri
+    "vw6y-z8j6": {
+        "service_request_id": "str",
+        "requested_datetime": "datetime",
+        "lat": "float",
+        "long": "float",
+    },
+    # Muni durakları
+    "i28k-bkz6": {
+        "stop_id": "str",
+        "stop_name": "str",
+        "latitude": "float",
+        "longitude": "float",
+    },
+}
+
+
+class TypedBuffer:
+    """Sayfaları kolon başına listelerde biriktirir; tipli DataFrame'e tek seferde dönüştürür."""
+
+    def __init__(self, schema: dict):
+        self.schema = dict(schema)
+        self.cols = {c: [] for c in self.schema}
+        self.n = 0
+
+    def extend(self, records: list):
+        for col, buf in self.cols.items():
+            buf.extend(r.get(col) for r in records)
+        self.n += len(records)
+
+    def __len__(self):
+        return self.n
+
+    @staticmethod
+    def _convert(vals: list, kind: str) -> pd.Series:
+        if kind == "float":
+            s = pd.Series(vals, dtype=object)
+            try:
+                return s.astype("float64")  # float() ile tam (bit-bit) dönüşüm; None → NaN
+            except (TypeError, ValueError):
+                return pd.to_numeric(s, errors="coerce").astype("float64")
+        if kind == "int":
+            return pd.to_numeric(pd.Series(vals, dtype=object), errors="coerce").astype("Int64")
+        if kind == "datetime":
+            # Socrata floating timestamp: 2024-01-31T13:45:00.000
+            return pd.to_datetime(pd.Series(vals, dtype=object), format="ISO8601", errors="coerce")
+        s = pd.Series(vals, dtype=object)
+        s = s.where(s.notna(), np.nan)  # eksikler None değil NaN olsun (astype(str) → "nan")
+        return s.astype("category") if kind == "category" else s
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({c: self._convert(v, self.schema[c]) for c, v in self.cols.items()})
+
+
+class RateLimiter:
+    """Thread'ler arası ortak istek/sn sınırlayıcı (istekleri eşit aralıklara yayar)."""
+    def __init__(self, rps: float):
+        self.interval = 1.0 / rps if rps and rps > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SocrataClient:
+    def __init__(self, domain: str = SOCRATA_DOMAIN, rps: float = 0.0, max_retries: int = 4,
+                 backoff: float = 1.0, timeout: float = 60.0, pool_size: int = 8):
+        if max_retries < 1:
+            raise ValueError(f"max_retries en az 1 olmalı (deneme sayısı), verilen: {max_retries}")
+        self.domain = domain.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = RateLimiter(rps)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+        token = os.environ.get("SOCRATA_APP_TOKEN")
+        if token:
+            self.session.headers["X-App-Token"] = token
+
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self.stats = {"requests": 0, "pages": 0, "rows": 0, "bytes": 0, "wire_bytes": 0,
+                      "retries": 0, "request_seconds": 0.0}
+
+    # ---------- düşük seviye ----------
+    def _count(self, **kw):
+        with self._lock:
+            for k, v in kw.items():
+                self.stats[k] += v
+
+    def get(self, dataset: str, params: dict) -> requests.Response:
+        """/resource/<dataset>.json isteği; geçici hatalarda üstel bekleme ile tekrar dener.
+
+        En fazla `max_retries` deneme yapılır; son denemenin hatası olduğu gibi yükseltilir.
+        """
+        url = f"{self.domain}/resource/{dataset}.json"
+        for attempt in range(self.max_retries):
+            self.limiter.wait()
+            t0 = time.perf_counter()
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+                self._count(requests=1, request_seconds=time.perf_counter() - t0)
+                if resp.status_code in RETRY_STATUS:
+                    raise requests.HTTPError(f"HTTP {resp.status_code}", response=resp)
+                resp.raise_for_status()
+                self._count(bytes=len(resp.content),
+                            wire_bytes=int(resp.headers.get("Content-Length") or len(resp.content)))
+                return resp
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status is not None and status not in RETRY_STATUS:
+                    raise
+                if attempt == self.max_retries - 1:
+                    raise
+                self._count(retries=1)
+                time.sleep(self.backoff * (2 ** attempt))
+
+    def get_frame(self, dataset: str, params: dict) -> pd.DataFrame:
+        resp = self.get(dataset, params)
+        df = pd.read_json(StringIO(resp.text))
+        self._count(pages=1, rows=len(df))
+        return df
+
+    def get_records(self, dataset: str, params: dict) -> list:
+        """Sayfayı DataFrame'e çevirmeden ham kayıt listesi olarak döndürür."""
+        resp = self.get(dataset, params)
+        records = resp.json()
+        self._count(pages=1, rows=len(records))
+        return records
+
+    # ---------- sayfalama ----------
+    def _keyset(self, dataset: str, fetch, where: str = None, select: str = None,
+                page_size: int = 1000, after_id: str = None, extra: dict = None):
+        """Ortak keyset döngüsü: (sayfa, son_id) üretir.
+
+        Her sayfa `:id` sırasına göre gelir; bir sonraki sayfa `:id > son_id` ile istenir.
+        `fetch(dataset, params)` → (sayfa, sayfadaki son :id ya da boşsa None).
+        """
+        last_id = after_id
+        while True:
+            conds = [f"({where})"] if where else []
+            if last_id is not None:
+                conds.append(f":id > '{last_id}'")
+            params = {"$order": ":id", "$limit": page_size,
+                      "$select": ":id, " + select if select else ":*, *"}
+            if conds:
+                params["$where"] = " AND ".join(conds)
+            if extra:
+                params.update(extra)
+
+            page, page_last_id = fetch(dataset, params)
+            if page_last_id is None:
+                break
+            last_id = page_last_id
+            yield page, last_id
+            if len(page) < page_size:
+                break
+
+    def _frame_page(self, dataset: str, params: dict):
+        df = self.get_frame(dataset, params)
+        if df.empty or ":id" not in df.columns:
+            return df, None
+        last_id = str(df[":id"].iloc[-1])
+        return df.drop(columns=[c for c in df.columns if c.startswith(":")]), last_id
+
+    def _records_page(self, dataset: str, params: dict):
+        records = self.get_records(dataset, params)
+        return records, (str(records[-1][":id"]) if records else None)
+
+    def iter_pages(self, dataset: str, where: str = None, select: str = None,
+                   page_size: int = 1000, after_id: str = None, extra: dict = None):
+        """Keyset sayfalama ile (DataFrame, son_id) üretir.
+
+        `after_id` verilirse o kimlikten sonrası çekilir (kaldığı yerden devam için).
+        """
+        return self._keyset(dataset, self._frame_page, where=where, select=select,
+                            page_size=page_size, after_id=after_id, extra=extra)
+
+    def iter_grouped(self, dataset: str, select: str, group: str, where: str = None,
+                     page_size: int = 50000):
+        """Sunucu tarafı GROUP BY sorguları için sayfalama.
+
+        Gruplu sonuçta `:id` olmadığından grup anahtarlarına göre sıralanıp `$offset`
+        ile ilerlenir; sonuç ham veriden çok küçük olduğu için offset maliyeti önemsizdir.
+        """
+        offset = 0
+        while True:
+            params = {"$select": select, "$group": group, "$order": group,
+                      "$limit": page_size, "$offset": offset}
+            if where:
+                params["$where"] = where
+            df = self.get_frame(dataset, params)
+            if df.empty:
+                break
+            yield df
+            offset += len(df)
+            if len(df) < page_size:
+                break
+
+    def iter_records(self, dataset: str, where: str = None, select: str = None,
+                     page_size: int = 1000, after_id: str = None):
+        """iter_pages ile aynı keyset sayfalama; (kayıt listesi, son_id) üretir."""
+        return self._keyset(dataset, self._records_page, where=where, select=select,
+                            page_size=page_size, after_id=after_id)
+
+    def fetch_typed(self, dataset: str, where: str = None, page_size: int = 1000,
+                    schema: dict = None) -> pd.DataFrame:
+        """Şemadaki kolonları ($select) keyset sayfalarla çeker; tek seferde tipli DataFrame kurar."""
+        schema = schema or SCHEMAS[dataset]
+        buf = TypedBuffer(schema)
+        for records, _ in self.iter_records(dataset, where=where, select=", ".join(schema),
+                                            page_size=page_size):
+            buf.extend(records)
+        return buf.to_frame()
+
+    def fetch_all(self, dataset: str, **kw) -> pd.DataFrame:
+        frames = [df for df, _ in self.iter_pages(dataset, **kw)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    # ---------- raporlama ----------
+    def summary(self) -> str:
+        with self._lock:
+            s = dict(self.stats)
+        wall = max(time.perf_counter() - self._t0, 1e-9)
+        return (f"📊 Socrata: {s['pages']} sayfa | {s['requests']} istek ({s['retries']} tekrar) | "
+                f"{s['rows']} satır | {s['bytes'] / 1e6:.1f} MB ({s['wire_bytes'] / 1e6:.1f} MB ağ) | "
+                f"{s['rows'] / wall:.0f} satır/sn | ağ bekleme {s['request_seconds']:.1f}s / toplam {wall:.1f}s")
@@ -0,0 +1,120 @@
+# source_freshness.py
+# Kaynak tazelik katmanı: bir kaynak son çalıştırmadan beri değişmediyse indirme ve
+# ona bağlı sjoin / KD-tree işleri atlanır.
+# - Socrata veri kümeleri: /api/views/<id>.json → rowsUpdatedAt
+# - HTTP dosyaları: ETag / Last-Modified (koşullu istek, 304 Not Modified)
+# - Yerel dosyalar: içerik özeti (blake2b)
+# Durum crime_data/source_freshness.json'da tutulur; her çalıştırmada hangi kaynakların
+# önbellekten sunulduğu da buraya yazılır.
+import os
+import json
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+STATE_PATH = os.path.join("crime_data", "source_freshness.json")
+SOCRATA_DOMAIN = "https://data.sfgov.org"
+FORCE_REFRESH = os.environ.get("FORCE_REFRESH", "0") == "1"
+
+
+def file_token(path: str, chunk_size: int = 1 << 20) -> str | None:
+    """Dosya içeriğinin özeti; dosya yoksa None."""
+    if not path or not os.path.exists(path):
+        return None
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def socrata_token(dataset_id: str, domain: str = SOCRATA_DOMAIN, timeout: float = 20) -> str | None:
+    """Veri kümesinin son satır güncelleme zamanı (rowsUpdatedAt); alınamazsa None."""
+    try:
+        r = requests.get(f"{domain}/api/views/{dataset_id}.json", timeout=timeout)
+        r.raise_for_status()
+        meta = r.json()
+        val = meta.get("rowsUpdatedAt") or meta.get("viewLastModified")
+        return str(val) if val is not None else None
+    except Exception as e:
+        print(f"⚠️ Socrata meta verisi alınamadı ({dataset_id}): {e}")
+        return None
+
+
+def http_token(url: str, timeout: float = 20) -> str | None:
+    """HEAD isteğinden ETag / Last-Modified; ikisi de yoksa None."""
+    try:
+        r = requests.head(url, allow_redirects=True, timeout=timeout)
+        r.raise_for_status()
+        etag = r.headers.get("ETag")
+        lm = r.headers.get("Last-Modified")
+        if etag or lm:
+            return f"{etag or ''}|{lm or ''}"
+    except Exception as e:
+        print(f"⚠️ HTTP başlıkları alınamadı ({url}): {e}")
+    return None
+
+
+class FreshnessRegistry:
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self.state = {"sources": {}, "runs": []}
+        if os.path.exists(path):
+            try:
+                self.state = json.loads(Path(path).read_text(encoding="utf-8"))
+                self.state.setdefault("sources", {})
+                self.state.setdefault("runs", [])
+            except Exception as e:
+                print(f"⚠️ Tazelik durumu okunamadı ({path}): {e}")
+        self.cached, self.fetched = [], []
+
+    # ---- karşılaştırma ----
+    def is_fresh(self, key: str, token, *required_paths) -> bool:
+        """Token önceki çalıştırmadakiyle aynıysa ve gerekli çıktılar duruyorsa True."""
+        if FORCE_REFRESH or token is None:
+            return False
+        if any(not os.path.exists(p) for p in required_paths):
+            return False
+        return self.state["sources"].get(key, {}).get("token") == token
+
+    def http_headers(self, key: str) -> dict:
+        """Koşullu GET için If-None-Match / If-Modified-Since başlıkları."""
+        if FORCE_REFRESH:
+            return {}
+        entry = self.state["sources"].get(key, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    # ---- kayıt ----
+    def update(self, key: str, token=None, from_cache: bool = False, **extra):
+        entry = self.state["sources"].setdefault(key, {})
+        if token is not None:
+            entry["token"] = token
+        entry.update({k: v for k, v in extra.items() if v is not None})
+        entry["checked_at"] = datetime.now().isoformat(timespec="seconds")
+        entry["from_cache"] = bool(from_cache)
+        (self.cached if from_cache else self.fetched).append(key)
+
+    def save(self, step: str = None, keep_runs: int = 50):
+        if self.cached or self.fetched:
+            self.state["runs"].append({
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "step": step,
+                "cached": self.cached,
+                "fetched": self.fetched,
+            })
+            self.state["runs"] = self.state["runs"][-keep_runs:]
+        Path(os.path.dirname(self.path) or ".").mkdir(parents=True, exist_ok=True)
+        tmp = self.path + ".tmp"
+        Path(tmp).write_text(json.dumps(self.state, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+        if self.cached:
+            print(f"🗃️ Önbellekten sunulan kaynaklar: {', '.join(self.cached)}")
+        if self.fetched:
+            print(f"🌐 Yeniden indirilen/işlenen kaynaklar: {', '.join(self.fetched)}")
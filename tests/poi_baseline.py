@@ -0,0 +1,180 @@
+# poi_baseline.py
+# update_poi.py'nin vektörleştirme öncesi (satır/POI döngülü) hesapları; yeni kodun birebir aynı sonucu
+# verdiğini sınamak için referans. Gövdeler eski sürümden değiştirilmeden alınmıştır; yalnızca dosya
+# yazma / özellik deposu çağrıları çıkarılıp sonuç döndürülür.
+import ast
+import json
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+from block_index import load_block_index
+from update_poi import _make_dynamic_labels, _normalize_geoid
+
+
+def _ensure_crs(gdf, target="EPSG:4326"):
+    if gdf.crs is None:
+        return gdf.set_crs(target, allow_override=True)
+    s = (gdf.crs.to_string() if hasattr(gdf.crs, "to_string") else str(gdf.crs)).upper()
+    if s.endswith("CRS84"):  # CRS84 == 4326 (lon,lat)
+        return gdf.set_crs("EPSG:4326", allow_override=True)
+    if s != target:
+        return gdf.to_crs(target)
+    return gdf
+
+def _parse_tags(val):
+    if isinstance(val, dict): return val
+    if isinstance(val, str):
+        for loader in (json.loads, ast.literal_eval):
+            try:
+                x = loader(val)
+                return x if isinstance(x, dict) else {}
+            except Exception:
+                pass
+    return {}
+
+def _extract_cat_sub_name(tags: dict):
+    name = tags.get("name")
+    for key in ("amenity", "shop", "leisure"):
+        if key in tags and tags[key]:
+            return key, tags[key], name
+    return None, None, name
+
+
+def build_poi_clean_with_geoid(blocks_path: str, poi_geojson_path: str) -> pd.DataFrame:
+    """Eski build_poi_clean_with_geoid (gpd.read_file + satır satır tags ayrıştırma); CSV yazmaz."""
+    import geopandas as gpd
+
+    gdf = gpd.read_file(poi_geojson_path)
+    gdf = _ensure_crs(gdf, "EPSG:4326")
+
+    if "tags" not in gdf.columns:
+        gdf["tags"] = [{}]*len(gdf)
+    gdf["tags"] = gdf["tags"].apply(_parse_tags)
+
+    triples = gdf["tags"].apply(_extract_cat_sub_name)
+    gdf[["poi_category","poi_subcategory","poi_name"]] = pd.DataFrame(triples.tolist(), index=gdf.index)
+
+    if "geometry" not in gdf.columns:
+        if {"lon","lat"}.issubset(gdf.columns):
+            gdf["geometry"] = gpd.points_from_xy(gdf["lon"], gdf["lat"])
+        else:
+            raise ValueError("GeoJSON 'geometry' veya 'lon/lat' içermiyor.")
+    gdf = _ensure_crs(gdf, "EPSG:4326")
+    gdf["lon"] = gdf.get("lon", pd.Series(index=gdf.index, dtype=float)).fillna(gdf.geometry.x)
+    gdf["lat"] = gdf.get("lat", pd.Series(index=gdf.index, dtype=float)).fillna(gdf.geometry.y)
+
+    blocks = load_block_index(blocks_path)
+    target_len = blocks.target_len
+    joined = gdf.assign(GEOID=blocks.assign_geoms(gdf.geometry.values))
+
+    keep = [c for c in ["id","lat","lon","poi_category","poi_subcategory","poi_name","GEOID"] if c in joined.columns]
+    df = joined[keep].copy()
+    if "id" not in df.columns:
+        df["id"] = np.arange(len(df))
+    df = df.dropna(subset=["lat","lon"])
+
+    df["GEOID"] = _normalize_geoid(df["GEOID"], target_len)
+    return df
+
+
+def compute_dynamic_poi_risk(df_crime: pd.DataFrame, df_poi: pd.DataFrame, radius_m=300) -> dict:
+    """Eski compute_dynamic_poi_risk (POI başına tek query_radius); JSON yerine sözlüğü döndürür."""
+    dfc = df_crime.dropna(subset=["latitude","longitude"]).copy()
+    dfc["latitude"]  = pd.to_numeric(dfc["latitude"], errors="coerce")
+    dfc["longitude"] = pd.to_numeric(dfc["longitude"], errors="coerce")
+    dfc = dfc.dropna(subset=["latitude","longitude"])
+
+    dfp = df_poi.dropna(subset=["lat","lon"]).copy()
+    dfp["lat"] = pd.to_numeric(dfp["lat"], errors="coerce")
+    dfp["lon"] = pd.to_numeric(dfp["lon"], errors="coerce")
+    if "poi_subcategory" in dfp.columns:
+        dfp = dfp[~dfp["poi_subcategory"].isin(["police","ranger_station"])]
+
+    if dfc.empty or dfp.empty:
+        return {}
+
+    crime_rad = np.radians(dfc[["latitude","longitude"]].values)
+    poi_rad   = np.radians(dfp[["lat","lon"]].values)
+    tree = BallTree(crime_rad, metric="haversine")
+    r = radius_m/6371000.0
+
+    poi_types = dfp["poi_subcategory"].fillna("")
+    counts = []
+    for pt, t in zip(poi_rad, poi_types):
+        if not t:
+            continue
+        idx = tree.query_radius([pt], r=r)[0]
+        counts.append((t, len(idx)))
+
+    if not counts:
+        return {}
+
+    agg = defaultdict(list)
+    for t, c in counts:
+        agg[t].append(c)
+    avg = {t: float(np.mean(v)) for t, v in agg.items()}
+
+    v = list(avg.values())
+    vmin, vmax = min(v), max(v)
+    if vmax - vmin < 1e-9:
+        norm = {t: 1.5 for t in avg}
+    else:
+        norm = {t: round(3*(x - vmin)/(vmax - vmin), 2) for t, x in avg.items()}
+    return norm
+
+
+def neighbor_metrics_loop(idxs, poi_types: pd.Series, poi_risks: pd.Series):
+    """enrich_crime_with_poi'nin eski satır döngüsü: (sayı, risk toplamı, baskın alt-kategori)."""
+    tot, risk, dom = [], [], []
+    for ids in idxs:
+        if len(ids) == 0:
+            tot.append(0); risk.append(0.0); dom.append("No_POI"); continue
+        subs  = poi_types.iloc[ids]
+        risks = poi_risks.iloc[ids]
+        tot.append(len(ids))
+        risk.append(float(risks.sum()))
+        dom.append(subs.value_counts().idxmax() if not subs.empty else "No_POI")
+    return tot, risk, dom
+
+
+def enrich_crime_with_poi(df_crime: pd.DataFrame, df_poi: pd.DataFrame, poi_risk: dict, radius_m=300) -> pd.DataFrame:
+    """Eski enrich_crime_with_poi (tek yarıçap); depoya yazmak yerine POI kolonlarını döndürür."""
+    dfc = df_crime.copy()
+    dfc["latitude"]  = pd.to_numeric(dfc["latitude"], errors="coerce")
+    dfc["longitude"] = pd.to_numeric(dfc["longitude"], errors="coerce")
+    dfc = dfc.dropna(subset=["latitude","longitude"])
+
+    dfp = df_poi.dropna(subset=["lat","lon"]).copy()
+    dfp["lat"] = pd.to_numeric(dfp["lat"], errors="coerce")
+    dfp["lon"] = pd.to_numeric(dfp["lon"], errors="coerce")
+    dfp = dfp.dropna(subset=["lat","lon"])
+    dfp["risk_score"] = dfp.get("poi_subcategory","").map(poi_risk).fillna(0.0)
+
+    poi_rad   = np.radians(dfp[["lat","lon"]].values)
+    crime_rad = np.radians(dfc[["latitude","longitude"]].values)
+    tree = BallTree(poi_rad, metric="haversine")
+    r = radius_m/6371000.0
+
+    idxs = tree.query_radius(crime_rad, r=r)
+    tot, risk, dom = neighbor_metrics_loop(idxs, dfp["poi_subcategory"].fillna(""), dfp["risk_score"].fillna(0.0))
+    dfc["poi_total_count"]   = tot
+    dfc["poi_risk_score"]    = risk
+    dfc["poi_dominant_type"] = dom
+
+    lab_cnt  = _make_dynamic_labels(dfc["poi_total_count"])
+    lab_risk = _make_dynamic_labels(dfc["poi_risk_score"])
+    dfc["poi_total_count_range"] = dfc["poi_total_count"].apply(lab_cnt)
+    dfc["poi_risk_score_range"]  = dfc["poi_risk_score"].apply(lab_risk)
+
+    cols = ["poi_total_count", "poi_risk_score", "poi_dominant_type", "poi_total_count_range", "poi_risk_score_range"]
+    out = df_crime.copy()
+    out = out.drop(columns=[c for c in cols if c in out.columns])
+    return out.merge(
+        dfc[cols],
+        left_index=True, right_index=True, how="left"
+    ).fillna({"poi_total_count":0, "poi_risk_score":0.0,
+              "poi_dominant_type":"No_POI",
+              "poi_total_count_range":"Q1 (0-0)", "poi_risk_score_range":"Q1 (0-0)"})[cols]
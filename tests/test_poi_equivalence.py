@@ -0,0 +1,172 @@
+# update_poi.py'nin vektörel yolları ↔ eski döngülü hesaplar (tests/poi_baseline.py), küçük sentetik verilerle.
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.neighbors import BallTree
+
+import update_poi
+from feature_store import FeatureStore
+from tests import poi_baseline
+
+SUBS = ["bar", "cafe", "school", "bank", "fuel", "police"]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Özellik deposu ve çıktı dosyaları geçici dizine yazılır."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(update_poi, "POI_RISK_JSON", str(tmp_path / "risky_pois_dynamic.json"))
+    monkeypatch.setattr(update_poi, "POI_RISK_STATE", str(tmp_path / "_cache" / "poi_risk_state.npz"))
+    return tmp_path
+
+
+def make_points(seed: int, n_crime: int = 1500, n_poi: int = 400):
+    """Dar bir kutuda POI ve suç noktaları: satır başına çok komşu, az alt-kategori → bol eşitlik."""
+    rng = np.random.default_rng(seed)
+    df_poi = pd.DataFrame({
+        "id": np.arange(n_poi),
+        "lat": rng.uniform(37.770, 37.790, n_poi).round(6),
+        "lon": rng.uniform(-122.430, -122.410, n_poi).round(6),
+        "poi_subcategory": rng.choice(SUBS + [None], n_poi),
+    })
+    df_crime = pd.DataFrame({
+        "latitude": rng.uniform(37.765, 37.795, n_crime).round(6),
+        "longitude": rng.uniform(-122.435, -122.405, n_crime).round(6),
+    })
+    df_crime.loc[rng.random(n_crime) < 0.05, "latitude"] = np.nan  # koordinatsız satırlar
+    return df_crime, df_poi
+
+
+def write_base(df_crime: pd.DataFrame):
+    FeatureStore().write_base(df_crime)
+
+
+# ---------- user-021: CSR komşu metrikleri ----------
+@pytest.mark.parametrize("seed,n_sub,max_nb", [(0, 2, 6), (1, 3, 40), (2, 8, 150), (3, 40, 300)])
+def test_neighbor_metrics_match_row_loop(seed, n_sub, max_nb):
+    rng = np.random.default_rng(seed)
+    n_poi = 500
+    poi_types = pd.Series(np.array([f"s{i}" for i in range(n_sub)], dtype=object)[rng.integers(0, n_sub, n_poi)])
+    poi_risks = pd.Series(np.round(rng.uniform(0, 3, n_poi), 2))
+    counts = rng.integers(0, max_nb + 1, 3000)
+    flat = rng.integers(0, n_poi, int(counts.sum()))
+    idxs = np.split(flat, np.cumsum(counts)[:-1])
+
+    ref_tot, ref_risk, ref_dom = poi_baseline.neighbor_metrics_loop(idxs, poi_types, poi_risks)
+    sub_codes, names = pd.factorize(poi_types)
+    tot, risk, dom = update_poi._neighbor_metrics(counts, flat, sub_codes, poi_risks.to_numpy())
+    dom = np.append(np.asarray(names, dtype=object), "No_POI")[dom]
+
+    assert tot.tolist() == ref_tot
+    assert risk.tolist() == ref_risk  # bit düzeyinde
+    assert dom.tolist() == ref_dom    # eşitlikler dahil
+
+
+def test_enrich_crime_with_poi_matches_baseline(workdir):
+    df_crime, df_poi = make_points(seed=7)
+    write_base(df_crime)
+    risk = {s: round(0.5 * i, 2) for i, s in enumerate(SUBS)}
+    out = update_poi.enrich_crime_with_poi(df_crime, df_poi, risk, radius_m=300)
+    ref = poi_baseline.enrich_crime_with_poi(df_crime, df_poi, risk, radius_m=300)
+    pd.testing.assert_frame_equal(out[update_poi.POI_COLS].reset_index(drop=True), ref.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+# ---------- user-022: toplu, count_only komşu sayımı ----------
+@pytest.mark.parametrize("seed", [3, 11])
+def test_dynamic_poi_risk_matches_per_poi_loop(workdir, seed):
+    df_crime, df_poi = make_points(seed)
+    ref = poi_baseline.compute_dynamic_poi_risk(df_crime, df_poi, radius_m=300)
+    norm = update_poi.compute_dynamic_poi_risk(df_crime, df_poi, radius_m=300)
+    assert list(norm.items()) == list(ref.items())  # anahtar sırası da (JSON çıktısı) aynı
+    with open(update_poi.POI_RISK_JSON) as f:
+        assert f.read() == json.dumps(ref, indent=2)
+
+
+def test_count_within_chunked_threaded_matches_single_query():
+    rng = np.random.default_rng(5)
+    crime = np.radians(np.c_[rng.uniform(37.76, 37.80, 3000), rng.uniform(-122.44, -122.40, 3000)])
+    pois = np.radians(np.c_[rng.uniform(37.76, 37.80, 500), rng.uniform(-122.44, -122.40, 500)])
+    tree = BallTree(crime, metric="haversine")
+    r = 300 / update_poi.EARTH_RADIUS_M
+    ref = np.array([len(tree.query_radius([p], r=r)[0]) for p in pois])
+    for workers, chunk in [(1, 20000), (1, 37), (4, 37), (3, 1)]:
+        assert update_poi._count_within(tree, pois, r, workers=workers, chunk=chunk).tolist() == ref.tolist()
+
+
+# ---------- user-023: tek sorgudan çok yarıçaplı metrikler ----------
+def test_multi_radius_matches_separate_single_radius_runs(workdir):
+    df_crime, df_poi = make_points(seed=13)
+    write_base(df_crime)
+    risk = {s: round(0.5 * i, 2) for i, s in enumerate(SUBS)}
+    out = update_poi.enrich_crime_with_poi(df_crime, df_poi, risk, radius_m=300, radii=[100, 300, 500])
+    main = poi_baseline.enrich_crime_with_poi(df_crime, df_poi, risk, radius_m=300)
+    pd.testing.assert_frame_equal(out[update_poi.POI_COLS].reset_index(drop=True), main.reset_index(drop=True),
+                                  check_dtype=False)
+    for rr in (100, 500):
+        ref = poi_baseline.enrich_crime_with_poi(df_crime, df_poi, risk, radius_m=rr)
+        for c in ("poi_total_count", "poi_risk_score"):
+            want = update_poi.cast_column(ref[c], update_poi.SCHEMA[c])  # ek kolonlar kompakt tipte yazılır
+            assert out[f"{c}_{rr}"].tolist() == want.tolist(), f"{c}_{rr}"
+
+
+# ---------- user-025: sütunlu GeoJSON okuyucu ----------
+def write_fixture_geojson(path, features, one_per_line: bool):
+    doc = {"type": "FeatureCollection", "name": "sf_pois",
+           "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}}}
+    if one_per_line:  # ogr2ogr düzeni: satır başına bir Feature
+        head = json.dumps(doc, indent=0)[:-2]
+        body = ",\n".join(json.dumps(f) for f in features)
+        path.write_text(head + ',\n"features": [\n' + body + "\n]\n}\n", encoding="utf-8")
+    else:
+        path.write_text(json.dumps({**doc, "features": features}, indent=2), encoding="utf-8")
+
+
+def poi_features(seed: int, n: int = 120):
+    rng = np.random.default_rng(seed)
+    feats = []
+    for i in range(n):
+        lat, lon = round(float(rng.uniform(37.771, 37.789)), 7), round(float(rng.uniform(-122.429, -122.411)), 7)
+        tags = {"name": f"poi {i}"} if rng.random() < 0.9 else {}
+        key = ("amenity", "shop", "leisure", None)[i % 4]
+        if key:
+            tags[key] = SUBS[i % len(SUBS)] if i % 7 else ""  # boş değerli anahtar → sonraki anahtara geçilir
+        if i % 5 == 0:
+            tags.setdefault("shop", "books")
+        props = {"type": "node", "id": 1000 + i, "lat": lat, "lon": lon}
+        if i % 11 == 0:
+            props["tags"] = repr(tags)          # Python dict metni (literal_eval yolu)
+        elif i % 13 == 0:
+            props["tags"] = json.dumps(tags)    # JSON metni
+        elif i % 17 != 0:
+            props["tags"] = tags                # 17'nin katlarında tags yok
+        # yalnızca noktalar: eski yol (GeoSeries.x) nokta olmayan geometride hata verir
+        feats.append({"type": "Feature", "properties": props,
+                      "geometry": {"type": "Point", "coordinates": [lon, lat]}})
+    return feats
+
+
+def write_fixture_blocks(path):
+    """Fixture POI kutusunu dört kare bloğa bölen küçük blok dosyası (GEOID'ler 11 hane → 12'ye doldurulur)."""
+    feats = []
+    for k, (la, lo) in enumerate([(37.770, -122.430), (37.770, -122.420), (37.780, -122.430), (37.780, -122.420)]):
+        ring = [[lo, la], [lo + 0.01, la], [lo + 0.01, la + 0.01], [lo, la + 0.01], [lo, la]]
+        feats.append({"type": "Feature", "properties": {"GEOID": f"6075020200{k}"},
+                      "geometry": {"type": "Polygon", "coordinates": [ring]}})
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": feats}), encoding="utf-8")
+
+
+@pytest.mark.parametrize("one_per_line", [True, False])
+def test_poi_build_matches_geopandas_tag_parsing(workdir, monkeypatch, one_per_line):
+    poi_path, blocks_path = workdir / "sf_pois.geojson", workdir / "blocks.geojson"
+    write_fixture_geojson(poi_path, poi_features(seed=21), one_per_line)
+    write_fixture_blocks(blocks_path)
+    monkeypatch.setattr(update_poi, "POI_CLEAN_CSV", str(workdir / "sf_pois_cleaned_with_geoid.csv"))
+
+    ref = poi_baseline.build_poi_clean_with_geoid(str(blocks_path), str(poi_path))
+    for _ in range(2):  # ikinci tur ayrıştırılmış tablo önbelleğinden okunur
+        df, _ = update_poi.build_poi_clean_with_geoid(str(blocks_path), str(poi_path))
+        assert (workdir / "sf_pois_cleaned_with_geoid.csv").read_text() == ref.to_csv(index=False)
+    assert df["poi_subcategory"].notna().sum() > 0 and df["GEOID"].nunique() > 1
@@ -1,11 +1,18 @@
 import os
-import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from urllib.parse import quote
 
+import numpy as np
 import pandas as pd
-import geopandas as gpd
+import requests
+from block_index import load_block_index
+from checkpoint_staging import ChunkStaging
+from feature_store import FeatureStore
+from join_keys import (
+    DATE_KEY, GEOID_KEY, HOUR_KEY,
+    date_label, drop_keys, geoid_label, hour_code, hour_range_label, with_keys,
+)
+from socrata_client import SCHEMAS, SocrataClient, TypedBuffer
 
 # =========================
 # Yardımcılar
@@ -13,18 +20,21 @@ import geopandas as gpd
 def ensure_parent(path: str):
     Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
 
-def safe_save_csv(df: pd.DataFrame, path: str):
+def safe_save_csv(df: pd.DataFrame, path: str) -> bool:
     try:
         ensure_parent(path)
         df.to_csv(path, index=False)
+        return True
     except Exception as e:
         print(f"❌ Kaydetme hatası: {path}\n{e}")
         df.to_csv(path + ".bak", index=False)
         print(f"📁 Yedek oluşturuldu: {path}.bak")
+        return False
 
-def normalize_geoid(s: pd.Series, target_len: int) -> pd.Series:
-    s = s.astype(str).str.extract(r"(\d+)")[0]
-    return s.str.zfill(target_len)
+def normalize_id(s: pd.Series) -> pd.Series:
+    """Talep kimliklerini tek biçime getirir: 123, "123" ve "123.0" aynı kimliktir."""
+    s = s.astype(str).str.strip()
+    return s.str.replace(r"^(\d+)\.0+$", r"\1", regex=True)
 
 def find_col(ci_names, candidates):
     m = {c.lower(): c for c in ci_names}
@@ -41,8 +51,9 @@ Path(BASE_DIR).mkdir(exist_ok=True)
 
 raw_save_path   = os.path.join(BASE_DIR, "sf_311_last_5_years.csv")
 agg_save_path   = os.path.join(BASE_DIR, "311_requests_range.csv")
-crime_01_path   = os.path.join(BASE_DIR, "sf_crime_01.csv")
-output_path     = os.path.join(BASE_DIR, "sf_crime_02.csv")
+STEP = "311"  # özellik deposundaki adım adı (sf_crime_02'nin karşılığı)
+# Depodan okunan kolonlar; adım yalnızca yeni kolonlarını yan dosya olarak yazar
+CRIME_INPUT_COLS = ["GEOID", "date", "datetime", "hour_range", "event_hour"]
 
 # census geojson hem crime_data/ hem kökte olabilir
 census_candidates = [
@@ -56,141 +67,310 @@ census_candidates = [
 today = datetime.today().date()
 start_date = today - timedelta(days=5 * 365)
 
+# =========================
+# 2.1) Su seviyesi (watermark): mevcut ham dosyadaki en son requested_datetime
+# =========================
+# Günlük çalıştırmada sadece bu tarihten (geç düzeltmeler için küçük bir örtüşme
+# penceresiyle) sonrası indirilir; mevcut kayıtlarla service_request_id üzerinden birleştirilir.
+OVERLAP_DAYS = int(os.environ.get("SR311_OVERLAP_DAYS", "3"))
+FULL_REFRESH = os.environ.get("SR311_FULL_REFRESH", "0") == "1"
+# SR311_MODE=agg → kayıtlar yerine sunucuda (gün, saat, koordinat hücresi) bazında gruplanmış
+# sayılar indirilir; ham dosya yazılmaz, sadece özet ve sf_crime_02 üretilir.
+AGG_MODE = os.environ.get("SR311_MODE", "raw").lower() == "agg"
+# agg modunda koordinatlar 10^-N derecelik hücrelere indirilir (3 → ~110 m × 90 m); GEOID her hücre
+# için hücre merkezinden bir kez çözülür.
+AGG_DECIMALS = int(os.environ.get("SR311_AGG_DECIMALS", "3"))
+
+df_old = None
+fetch_from = start_date
+if os.path.exists(raw_save_path) and not FULL_REFRESH and not AGG_MODE:
+    try:
+        df_old = pd.read_csv(raw_save_path, dtype={"GEOID": str, "id": str},
+                             float_precision="round_trip", low_memory=False)
+        df_old["datetime"] = pd.to_datetime(df_old["datetime"], errors="coerce")
+        if "id" in df_old.columns:
+            df_old["id"] = normalize_id(df_old["id"])
+        watermark = df_old["datetime"].max()
+        if pd.isna(watermark) or "id" not in df_old.columns:
+            raise ValueError("datetime/id sütunu kullanılamıyor")
+        fetch_from = max(start_date, (watermark - timedelta(days=OVERLAP_DAYS)).date())
+        print(f"💧 Watermark: {watermark} → {fetch_from} sonrası indirilecek "
+              f"({len(df_old)} mevcut kayıt, {OVERLAP_DAYS} gün örtüşme)")
+    except Exception as e:
+        print(f"⚠️ Mevcut ham 311 dosyası kullanılamadı ({e}); tam indirme yapılacak.")
+        df_old = None
+        fetch_from = start_date
+
 # =========================
 # 3) 311 verisini indir (SFPD/Police)
 # =========================
-soql = (
-    f"$where=requested_datetime >= '{start_date}T00:00:00.000' "
+where = (
+    f"requested_datetime >= '{fetch_from}T00:00:00.000' "
     "AND (agency_responsible like '%Police%' OR agency_responsible like '%SFPD%')"
 )
-url_base = "https://data.sfgov.org/resource/vw6y-z8j6.json"
+SR_DATASET = "vw6y-z8j6"
+# Sunucuya itilen kolon projeksiyonu + tipler (sadece kullanılan alanlar indirilir)
+SR_SCHEMA = SCHEMAS[SR_DATASET]
+# Ham dosyada tutulan kolonlar (hour_range özet adımında eklenir)
+RAW_COLUMNS = ["id", "datetime", "latitude", "longitude", "date", "hour", "GEOID", "hour_range"]
 limit = 1000
-offset = 0
-rows = []
-
-print("📥 311 verisi indiriliyor...")
-while True:
-    url = f"{url_base}?{quote(soql, safe='=&')}&$limit={limit}&$offset={offset}"
-    chunk = None
-    for attempt in range(4):
-        try:
-            chunk = pd.read_json(url)
-            break
-        except Exception as e:
-            if attempt == 3:
-                print("❌ Veri çekme hatası:", e)
-                chunk = None
-            time.sleep(1.2 * (attempt + 1))
-    if chunk is None or chunk.empty:
-        break
-    rows.append(chunk)
-    offset += limit
-    print(f"  + {offset} kayıt indirildi...")
-    time.sleep(0.25)
-
-if not rows:
-    print("⚠️ Veri alınamadı, script sonlandırıldı.")
-    raise SystemExit(0)
+FLUSH_PAGES = int(os.environ.get("STAGING_FLUSH_PAGES", "20"))  # kaç sayfada bir diske yazılsın
 
-# =========================
-# 4) Temizleme & kolon adları
-# =========================
-df = pd.concat(rows, ignore_index=True)
+client = SocrataClient(rps=float(os.environ.get("SOCRATA_RPS", "4")))
 
-dt_col  = find_col(df.columns, ["requested_datetime", "datetime", "created_date", "created_at"])
-lat_col = find_col(df.columns, ["lat", "latitude", "y"])
-lon_col = find_col(df.columns, ["long", "longitude", "x"])
-id_col  = find_col(df.columns, ["service_request_id", "service_requestid", "id"])
+if AGG_MODE:
+    # Sayım sunucuda yapılır: gün × saat × koordinat hücresi başına tek satır.
+    # Hücre = floor(koordinat · 10^N); sunucu bu ifadeyi kabul etmezse (HTTP 400) ham koordinatla
+    # gruplanıp hücreler yerelde hesaplanır — iki yolda da aynı hücreler çıkar.
+    print(f"📥 311 sayıları sunucuda gruplanarak indiriliyor (SR311_MODE=agg, {AGG_DECIMALS} ondalık hücre)...")
+    scale = 10 ** AGG_DECIMALS
+    day_expr, hour_expr = "date_trunc_ymd(requested_datetime)", "date_extract_hh(requested_datetime)"
+    cell_exprs = [f"floor(lat::number * {scale})", f"floor(long::number * {scale})"]
+    agg_select = (f"{day_expr} as requested_day, {hour_expr} as requested_hour, "
+                  f"{cell_exprs[0]} as lat_cell, {cell_exprs[1]} as lon_cell, count(*) as request_count")
+    agg_group = ", ".join([day_expr, hour_expr, *cell_exprs])
+    try:
+        try:
+            parts = list(client.iter_grouped(SR_DATASET, select=agg_select, group=agg_group, where=where))
+        except requests.HTTPError as e:
+            if getattr(e.response, "status_code", None) != 400:
+                raise
+            print("ℹ️ Sunucu hücre ifadesini kabul etmedi; koordinatla gruplanıp hücreler yerelde hesaplanacak.")
+            parts = list(client.iter_grouped(
+                SR_DATASET, where=where, group=f"{day_expr}, {hour_expr}, lat, long",
+                select=f"{day_expr} as requested_day, {hour_expr} as requested_hour, lat, long, count(*) as request_count"))
+    except Exception as e:
+        print(client.summary())
+        raise SystemExit(f"❌ Veri çekme hatası: {e}")
+    print(client.summary())
+    if not parts:
+        print("⚠️ Veri alınamadı, script sonlandırıldı.")
+        raise SystemExit(0)
+    df = pd.concat(parts, ignore_index=True)
+    if "lat_cell" not in df.columns:
+        df["lat_cell"] = np.floor(pd.to_numeric(df["lat"], errors="coerce") * scale)
+        df["lon_cell"] = np.floor(pd.to_numeric(df["long"], errors="coerce") * scale)
+    df["request_count"] = pd.to_numeric(df["request_count"], errors="coerce").fillna(0).astype(int)
+    # aynı hücreye düşen gruplar birleşir (yerel yolda gerekli, sunucu yolunda etkisiz)
+    n_groups = len(df)
+    cell_keys = ["requested_day", "requested_hour", "lat_cell", "lon_cell"]
+    for c in cell_keys[2:]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    df = df.groupby(cell_keys, dropna=True)["request_count"].sum().reset_index()
+    df["requested_datetime"] = (pd.to_datetime(df["requested_day"], errors="coerce")
+                                + pd.to_timedelta(pd.to_numeric(df["requested_hour"], errors="coerce"), unit="h"))
+    df["lat"] = (df["lat_cell"] + 0.5) / scale   # hücre merkezi
+    df["long"] = (df["lon_cell"] + 0.5) / scale
+    df = df.drop(columns=cell_keys)
+    print(f"🧮 {n_groups} grup → {len(df)} (gün, saat, hücre) satırı; "
+          f"{df[['lat', 'long']].drop_duplicates().shape[0]} tekil hücre GEOID'e çözülecek")
+    staging = None
+else:
+    # Sayfa aralıkları ara depoya yazılır (crime_data/_staging/311). Sorgu değişmişse
+    # (ör. gün değişti → start_date kaydı) eski ara depo geçersizdir, sıfırlanır.
+    staging = ChunkStaging("311")
+    if staging.meta.get("where") != where:
+        if staging.keys():
+            print("♻️ Ara depo farklı bir sorguya ait; sıfırlanıyor.")
+        staging.clear()
+        staging.set_meta(where=where, last_id=None, finished=False)
+
+    last_id = staging.meta.get("last_id")
+    if last_id:
+        print(f"♻️ Ara depodan devam: {staging.total_rows()} kayıt zaten indirilmiş (:id > {last_id}).")
 
-if not all([dt_col, lat_col, lon_col]):
-    missing = [("datetime", dt_col), ("latitude", lat_col), ("longitude", lon_col)]
-    missing = ", ".join([k for k, v in missing if v is None])
-    raise ValueError(f"❌ Zorunlu kolon(lar) eksik: {missing}")
+    def flush(buf, upto_id):
+        """Tampondaki sayfaları tek parça (tipli) olarak diske yazar ve son :id'yi manifest'e işler."""
+        if not len(buf):
+            return
+        staging.commit(f"p{len(staging.keys()):06d}", buf.to_frame(), last_id=upto_id)
+        staging.set_meta(last_id=upto_id)
 
-df = df.rename(columns={
-    dt_col: "datetime",
-    lat_col: "latitude",
-    lon_col: "longitude",
-    **({id_col: "id"} if id_col else {}),
-})
+    print("📥 311 verisi indiriliyor...")
+    pending, n_pages, pending_id, fetched = TypedBuffer(SR_SCHEMA), 0, last_id, staging.total_rows()
+    if not staging.meta.get("finished"):
+        try:
+            # Keyset sayfalama ($order=:id, :id > son) → kaldığı yerden devam etmek için sabit sınırlar
+            for records, page_last_id in client.iter_records(SR_DATASET, where=where, select=", ".join(SR_SCHEMA),
+                                                             page_size=limit, after_id=last_id):
+                pending.extend(records)
+                n_pages += 1
+                pending_id = page_last_id
+                fetched += len(records)
+                print(f"  + {fetched} kayıt indirildi...")
+                if n_pages >= FLUSH_PAGES:
+                    flush(pending, pending_id)
+                    pending, n_pages = TypedBuffer(SR_SCHEMA), 0
+        except Exception as e:
+            flush(pending, pending_id)
+            print(client.summary())
+            raise SystemExit(f"❌ Veri çekme hatası (:id > {pending_id}): {e} — tekrar çalıştırınca kaldığı yerden devam eder.")
+        flush(pending, pending_id)
+        staging.set_meta(finished=True)
+        print(client.summary())
 
-df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce")
-df = df.dropna(subset=["datetime", "latitude", "longitude"]).copy()
-df["date"] = df["datetime"].dt.date
-df["hour"] = df["datetime"].dt.hour
+    if staging.total_rows() == 0 and df_old is None:
+        print("⚠️ Veri alınamadı, script sonlandırıldı.")
+        staging.clear()
+        raise SystemExit(0)
 
 # =========================
-# 5) GEOID eşlemesi (census geojson → sjoin)
+# 4) GEOID dizini (census geojson → önbellekli blok dizini)
 # =========================
-print("📍 GEOID eşlemesi yapılıyor...")
 census_path = next((p for p in census_candidates if os.path.exists(p)), None)
 if census_path is None:
     raise FileNotFoundError("❌ Nüfus blokları GeoJSON bulunamadı (crime_data/ veya kök).")
 
-gdf = gpd.GeoDataFrame(
-    df, geometry=gpd.points_from_xy(df["longitude"], df["latitude"]), crs="EPSG:4326"
-)
-gdf_blocks = gpd.read_file(census_path)
+print("📍 GEOID eşlemesi yapılıyor...")
+# Önbellekli blok dizini (geometriler + STRtree + GEOID uzunluğu)
+blocks = load_block_index(census_path)
+target_len = blocks.target_len
 
-# Hedef GEOID uzunluğunu block dosyasından öğren
-target_len = gdf_blocks["GEOID"].astype(str).str.len().mode().iat[0]
-gdf_blocks["GEOID"] = normalize_geoid(gdf_blocks["GEOID"], target_len)
+# =========================
+# 5) Temizleme, kolon adları & GEOID (parça parça)
+# =========================
+def prepare(part: pd.DataFrame) -> pd.DataFrame:
+    dt_col  = find_col(part.columns, ["requested_datetime", "datetime", "created_date", "created_at"])
+    lat_col = find_col(part.columns, ["lat", "latitude", "y"])
+    lon_col = find_col(part.columns, ["long", "longitude", "x"])
+    id_col  = find_col(part.columns, ["service_request_id", "service_requestid", "id"])
 
-# sjoin
-gdf = gpd.sjoin(gdf, gdf_blocks[["GEOID", "geometry"]], how="left", predicate="within")
-df = pd.DataFrame(gdf.drop(columns=["geometry", "index_right"], errors="ignore"))
-df["GEOID"] = normalize_geoid(df["GEOID"], target_len)
-df = df.dropna(subset=["GEOID"]).copy()
+    if not all([dt_col, lat_col, lon_col]):
+        missing = [("datetime", dt_col), ("latitude", lat_col), ("longitude", lon_col)]
+        missing = ", ".join([k for k, v in missing if v is None])
+        raise ValueError(f"❌ Zorunlu kolon(lar) eksik: {missing}")
+
+    part = part.rename(columns={
+        dt_col: "datetime",
+        lat_col: "latitude",
+        lon_col: "longitude",
+        **({id_col: "id"} if id_col else {}),
+    })
+    part["datetime"] = pd.to_datetime(part["datetime"], errors="coerce")
+    part = part.dropna(subset=["datetime", "latitude", "longitude"]).copy()
+    part["GEOID"] = blocks.assign_geoid(part["longitude"], part["latitude"])
+    part = part.dropna(subset=["GEOID"])
+    if "id" in part.columns:
+        part["id"] = normalize_id(part["id"])
+    return part
+
+def new_parts():
+    """İndirilen veri; ara depodaki parçalar tek tek okunur (bellekte aynı anda bir parça)."""
+    if AGG_MODE:
+        yield prepare(df)
+        return
+    for key in staging.keys():
+        chunk = staging.load(key, dtype={"service_request_id": str}, low_memory=False)
+        if not chunk.empty:
+            yield prepare(chunk)
 
 # =========================
-# 6) Saatlik özet
+# 5.1) Upsert (id, yenisi kalır) + 5 yıllık pencere dışını kırp
 # =========================
-hr = (df["hour"] // 3) * 3
-df["hour_range"] = hr.astype(str) + "-" + (hr + 3).astype(str)
-summary = (
-    df.groupby(["GEOID", "date", "hour_range"])
-      .size()
-      .reset_index(name="311_request_count")
-)
+# Birinci geçiş yalnızca kimlikleri toplar; ikinci geçişte her parçadan örtüşen/düzeltilmiş
+# kayıtların son hâli alınır (concat + drop_duplicates(keep="last") ile aynı sonuç).
+new_ids, last_seen = None, None
+if df_old is not None:
+    new_ids = pd.concat([p["id"] for p in new_parts()] or [pd.Series(dtype=object)], ignore_index=True)
+    last_seen = ~new_ids.duplicated(keep="last").to_numpy()
+    if new_ids.empty:
+        print("ℹ️ Watermark sonrası yeni 311 kaydı yok.")
+    print(blocks.report())  # ikinci geçişteki aramalar hafızadan döner; rapor ilk geçişi gösterir
+
+def final_parts():
+    """Kaydedilecek parçalar: önce mevcut ham kayıtlar (güncellenmeyenler), sonra yeni parçalar."""
+    if df_old is not None:
+        yield df_old[~df_old["id"].isin(new_ids)].drop_duplicates(subset=["id"], keep="last")
+    pos = 0
+    for part in new_parts():
+        if last_seen is not None:
+            keep = last_seen[pos:pos + len(part)]
+            pos += len(part)
+            part = part[keep]
+        yield part
 
 # =========================
-# 7) Kaydet (ham + özet)
+# 6) Saatlik özet + 7) ham kayıt (parça parça)
 # =========================
-safe_save_csv(df, raw_save_path)
-safe_save_csv(summary, agg_save_path)
-print(f"✅ Ham 311 verisi → {raw_save_path}")
+# Gruplama tamsayı anahtarlarla (join_keys); okunur etiketler yalnızca kaydederken üretilir.
+# Her parçanın sayıları ayrı gruplanır, sonda toplanır; ham dosya geçici dosyaya eklenerek yazılır.
+keys = [GEOID_KEY, DATE_KEY, HOUR_KEY]
+raw_tmp = raw_save_path + ".tmp"
+counts, n_rows, n_trimmed = [], 0, 0
+for part in final_parts():
+    n_before = len(part)
+    part = part[part["datetime"] >= pd.Timestamp(start_date)].copy()
+    n_trimmed += n_before - len(part)
+    part["date"] = part["datetime"].dt.date
+    part["hour"] = part["datetime"].dt.hour
+    part = with_keys(part, geoid=part["GEOID"], date=part["datetime"], hour=part["hour"])
+    if AGG_MODE:
+        # her satır zaten sunucuda sayılmış bir grup → sayıları topla
+        counts.append(part.groupby(keys)["request_count"].sum())
+    else:
+        counts.append(part.groupby(keys).size())
+        part["hour_range"] = hour_range_label(part[HOUR_KEY]).to_numpy()
+        try:
+            ensure_parent(raw_tmp)
+            part[[c for c in RAW_COLUMNS if c in part.columns]].to_csv(
+                raw_tmp, mode="a" if n_rows else "w", header=not n_rows, index=False)
+        except Exception as e:
+            raise SystemExit(f"❌ Kaydetme hatası: {raw_save_path}\n{e} — ara depo korundu, tekrar çalıştırınca yeniden yazılır.")
+    n_rows += len(part)
+
+if last_seen is None:
+    print(blocks.report())
+blocks.save_memo()
+if df_old is not None:
+    print(f"🔁 Upsert: {len(new_ids)} indirilen → toplam {n_rows} kayıt "
+          f"({n_trimmed} kayıt 5 yıllık pencere dışına düştü)")
+
+summary = (pd.concat(counts).groupby(level=keys).sum() if counts
+           else pd.Series(dtype="int64", index=pd.MultiIndex.from_arrays([[]] * 3, names=keys)))
+summary = summary.reset_index(name="311_request_count")
+
+if not AGG_MODE:
+    if not os.path.exists(raw_tmp):
+        pd.DataFrame(columns=RAW_COLUMNS).to_csv(raw_tmp, index=False)
+    os.replace(raw_tmp, raw_save_path)
+    staging.clear()  # ham dosyaya işlendi → ara depo artık gereksiz
+    print(f"✅ Ham 311 verisi → {raw_save_path}")
+safe_save_csv(pd.DataFrame({
+    "GEOID": geoid_label(summary[GEOID_KEY], target_len),
+    "date": date_label(summary[DATE_KEY]),
+    "hour_range": hour_range_label(summary[HOUR_KEY]),
+    "311_request_count": summary["311_request_count"],
+}), agg_save_path)
 print(f"✅ Saatlik özet  → {agg_save_path}")
 
 # =========================
 # 8) Suç verisi (sf_crime_01) ile birleştir
 # =========================
-if not os.path.exists(crime_01_path):
-    print("⚠️ sf_crime_01.csv bulunamadı. Birleştirme yapılamadı.")
+store = FeatureStore()
+if not store.base_path.exists():
+    print(f"⚠️ Özellik deposu base'i bulunamadı ({store.base_path}). Birleştirme yapılamadı.")
     raise SystemExit(0)
 
-print("🔗 sf_crime_01 ile birleştiriliyor...")
-crime = pd.read_csv(crime_01_path, dtype={"GEOID": str}, low_memory=False)
-
-# GEOID uzunluğunu crime dosyasına da uydur (güvenlik)
-target_len2 = crime["GEOID"].dropna().astype(str).str.len().mode().iat[0]
-summary["GEOID"] = normalize_geoid(summary["GEOID"], target_len2)
-crime["GEOID"]   = normalize_geoid(crime["GEOID"], target_len2)
+print("🔗 sf_crime_01 (özellik deposu) ile birleştiriliyor...")
+crime = store.read(CRIME_INPUT_COLS, upto=STEP)
+out_cols = []
 
-# hour_range üret (event_hour varsa oradan)
+# Birleştirme tamsayı anahtarlarla: GEOID uzunluğu / tarih biçimi / etiket farkları önemsizleşir.
+# hour_range yoksa event_hour'dan üretilir (etiket çıktıda kalır).
 if "hour_range" not in crime.columns:
-    if "event_hour" in crime.columns:
-        hr2 = (crime["event_hour"] // 3) * 3
-        crime["hour_range"] = hr2.astype(str) + "-" + (hr2 + 3).astype(str)
-    else:
+    if "event_hour" not in crime.columns:
         raise ValueError("❌ sf_crime_01 içinde 'hour_range' veya 'event_hour' sütunu eksik!")
+    crime["hour_range"] = hour_range_label(hour_code(crime["event_hour"])).to_numpy()
+    out_cols.append("hour_range")
+crime = with_keys(crime, geoid=crime["GEOID"], hour_range=crime["hour_range"],
+                  date=crime["date"] if "date" in crime.columns else crime["datetime"])
+if "date" not in crime.columns:
+    crime["date"] = date_label(crime[DATE_KEY]).to_numpy()
+    out_cols.append("date")
 
-# tarih tipini hizala
-crime["date"] = pd.to_datetime(
-    crime["date"] if "date" in crime.columns else crime["datetime"], errors="coerce"
-).dt.date
-
-merged = pd.merge(crime, summary, on=["GEOID", "date", "hour_range"], how="left")
+# left merge satır sırasını korur ve özet anahtarları tekildir → satırlar sf_crime_01 ile hizalı
+merged = drop_keys(pd.merge(crime, summary, on=keys, how="left"))
 merged["311_request_count"] = merged["311_request_count"].fillna(0).astype(int)
 
-safe_save_csv(merged, output_path)
-print(f"✅ Birleştirilmiş çıktı → {output_path}")
+store.write(STEP, merged[out_cols + ["311_request_count"]], name="sf_crime_02")
+print(f"✅ Birleştirilmiş çıktı → {store.sidecar_path(STEP)}")
@@ -4,6 +4,14 @@ from pathlib import Path
 
 import pandas as pd
 
+from crime_grid import read_sparse_grid, iter_dense
+from crime_schema import compact, memory_mb, read_crime_csv
+from feature_store import FeatureStore
+from join_keys import (
+    DATE_KEY, GEOID_KEY, HOUR_KEY, NA_GEOID,
+    date_label, drop_keys, geoid_code, geoid_label, hour_code, hour_range_label, with_keys,
+)
+
 # === 0) Yardımcılar ===
 def ensure_parent(path: str):
     Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
@@ -25,10 +33,6 @@ def find_col(ci_names, candidates):
             return lower_map[cand.lower()]
     return None
 
-def normalize_geoid(s: pd.Series, target_len: int) -> pd.Series:
-    s = s.astype(str).str.extract(r"(\d+)")[0]
-    return s.str.zfill(target_len)
-
 # === 1) Dosya yolları ===
 BASE_DIR = "crime_data"
 Path(BASE_DIR).mkdir(exist_ok=True)
@@ -37,7 +41,11 @@ raw_911_path       = os.path.join(BASE_DIR, "sf_911_full_raw.csv")
 summary_911_path   = os.path.join(BASE_DIR, "sf_911_last_5_year.csv")
 crime_grid_path_1  = os.path.join(BASE_DIR, "sf_crime_grid_full_labeled.csv")
 crime_grid_path_2  = os.path.join(".",       "sf_crime_grid_full_labeled.csv")  # fallback
-output_merge_path  = os.path.join(BASE_DIR, "sf_crime_01.csv")
+sparse_grid_paths  = [os.path.join(BASE_DIR, "sf_crime_grid_sparse.parquet"),
+                      os.path.join(".",      "sf_crime_grid_sparse.parquet")]
+sample_grid_paths  = [os.path.join(BASE_DIR, "sf_crime_grid_sample.parquet"),
+                      os.path.join(".",      "sf_crime_grid_sample.parquet")]
+GRID_MODE = os.environ.get("CRIME_GRID_MODE", "full")  # full | sample (update_crime.py ile aynı)
 
 # === 2) 911 verisini yükle ===
 if not os.path.exists(raw_911_path):
@@ -60,7 +68,7 @@ df = df.dropna(subset=["datetime"]).copy()
 geoid_col = find_col(df.columns, ["GEOID", "geoid", "geoid10", "block_geoid", "tract_geoid"])
 if geoid_col is None:
     raise ValueError("❌ 911 verisinde GEOID kolonu bulunamadı (ör. 'GEOID').")
-df["GEOID"] = df[geoid_col].astype(str)
+df["GEOID"] = df[geoid_col]
 
 # === 3) Son 5 yılı filtrele ===
 today = pd.Timestamp.today().normalize()
@@ -68,63 +76,104 @@ five_years_ago = today - pd.DateOffset(years=5)
 df = df[df["datetime"] >= five_years_ago].copy()
 print(f"🗓️ 5 yıllık filtre sonrası: {len(df)} satır (>= {five_years_ago.date()})")
 
-# === 4) Zaman özellikleri ===
-df["date"] = df["datetime"].dt.date
-df["hour"] = df["datetime"].dt.hour
-hr = (df["hour"] // 3) * 3
-df["hour_range"] = hr.astype(str) + "-" + (hr + 3).astype(str)
+# === 4) Birleştirme anahtarları ===
+# GEOID / tarih / 3 saatlik dilim tamsayı kodlarına çevrilir (join_keys); gruplama ve
+# birleştirme bu kolonlarla yapılır, okunur etiketler yalnızca kaydederken üretilir.
+df = with_keys(df, geoid=df["GEOID"], date=df["datetime"], hour=df["datetime"].dt.hour)
+df = df[df[GEOID_KEY] != NA_GEOID]  # GEOID'siz çağrılar gruplamaya girmez
 
 # === 5) Suç grid dosyasını yükle (hem target GEOID uzunluğunu öğrenmek hem merge için) ===
-crime_grid_path = crime_grid_path_1 if os.path.exists(crime_grid_path_1) else crime_grid_path_2
-if not os.path.exists(crime_grid_path):
-    raise FileNotFoundError("❌ Suç grid dosyası bulunamadı: "
-                            f"{crime_grid_path_1} veya {crime_grid_path_2}")
-
-crime = pd.read_csv(crime_grid_path, dtype={"GEOID": str}, low_memory=False)
-print(f"📥 Suç grid yüklendi: {len(crime)} satır ({crime_grid_path})")
+# Seyrek grid varsa yalnızca dolu hücreler okunur; boş hücrelerin tarihi olmadığından 911 ile
+# eşleşmezler (sayılar 0) ve çıktıya GEOID parçaları hâlinde yazılırken eklenir.
+# Sample modunda eğitim örneklemi (dolu hücreler + ağırlıklı negatifler) olduğu gibi işlenir.
+sample_grid_path = next((p for p in sample_grid_paths if os.path.exists(p)), None) if GRID_MODE == "sample" else None
+sparse_grid_path = next((p for p in sparse_grid_paths if os.path.exists(p)), None)
+if GRID_MODE == "sample" and sample_grid_path is None:
+    raise FileNotFoundError(f"❌ CRIME_GRID_MODE=sample ama eğitim örneklemi bulunamadı: {sample_grid_paths[0]}")
+if sample_grid_path is not None:
+    crime, _ = read_sparse_grid(sample_grid_path)
+    grid_geoids = None
+    print(f"📥 Eğitim örneklemi yüklendi: {len(crime)} satır ({sample_grid_path})")
+elif sparse_grid_path is not None:
+    crime, grid_geoids = read_sparse_grid(sparse_grid_path)
+    print(f"📥 Seyrek suç grid yüklendi: {len(crime)} dolu hücre, {len(grid_geoids)} GEOID ({sparse_grid_path})")
+else:
+    crime_grid_path = crime_grid_path_1 if os.path.exists(crime_grid_path_1) else crime_grid_path_2
+    if not os.path.exists(crime_grid_path):
+        raise FileNotFoundError("❌ Suç grid dosyası bulunamadı: "
+                                f"{sparse_grid_paths[0]}, {crime_grid_path_1} veya {crime_grid_path_2}")
+    crime = read_crime_csv(crime_grid_path)
+    grid_geoids = None
+    print(f"📥 Suç grid yüklendi: {len(crime)} satır ({crime_grid_path})")
 
 if "event_hour" not in crime.columns:
     raise ValueError("❌ Suç grid dosyasında 'event_hour' sütunu eksik!")
 
 # GEOID hedef uzunluğu (grid’e göre otomatik)
-target_len = crime["GEOID"].dropna().astype(str).str.len().mode().iat[0]
-df["GEOID"]     = normalize_geoid(df["GEOID"], target_len)
-crime["GEOID"]  = normalize_geoid(crime["GEOID"], target_len)
+geoid_sample = pd.Series(grid_geoids, dtype=str) if grid_geoids is not None else crime["GEOID"]
+target_len = geoid_sample.dropna().astype(str).str.len().mode().iat[0]
+if grid_geoids is not None:
+    grid_geoids = geoid_label(geoid_code(grid_geoids), target_len).tolist()
 
 # === 6) 911 özet tablo (5 yıl) ===
-hourly_summary = (
-    df.groupby(["GEOID", "date", "hour_range"]).size()
-      .reset_index(name="911_request_count_hour_range")
-)
-daily_summary = (
-    df.groupby(["GEOID", "date"]).size()
-      .reset_index(name="911_request_count_daily(before_24_hours)")
-)
-final_911 = pd.merge(hourly_summary, daily_summary, on=["GEOID", "date"], how="left")
-
-# Kaydet
-safe_save_csv(final_911, summary_911_path)
+keys = [GEOID_KEY, DATE_KEY, HOUR_KEY]
+count_cols = ["911_request_count_hour_range", "911_request_count_daily(before_24_hours)"]
+hourly_summary = df.groupby(keys).size().reset_index(name=count_cols[0])
+daily_summary = df.groupby([GEOID_KEY, DATE_KEY]).size().reset_index(name=count_cols[1])
+final_911 = pd.merge(hourly_summary, daily_summary, on=[GEOID_KEY, DATE_KEY], how="left")
+
+# Kaydet (etiketler yalnızca burada üretilir)
+safe_save_csv(pd.DataFrame({
+    "GEOID": geoid_label(final_911[GEOID_KEY], target_len),
+    "date": date_label(final_911[DATE_KEY]),
+    "hour_range": hour_range_label(final_911[HOUR_KEY]),
+    **{c: final_911[c] for c in count_cols},
+}), summary_911_path)
 print(f"✅ 911 özeti kaydedildi → {summary_911_path}")
 
 # === 7) Suç grid ile birleştir ===
-# event_hour → hour_range
-crime["hour_range"] = ((crime["event_hour"] // 3) * 3).astype(int)
-crime["hour_range"] = crime["hour_range"].astype(str) + "-" + (crime["hour_range"].astype(int) + 3).astype(str)
-
-# tarih tipini hizala
-if "date" not in crime.columns:
-    if "datetime" in crime.columns:
-        crime["date"] = pd.to_datetime(crime["datetime"], errors="coerce").dt.date
-    else:
-        raise ValueError("❌ Suç grid dosyasında 'date' veya 'datetime' sütunu bulunamadı!")
+def add_hour_range(frame: pd.DataFrame) -> pd.DataFrame:
+    # event_hour → hour_range
+    frame["hour_range"] = hour_range_label(hour_code(frame["event_hour"])).to_numpy()
+    return frame
+
+if "date" not in crime.columns and "datetime" not in crime.columns:
+    raise ValueError("❌ Suç grid dosyasında 'date' veya 'datetime' sütunu bulunamadı!")
+crime = with_keys(crime, geoid=crime["GEOID"], hour=crime["event_hour"],
+                  date=crime["date"] if "date" in crime.columns else crime["datetime"])
+crime["GEOID"] = geoid_label(crime[GEOID_KEY], target_len).to_numpy()
+crime["hour_range"] = hour_range_label(crime[HOUR_KEY]).to_numpy()
+crime["date"] = date_label(crime[DATE_KEY]).to_numpy()
+
+# Merge (tamsayı anahtarlar üzerinden)
+merged = drop_keys(pd.merge(crime, final_911, on=keys, how="left"))
+for c in count_cols:
+    merged[c] = merged[c].fillna(0).astype(int)
+
+# Kaydet → özellik deposunun base tablosu (sf_crime_01'in yerini alır; sonraki adımlar yan dosya yazar)
+store = FeatureStore()
+if grid_geoids is None:
+    store.write_base(compact(merged, "sf_crime_01"), name="sf_crime_01")
 else:
-    crime["date"] = pd.to_datetime(crime["date"], errors="coerce").dt.date
-
-# Merge
-merged = pd.merge(crime, final_911, on=["GEOID", "date", "hour_range"], how="left")
-merged["911_request_count_hour_range"] = merged["911_request_count_hour_range"].fillna(0).astype(int)
-merged["911_request_count_daily(before_24_hours)"] = merged["911_request_count_daily(before_24_hours)"].fillna(0).astype(int)
-
-# Kaydet
-safe_save_csv(merged, output_merge_path)
-print(f"✅ Suç + 911 birleştirmesi tamamlandı → {output_merge_path}")
+    # Tam grid bellekte kurulmaz: GEOID parçaları açılıp sırayla base'e eklenir.
+    cols = list(merged.columns)
+    mem = [0.0, 0.0]  # parçaların şema öncesi/sonrası bellek toplamı
+
+    def compact_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+        chunk = add_hour_range(chunk)[cols]
+        mem[0] += memory_mb(chunk)
+        chunk = compact(chunk)
+        mem[1] += memory_mb(chunk)
+        return chunk
+
+    chunks = (compact_chunk(chunk)
+              for chunk in iter_dense(merged.drop(columns="hour_range"), grid_geoids,
+                                      zero_cols=("crime_count", "Y_label", *count_cols)))
+    try:
+        n_rows = store.write_base(chunks, name="sf_crime_01")
+        print(f"🧊 Seyrek gridden {n_rows} satır yazıldı ({len(merged)} dolu hücre)")
+        print(f"🧮 sf_crime_01: bellek {mem[0]:.1f} MB → {mem[1]:.1f} MB (parça toplamı)")
+    except Exception as e:
+        print(f"❌ Kaydetme hatası: {store.base_path}\n{e}")
+        raise
+print(f"✅ Suç + 911 birleştirmesi tamamlandı → {store.base_path}")
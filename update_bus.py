@@ -1,13 +1,16 @@
 import os
 from pathlib import Path
-from datetime import datetime
-from urllib.parse import quote
 
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 from scipy.spatial import cKDTree
 
+from block_index import load_block_index
+from feature_store import FeatureStore
+from socrata_client import SocrataClient
+from source_freshness import FreshnessRegistry, file_token, socrata_token
+
 # =========================
 # Yardımcılar
 # =========================
@@ -23,10 +26,6 @@ def safe_save_csv(df: pd.DataFrame, path: str):
         df.to_csv(path + ".bak", index=False)
         print(f"📁 Yedek oluşturuldu: {path}.bak")
 
-def normalize_geoid(s: pd.Series, target_len: int) -> pd.Series:
-    s = s.astype(str).str.extract(r"(\d+)")[0]
-    return s.str.zfill(target_len)
-
 def freedman_diaconis_bin_count(data: np.ndarray, max_bins: int = 10) -> int:
     data = np.asarray(data)
     if len(data) < 2 or np.all(data == data[0]):
@@ -46,9 +45,11 @@ def freedman_diaconis_bin_count(data: np.ndarray, max_bins: int = 10) -> int:
 BASE_DIR = "crime_data"
 Path(BASE_DIR).mkdir(exist_ok=True)
 
-CRIME_INPUT     = os.path.join(BASE_DIR, "sf_crime_03.csv")
+STEP            = "bus"  # özellik deposundaki adım adı (sf_crime_04'ün karşılığı)
 BUS_OUTPUT      = os.path.join(BASE_DIR, "sf_bus_stops_with_geoid.csv")
-CRIME_OUTPUT    = os.path.join(BASE_DIR, "sf_crime_04.csv")
+# Depodan okunan ve yan dosyaya yazılan kolonlar (önceki kolonlara dokunulmaz)
+CRIME_INPUT_COLS = ["latitude", "longitude"]
+OUTPUT_COLS      = ["distance_to_bus", "bus_stop_count", "distance_to_bus_range", "bus_stop_count_range"]
 
 # census geojson hem crime_data/ hem kökte olabilir
 CENSUS_CANDIDATES = [
@@ -56,72 +57,82 @@ CENSUS_CANDIDATES = [
     os.path.join(".", "sf_census_blocks_with_population.geojson"),
 ]
 
-# =========================
-# 2) Socrata’dan otobüs duraklarını indir (paginasyonlu)
-# =========================
-print("🚌 Otobüs durakları Socrata API'den indiriliyor...")
-rows, limit, offset = [], 50000, 0  # büyük çekelim; Socrata limit üst sınırı 50k
-base = "https://data.sfgov.org/resource/i28k-bkz6.json"
-select = "$select=stop_id,stop_name,latitude,longitude"
-while True:
-    url = f"{base}?{select}&$limit={limit}&$offset={offset}"
-    try:
-        chunk = pd.read_json(url)
-    except Exception as e:
-        print(f"❌ İndirme hatası (offset={offset}): {e}")
-        break
-    if chunk is None or chunk.empty:
-        break
-    rows.append(chunk)
-    offset += len(chunk)
-    print(f"  + {offset} kayıt indirildi...")
-    if len(chunk) < limit:
-        break
-
-if not rows:
-    raise SystemExit("⚠️ Otobüs durakları alınamadı; çıkılıyor.")
-
-bus = pd.concat(rows, ignore_index=True)
-bus = bus.dropna(subset=["latitude", "longitude"]).copy()
-bus["stop_lat"] = bus["latitude"].astype(float)
-bus["stop_lon"] = bus["longitude"].astype(float)
+BUS_DATASET = "i28k-bkz6"
 
 # =========================
-# 3) GEOID eşlemesi (census sjoin)
+# 1.1) Tazelik kontrolü (duraklar + bloklar + suç girdisi)
 # =========================
 census_path = next((p for p in CENSUS_CANDIDATES if os.path.exists(p)), None)
 if census_path is None:
     raise FileNotFoundError("❌ Nüfus blokları GeoJSON bulunamadı (crime_data/ veya kök).")
 
-gdf_bus = gpd.GeoDataFrame(
-    bus, geometry=gpd.points_from_xy(bus["stop_lon"], bus["stop_lat"]), crs="EPSG:4326"
-)
-gdf_blocks = gpd.read_file(census_path)
+fresh = FreshnessRegistry()
+store = FeatureStore()
+CRIME_OUTPUT = str(store.sidecar_path(STEP))
+crime_token = store.token(CRIME_INPUT_COLS, upto=STEP)
+stops_token = f"{socrata_token(BUS_DATASET)}|{file_token(census_path)}"
+if stops_token.startswith("None|"):
+    stops_token = None  # meta veri alınamadı → her zaman indir
+step_token = f"{stops_token}|{crime_token}" if stops_token else None
+
+# Duraklar ve suç girdisi değişmediyse KD-tree/binleme sonucu da aynıdır → adımı atla
+if fresh.is_fresh("step:update_bus", step_token, BUS_OUTPUT, CRIME_OUTPUT):
+    fresh.update(f"socrata:{BUS_DATASET}", stops_token, from_cache=True)
+    fresh.update("step:update_bus", step_token, from_cache=True)
+    fresh.save("update_bus")
+    store.export_chain("sf_crime_04", STEP)  # önceki adımlar değişmiş olabilir → zincir CSV'si görünümden yenilenir
+    print(f"⏭️ Otobüs durakları ve suç girdisi değişmemiş; {CRIME_OUTPUT} olduğu gibi kullanılıyor.")
+    raise SystemExit(0)
+
+if fresh.is_fresh(f"socrata:{BUS_DATASET}", stops_token, BUS_OUTPUT):
+    # =========================
+    # 2-3) Duraklar değişmemiş → indirme + sjoin yerine önceki çıktı
+    # =========================
+    print(f"🗃️ Otobüs durakları değişmemiş (rowsUpdatedAt aynı); {BUS_OUTPUT} kullanılıyor.")
+    gdf_bus = pd.read_csv(BUS_OUTPUT, dtype={"GEOID": str}, low_memory=False)
+    fresh.update(f"socrata:{BUS_DATASET}", stops_token, from_cache=True)
+else:
+    # =========================
+    # 2) Socrata’dan otobüs duraklarını indir (paginasyonlu)
+    # =========================
+    print("🚌 Otobüs durakları Socrata API'den indiriliyor...")
+    client = SocrataClient()
+    try:
+        # Şema (stop_id, stop_name, latitude, longitude) → $select + tipli kolon çözümleme
+        bus = client.fetch_typed(BUS_DATASET, page_size=50000)  # Socrata limit üst sınırı 50k
+        print(f"  + {len(bus)} kayıt indirildi...")
+    except Exception as e:
+        print(f"❌ İndirme hatası: {e}")
+        bus = pd.DataFrame()
+    print(client.summary())
 
-# GEOID hedef uzunluğunu block dosyasından öğren
-target_len = gdf_blocks["GEOID"].astype(str).str.len().mode().iat[0]
-gdf_blocks["GEOID"] = normalize_geoid(gdf_blocks["GEOID"], target_len)
+    if bus.empty:
+        raise SystemExit("⚠️ Otobüs durakları alınamadı; çıkılıyor.")
 
-gdf_bus = gpd.sjoin(gdf_bus, gdf_blocks[["GEOID", "geometry"]], how="left", predicate="within")
-gdf_bus = gdf_bus.drop(columns=["geometry", "index_right"], errors="ignore")
-gdf_bus["GEOID"] = normalize_geoid(gdf_bus["GEOID"], target_len)
+    bus = bus.dropna(subset=["latitude", "longitude"]).copy()
+    bus["stop_lat"] = bus["latitude"].astype(float)
+    bus["stop_lon"] = bus["longitude"].astype(float)
 
-safe_save_csv(gdf_bus, BUS_OUTPUT)
-print(f"✅ Otobüs durakları (GEOID ile) kaydedildi → {BUS_OUTPUT}")
+    # =========================
+    # 3) GEOID eşlemesi (önbellekli blok dizini)
+    # =========================
+    blocks = load_block_index(census_path)
+    gdf_bus = bus.assign(GEOID=blocks.assign_geoid(bus["stop_lon"], bus["stop_lat"]))
+
+    safe_save_csv(gdf_bus, BUS_OUTPUT)
+    print(f"✅ Otobüs durakları (GEOID ile) kaydedildi → {BUS_OUTPUT}")
+    fresh.update(f"socrata:{BUS_DATASET}", stops_token, from_cache=False)
 
 # =========================
 # 4) Suç verisini yükle
 # =========================
-if not os.path.exists(CRIME_INPUT):
-    raise FileNotFoundError(f"❌ Suç girdi dosyası yok: {CRIME_INPUT}")
+if crime_token is None:
+    raise FileNotFoundError(f"❌ Suç girdisi (özellik deposu base) yok: {store.base_path}")
 
-crime = pd.read_csv(CRIME_INPUT, dtype={"GEOID": str}, low_memory=False)
+crime = store.read(CRIME_INPUT_COLS, upto=STEP)
 if not {"latitude", "longitude"}.issubset(crime.columns):
     raise ValueError("❌ Suç verisinde 'latitude' ve/veya 'longitude' sütunu eksik!")
 
-# GEOID uzunluğunu suç verisine de uydur
-crime["GEOID"] = normalize_geoid(crime["GEOID"], target_len)
-
 # =========================
 # 5) Projeksiyon (EPSG:3857) ve KDTree için koordinat matrisleri
 # =========================
@@ -188,7 +199,8 @@ else:
 # =========================
 # 7) Kaydet
 # =========================
-df_final = gdf_crime.drop(columns="geometry")
-safe_save_csv(df_final, CRIME_OUTPUT)
+store.write(STEP, gdf_crime[OUTPUT_COLS], name="sf_crime_04")
+fresh.update("step:update_bus", step_token, from_cache=False)
+fresh.save("update_bus")
 print("✅ Otobüs verisi başarıyla entegre edildi.")
 print("📁 Kayıt tamamlandı →", CRIME_OUTPUT)
@@ -2,54 +2,118 @@
 
 import os
 import time
-import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from urllib.parse import quote
 from pathlib import Path
 import shutil
 
 import numpy as np
 import pandas as pd
-import geopandas as gpd
 from shapely.geometry import Point
 import holidays
 
+from block_index import load_block_index
+from checkpoint_staging import ChunkStaging
+from crime_grid import (GridState, first_seen_geoids, iter_dense, training_sample, write_dense_csv,
+                        write_sparse_grid, CELLS_PER_GEOID, INPUT_COLS as GRID_INPUT_COLS)
+from crime_store import CrimeEventStore, month_key
+from socrata_client import SocrataClient
+
 # === Güvenli Kaydetme Fonksiyonu ===
 def safe_save(df, path):
     try:
         Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
         df.to_csv(path, index=False)
+        return True
     except Exception as e:
         print(f"❌ Kaydedilemedi: {path}\n{e}")
         backup_path = path + ".bak"
         df.to_csv(backup_path, index=False)
         print(f"📁 Yedek dosya oluşturuldu: {backup_path}")
+        return False
 
 def normalize_geoid(series: pd.Series, target_len: int) -> pd.Series:
     s = series.astype(str).str.extract(r"(\d+)")[0]
     return s.str.zfill(target_len)
 
+# === Zaman özellikleri (yeni günler ve ilk taşıma için ortak) ===
+def add_time_features(df: pd.DataFrame, start_date) -> pd.DataFrame:
+    df = df.copy()
+    # Tip hizalama (eski CSV'de time olmayabilir)
+    if "time" not in df.columns:
+        df["time"] = "00:00:00"
+    df["date"] = pd.to_datetime(df["date"]).dt.date
+    df["id"] = df["id"].astype(str)
+    df = df.drop_duplicates(subset="id")
+    df = df[df["date"] >= start_date]
+
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["time"] = df["time"].astype(str).fillna("00:00:00")
+    df["datetime"] = pd.to_datetime(df["date"].dt.strftime("%Y-%m-%d") + " " + df["time"], errors="coerce")
+    df = df.dropna(subset=["datetime"]).copy()
+    df["datetime"] = df["datetime"].dt.floor("H")
+    df["event_hour"] = df["datetime"].dt.hour
+
+    df["day_of_week"] = df["datetime"].dt.dayofweek
+    df["month"] = df["datetime"].dt.month
+    years = sorted(df["datetime"].dt.year.dropna().unique().tolist())
+    us_holidays = pd.to_datetime(list(holidays.US(years=years).keys()))
+    df["is_weekend"] = (df["day_of_week"] >= 5).astype(int)
+    df["is_night"] = ((df["event_hour"] >= 20) | (df["event_hour"] < 4)).astype(int)
+    df["is_holiday"] = df["date"].isin(us_holidays.normalize()).astype(int)
+    df["is_school_hour"] = df["event_hour"].between(7, 16).astype(int)
+    df["is_business_hour"] = ((df["event_hour"].between(9, 17)) & (df["day_of_week"] < 5)).astype(int)
+    df["season"] = df["month"].map({
+        12: "Winter", 1: "Winter", 2: "Winter",
+        3: "Spring", 4: "Spring", 5: "Spring",
+        6: "Summer", 7: "Summer", 8: "Summer",
+        9: "Fall", 10: "Fall", 11: "Fall"
+    })
+    df["Y_label"] = 1
+    # Bölümler arası şema sabit kalsın: kategorik kolonlar düz metin olarak saklanır
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype(object)
+    return df
+
 # === 1. Dosya yolları ===
 save_dir   = "."  # repo kökü
 csv_path   = os.path.join(save_dir, "sf_crime.csv")
-sum_path   = os.path.join(save_dir, "sf_crime_grid_summary_labeled.csv")
-full_path  = os.path.join(save_dir, "sf_crime_grid_full_labeled.csv")
+store_dir  = os.path.join(save_dir, "crime_events")  # yıl-ay bölümlü olay deposu (Parquet)
+sum_path   = os.path.join(save_dir, "sf_crime_grid_summary_labeled.csv")   # tam grid (eski adıyla, full_path kopyası)
+full_path  = os.path.join(save_dir, "sf_crime_grid_full_labeled.csv")      # tam grid (isteğe bağlı)
+nonzero_path = os.path.join(save_dir, "sf_crime_grid_nonzero_labeled.csv") # sadece olay olan hücreler
+sparse_path = os.path.join(save_dir, "sf_crime_grid_sparse.parquet")        # seyrek grid + boyutlar
+sample_path = os.path.join(save_dir, "sf_crime_grid_sample.parquet")        # eğitim örneklemi (sample modu)
 blocks_path = os.path.join(save_dir, "sf_census_blocks_with_population.geojson")
+grid_state_path = os.path.join(store_dir, "_grid_state.parquet")  # artımlı grid toplamları
 
 # === 2. Tarih aralığı ===
 today = datetime.today().date()
 start_date = today - timedelta(days=5 * 365)
 
-# === 3. Önceki veriyi oku ===
-try:
-    df_old = pd.read_csv(csv_path, parse_dates=["date"], dtype={"GEOID": str})
-    df_old["GEOID"] = df_old["GEOID"].astype(str)  # uzunluğu sonra normalize edeceğiz
-    df_old["id"] = df_old["id"].astype(str)
-    df_old["date"] = pd.to_datetime(df_old["date"]).dt.date
-    latest_date = df_old["date"].max()
-    print(f"📂 Mevcut veri yüklendi: {len(df_old)} satır (son tarih: {latest_date})")
-except Exception:
-    df_old = pd.DataFrame(columns=["id", "date"])
+# === 3. Olay deposunu aç (ilk çalıştırmada sf_crime.csv'den taşı) ===
+# Tüm geçmiş her gün okunup yeniden yazılmaz: yeni günler sadece kendi ay bölümlerine yazılır.
+# CRIME_EXPORT_CSV=1 ile eski tek parça sf_crime.csv de dışa aktarılır.
+EXPORT_CSV = os.environ.get("CRIME_EXPORT_CSV", "0") == "1"
+store = CrimeEventStore(store_dir)
+if store.is_empty() and os.path.exists(csv_path):
+    try:
+        df_seed = pd.read_csv(csv_path, dtype={"GEOID": str, "id": str}, low_memory=False)
+        if "GEOID" in df_seed.columns:
+            lens = df_seed["GEOID"].dropna().astype(str).str.extract(r"(\d+)")[0].str.len().mode()
+            df_seed["GEOID"] = normalize_geoid(df_seed["GEOID"], int(lens.iat[0]) if not lens.empty else 12)
+        df_seed = add_time_features(df_seed, start_date)
+        added = store.upsert(df_seed)
+        print(f"📦 {csv_path} olay deposuna taşındı: {sum(added.values())} satır, {len(added)} ay bölümü")
+        del df_seed
+    except Exception as e:
+        print(f"⚠️ {csv_path} taşınamadı ({e}); depo boş başlıyor.")
+
+latest_date = store.max_date()
+if latest_date is not None:
+    print(f"📂 Olay deposu: {len(store.months())} ay bölümü (son tarih: {latest_date})")
+else:
     latest_date = start_date - timedelta(days=1)
     print("🆕 Önceki veri bulunamadı. Sıfırdan başlıyor...")
 
@@ -58,196 +122,249 @@ date_range = pd.date_range(start=latest_date + timedelta(days=1), end=today)
 missing_dates = [d.date() for d in date_range]
 print(f"📆 Eksik tarihler: {len(missing_dates)}")
 
-# === 4.1 Blok dosyasını (varsa) hazırla & GEOID hedef uzunluğu tespit et ===
-gdf_blocks = None
+# === 4.1 Blok dizinini (varsa) yükle & GEOID hedef uzunluğu tespit et ===
+# Geometriler + STRtree önbellekten gelir (crime_data/_cache); blok dosyası değişince yeniden kurulur.
+blocks = None
 target_len = 12  # emniyetli varsayılan
 if os.path.exists(blocks_path):
     try:
-        gdf_blocks = gpd.read_file(blocks_path)
-        target_len = gdf_blocks["GEOID"].astype(str).str.len().mode().iat[0]
-        gdf_blocks["GEOID"] = normalize_geoid(gdf_blocks["GEOID"], target_len)
+        blocks = load_block_index(blocks_path)
+        target_len = blocks.target_len
     except Exception as e:
         print(f"⚠️ Blok dosyası okunamadı ({blocks_path}): {e}. GEOID eşlemesi atlanacak.")
-        gdf_blocks = None
+        blocks = None
 else:
     print(f"⚠️ {blocks_path} bulunamadı; GEOID eşlemesi atlandı.")
 
 # === 5. Veriyi indir ===
+# Eşzamanlı indirme ayarları (ortam değişkeni ile değiştirilebilir)
+FETCH_WORKERS = max(1, int(os.environ.get("CRIME_FETCH_WORKERS", "4")))
+FETCH_RPS     = float(os.environ.get("CRIME_FETCH_RPS", "4"))   # tüm thread'ler için toplam istek/sn
+FETCH_RETRIES = max(1, int(os.environ.get("CRIME_FETCH_RETRIES", "3")))
+
+# Kolon projeksiyonu ve tipler socrata_client.SCHEMAS["wg3w-h783"] içinde beyan edilir
+# (ID adayları + zaman + konum + kategori); sayfalar doğrudan tipli kolonlara çözülür.
+CRIME_DATASET = "wg3w-h783"
+
+# Ortak havuzlu istemci: keep-alive + gzip + backoff + tüm thread'ler için ortak istek/sn sınırı
+client = SocrataClient(rps=FETCH_RPS, pool_size=FETCH_WORKERS)
+
 def download_crime_for_date(date_obj):
     date_str = date_obj.isoformat()
-    soql = f"$where=incident_datetime between '{date_str}T00:00:00' and '{date_str}T23:59:59'"
-    query_encoded = quote(soql, safe="=&")
-    base_url = "https://data.sfgov.org/resource/wg3w-h783.json"
-    limit, offset, all_chunks = 1000, 0, []
-
-    while True:
-        url = f"{base_url}?{query_encoded}&$limit={limit}&$offset={offset}"
-        # basit retry
-        chunk = None
-        for attempt in range(4):
-            try:
-                chunk = pd.read_json(url)
-                break
-            except Exception as e:
-                if attempt == 3:
-                    print(f"❌ {date_str} indirilemedi: {e}")
-                    return None
-                time.sleep(1.5 * (attempt + 1))
-        if chunk is None or chunk.empty:
-            break
-        all_chunks.append(chunk)
-        offset += limit
-        time.sleep(0.3)
-
-    if all_chunks:
-        df = pd.concat(all_chunks, ignore_index=True)
-        df["date"] = date_obj
-        return df
-    return None
-
-# === 6. Verileri indir ve birleştir ===
-new_data = []
-for d in missing_dates:
-    print(f"📥 {d} indiriliyor...")
-    df_day = download_crime_for_date(d)
-    if df_day is not None:
-        new_data.append(df_day)
-
-# === 7. Temizle ve GEOID ata ===
-if new_data:
-    df_new = pd.concat(new_data, ignore_index=True)
+    where = f"incident_datetime between '{date_str}T00:00:00' and '{date_str}T23:59:59'"
+    try:
+        df = client.fetch_typed(CRIME_DATASET, where=where, page_size=1000)
+    except Exception as e:
+        raise RuntimeError(f"{date_str} indirilemedi: {e}") from e
+    if df.empty:
+        return None
+    df["date"] = date_obj
+    return df
+
+def fetch_day_with_retry(date_obj):
+    """Günü indirir; hata olursa artan beklemeyle tekrar dener. (df, süre_sn, deneme) döner."""
+    t0 = time.perf_counter()
+    for attempt in range(1, FETCH_RETRIES + 1):
+        try:
+            df_day = download_crime_for_date(date_obj)
+            return df_day, time.perf_counter() - t0, attempt
+        except Exception as e:
+            if attempt == FETCH_RETRIES:
+                raise
+            print(f"⚠️ {e} → tekrar denenecek ({attempt}/{FETCH_RETRIES})")
+            time.sleep(2.0 * attempt)
+
+# === 7. Temizle ve GEOID ata (gün bazında; indirme ile paralel ilerler) ===
+def clean_and_assign_geoid(df_day: pd.DataFrame) -> pd.DataFrame:
+    df_day = df_day.copy()
 
     # datetime & temel sütunlar
-    df_new["datetime"] = pd.to_datetime(df_new["incident_datetime"], errors="coerce")
-    df_new["date"] = df_new["datetime"].dt.date
-    df_new["time"] = df_new["datetime"].dt.time
-    df_new["event_hour"] = df_new["datetime"].dt.hour
+    df_day["datetime"] = pd.to_datetime(df_day["incident_datetime"], errors="coerce")
+    df_day["date"] = df_day["datetime"].dt.date
+    df_day["time"] = df_day["datetime"].dt.time
+    df_day["event_hour"] = df_day["datetime"].dt.hour
 
     # sağlam ID üretimi
-    id_cols = [c for c in ["row_id", "incident_id", "incident_number", "cad_number"] if c in df_new.columns]
+    id_cols = [c for c in ["row_id", "incident_id", "incident_number", "cad_number"] if c in df_day.columns]
     if id_cols:
-        s = df_new[id_cols[0]].astype(str)
+        s = df_day[id_cols[0]].astype(str)
         for c in id_cols[1:]:
-            s = s.where(s.notna() & (s.astype(str) != "nan"), df_new[c].astype(str))
-        df_new["id"] = s
+            s = s.where(s.notna() & (s.astype(str) != "nan"), df_day[c].astype(str))
+        df_day["id"] = s
     else:
-        df_new["id"] = np.nan
-    mask = df_new["id"].isna() | (df_new["id"].astype(str) == "nan")
+        df_day["id"] = np.nan
+    for c in ("latitude", "longitude"):
+        if c not in df_day.columns:
+            df_day[c] = np.nan
+    mask = df_day["id"].isna() | (df_day["id"].astype(str) == "nan")
     if mask.any():
-        df_new.loc[mask, "id"] = (
-            df_new.loc[mask, "datetime"].astype(str)
+        df_day.loc[mask, "id"] = (
+            df_day.loc[mask, "datetime"].astype(str)
             + "_"
-            + df_new.loc[mask, "latitude"].round(6).astype(str)
+            + df_day.loc[mask, "latitude"].round(6).astype(str)
             + "_"
-            + df_new.loc[mask, "longitude"].round(6).astype(str)
+            + df_day.loc[mask, "longitude"].round(6).astype(str)
         )
-    df_new["id"] = df_new["id"].astype(str)
+    df_day["id"] = df_day["id"].astype(str)
 
     # isimlendirme & filtreler
-    df_new = df_new.rename(columns={"incident_category": "category", "incident_subcategory": "subcategory"})
-    df_new = df_new[["id", "date", "time", "event_hour", "latitude", "longitude", "category", "subcategory"]]
-    df_new = df_new.dropna(subset=["latitude", "longitude", "id", "date", "category"])
-    df_new = df_new[(df_new["latitude"] > 37.6) & (df_new["latitude"] < 37.9)]
-    df_new = df_new[(df_new["longitude"] > -123.2) & (df_new["longitude"] < -122.3)]
+    df_day = df_day.rename(columns={"incident_category": "category", "incident_subcategory": "subcategory"})
+    df_day = df_day.reindex(columns=["id", "date", "time", "event_hour", "latitude", "longitude", "category", "subcategory"])
+    df_day = df_day.dropna(subset=["latitude", "longitude", "id", "date", "category"])
+    df_day = df_day[(df_day["latitude"] > 37.6) & (df_day["latitude"] < 37.9)]
+    df_day = df_day[(df_day["longitude"] > -123.2) & (df_day["longitude"] < -122.3)]
 
     # GEOID eşlemesi (opsiyonel)
-    gdf = gpd.GeoDataFrame(df_new, geometry=gpd.points_from_xy(df_new["longitude"], df_new["latitude"]), crs="EPSG:4326")
-    if gdf_blocks is not None:
-        gdf = gpd.sjoin(gdf, gdf_blocks[["GEOID", "geometry"]], how="left", predicate="within")
-        gdf = gdf.drop(columns=["geometry", "index_right"], errors="ignore")
-        gdf["GEOID"] = normalize_geoid(gdf["GEOID"], target_len)
-    else:
-        gdf["GEOID"] = np.nan
-        gdf = gdf.drop(columns=["geometry"], errors="ignore")
-    df_new = pd.DataFrame(gdf)
+    geoid = blocks.assign_geoid(df_day["longitude"], df_day["latitude"]) if blocks is not None else np.nan
+    return df_day.assign(GEOID=geoid)
 
-    # df_old GEOID'lerini de aynı hedef uzunluğa çek
-    if "GEOID" in df_old.columns:
-        df_old["GEOID"] = normalize_geoid(df_old["GEOID"], target_len)
-else:
-    df_new = pd.DataFrame()
-
-# === 8. Birleştir ve özellikleri ata ===
-# Tip hizalama (df_old'ta time olmayabilir)
-if "time" not in df_old.columns:
-    df_old["time"] = "00:00:00"
-if "date" in df_old.columns:
-    df_old["date"] = pd.to_datetime(df_old["date"]).dt.date
-
-df_all = pd.concat([df_old, df_new], ignore_index=True)
-df_all["id"] = df_all["id"].astype(str)
-df_all = df_all.drop_duplicates(subset="id")
-df_all = df_all[df_all["date"] >= start_date]
-
-df_all["date"] = pd.to_datetime(df_all["date"], errors="coerce")
-df_all["time"] = df_all["time"].astype(str).fillna("00:00:00")
-df_all["datetime"] = pd.to_datetime(df_all["date"].dt.strftime("%Y-%m-%d") + " " + df_all["time"], errors="coerce")
-df_all = df_all.dropna(subset=["datetime"]).copy()
-df_all["datetime"] = df_all["datetime"].dt.floor("H")
-df_all["event_hour"] = df_all["datetime"].dt.hour
-
-df_all["day_of_week"] = df_all["datetime"].dt.dayofweek
-df_all["month"] = df_all["datetime"].dt.month
-years = sorted(df_all["datetime"].dt.year.dropna().unique().tolist())
-us_holidays = pd.to_datetime(list(holidays.US(years=years).keys()))
-df_all["is_weekend"] = (df_all["day_of_week"] >= 5).astype(int)
-df_all["is_night"] = ((df_all["event_hour"] >= 20) | (df_all["event_hour"] < 4)).astype(int)
-df_all["is_holiday"] = df_all["date"].isin(us_holidays.normalize()).astype(int)
-df_all["is_school_hour"] = df_all["event_hour"].between(7, 16).astype(int)
-df_all["is_business_hour"] = ((df_all["event_hour"].between(9, 17)) & (df_all["day_of_week"] < 5)).astype(int)
-df_all["season"] = df_all["month"].map({
-    12: "Winter", 1: "Winter", 2: "Winter",
-    3: "Spring", 4: "Spring", 5: "Spring",
-    6: "Summer", 7: "Summer", 8: "Summer",
-    9: "Fall", 10: "Fall", 11: "Fall"
-})
-df_all["Y_label"] = 1
-
-# === 9. Kaydet ===
-safe_save(df_all, csv_path)
+# === 6. Verileri eşzamanlı indir; biten günleri hemen temizle & GEOID ata ===
+# Tamamlanan her gün ara depoya (crime_data/_staging/crime) yazılır; script yarıda kalırsa
+# tekrar çalıştırıldığında bu günler yeniden indirilmez. Bugün henüz bitmediği için
+# ara depoya alınmaz, sadece bellekte tutulur.
+staging = ChunkStaging("crime")
+staged_before = [d for d in missing_dates if staging.done(d.isoformat())]
+to_fetch = [d for d in missing_dates if not staging.done(d.isoformat())]
+if staged_before:
+    print(f"♻️ Ara depodan devam: {len(staged_before)} gün zaten indirilmiş, {len(to_fetch)} gün kaldı.")
+
+partial_days = {}
+fetch_t0 = time.perf_counter()
+total_rows = 0
+if to_fetch:
+    print(f"⚡ Eşzamanlı indirme: {FETCH_WORKERS} worker, en fazla {FETCH_RPS:g} istek/sn")
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        futures = {pool.submit(fetch_day_with_retry, d): d for d in to_fetch}
+        for fut in as_completed(futures):
+            d = futures[fut]
+            try:
+                df_day, elapsed, attempts = fut.result()
+            except Exception as e:
+                print(f"❌ {d} indirilemedi: {e}")
+                continue
+            if df_day is None:
+                print(f"📭 {d}: kayıt yok ({elapsed:.1f}s, {attempts} deneme)")
+                cleaned = pd.DataFrame()
+            else:
+                n = len(df_day)
+                total_rows += n
+                print(f"📥 {d}: {n} satır | {elapsed:.2f}s | {n / max(elapsed, 1e-9):.0f} satır/sn"
+                      + (f" | {attempts}. denemede" if attempts > 1 else ""))
+                # Diğer günler indirilirken bu günün temizlik + GEOID işi ana thread'de yapılır
+                cleaned = clean_and_assign_geoid(df_day)
+            if d < today:
+                staging.commit(d.isoformat(), cleaned)
+            elif not cleaned.empty:
+                partial_days[d] = cleaned
+    wall = time.perf_counter() - fetch_t0
+    print(f"⏱️ İndirme+işleme: {wall:.1f}s | {total_rows} satır | {total_rows / max(wall, 1e-9):.0f} satır/sn")
+    print(client.summary())
+    if blocks is not None and blocks.stats["points"]:
+        print(blocks.report())
+        blocks.save_memo()
+
+# === 8. Yeni günler (ay ay) ===
+# Ara depodaki günler ay ay okunur (bellekte en fazla bir aylık yeni veri); bugünün kısmi verisi
+# kendi ayına eklenir. Günler tarih sırasıyla geldiğinden upsert sırası tek parça okumayla aynıdır.
+def new_months():
+    days = {}
+    for d in missing_dates:
+        if d in partial_days or (d < today and staging.done(d.isoformat())):
+            days.setdefault(month_key(d), []).append(d)
+    for ym, month_days in days.items():
+        parts = []
+        for d in month_days:
+            if d in partial_days:
+                parts.append(partial_days[d])
+                continue
+            part = staging.load(d.isoformat(), dtype={"id": str, "GEOID": str})
+            if not part.empty:
+                part["date"] = pd.to_datetime(part["date"], errors="coerce").dt.date
+                parts.append(part)
+        if parts:
+            yield ym, pd.concat(parts, ignore_index=True)
+
+# === 9. Kaydet (sadece etkilenen ay bölümleri yazılır) ===
+# Grid durumu deponun bu çalıştırmadan önceki hâliyle uyumluysa sadece değişiklikler işlenir.
+REBUILD_GRID = os.environ.get("CRIME_GRID_REBUILD", "0") == "1"
+grid = GridState(grid_state_path)
+grid_incremental = not REBUILD_GRID and grid.load() and grid.in_sync(store.row_counts())
+store.track(GRID_INPUT_COLS)
+
+# Yeni günlere zaman özellikleri ay ay atanır ve depoya işlenir
+added = {}
+for ym, df_new in new_months():
+    added.update(store.upsert(add_time_features(df_new, start_date)))
+dropped = store.expire(start_date)
+if added:
+    print(f"💾 Yazılan ay bölümleri: " + ", ".join(f"{ym} (+{n})" for ym, n in added.items()))
+if dropped:
+    print(f"🗑️ 5 yıllık pencere dışına düşen bölümler silindi: {', '.join(dropped)}")
+staging.clear()  # olay deposuna işlendi → ara depo artık gereksiz
+if EXPORT_CSV:
+    store.export_csv(csv_path)
+    print(f"📄 Tek parça CSV dışa aktarıldı → {csv_path}")
 
 # === 10. Grid ve Label ===
-group_cols = ["GEOID", "season", "day_of_week", "event_hour"]
-agg_dict = {
-    "latitude": "mean",
-    "longitude": "mean",
-    "is_weekend": "mean",
-    "is_night": "mean",
-    "is_holiday": "mean",
-    "is_school_hour": "mean",
-    "is_business_hour": "mean",
-    "date": "min",
-    "id": "count",
-}
-
-# GEOID NaN'ları gruba sokmayalım
-df_all_valid = df_all.dropna(subset=["GEOID"]).copy()
-grouped = df_all_valid.groupby(group_cols).agg(agg_dict).reset_index()
-grouped = grouped.rename(columns={"id": "crime_count"})
-grouped["Y_label"] = (grouped["crime_count"] >= 2).astype(int)
-
-# Kombinasyon üret
-geoids = df_all_valid["GEOID"].dropna().unique()
-seasons = ["Winter", "Spring", "Summer", "Fall"]
-days = list(range(7))
-hours = list(range(24))
-full_grid = pd.DataFrame(itertools.product(geoids, seasons, days, hours), columns=group_cols)
-
-# Birleştir
-df_final = full_grid.merge(grouped, on=group_cols, how="left")
-df_final["crime_count"] = df_final["crime_count"].fillna(0).astype(int)
-df_final["Y_label"] = df_final["Y_label"].fillna(0).astype(int)
-
-# Kaydet
-safe_save(df_final, sum_path)
-safe_save(df_final, full_path)
+# Hücre başına toplam/sayı durumu: yeni günler eklenir, pencereden düşenler çıkarılır;
+# Y_label yalnızca değişen hücrelerde yeniden hesaplanır.
+t0 = time.perf_counter()
+if grid_incremental:
+    df_added, df_removed = store.changes()
+    touched = grid.apply(df_added, df_removed, store)
+    print(f"🧮 Grid artımlı güncellendi: +{len(df_added)} / -{len(df_removed)} olay, "
+          f"{touched} hücre ({time.perf_counter() - t0:.2f}s)")
+else:
+    grid.rebuild(store)
+    print(f"🧮 Grid depodan baştan kuruldu: {len(grid.cells)} hücre ({time.perf_counter() - t0:.2f}s)")
+grid.save(store.row_counts())
+grouped = grid.summary()
+
+# Kaydet: seyrek grid (sıfır olmayan hücreler + GEOID/zaman boyutları) birincil çıktıdır.
+# Tam grid yalnızca CRIME_GRID_DENSE_CSV=1 iken (full modda varsayılan) GEOID parçaları hâlinde
+# akıtılarak yazılır; hücre kodlarıyla doğrudan indekslenir (itertools.product + merge yok).
+# sf_crime_grid_summary_labeled.csv eskisi gibi tam grid'dir (full_path'in kopyası); yalnızca dolu
+# hücreler ayrıca sf_crime_grid_nonzero_labeled.csv'ye yazılır.
+# CRIME_GRID_MODE=sample: tam grid yerine dolu hücreler + ağırlıklı negatif örneklem üretilir;
+# sonraki zenginleştirme adımları yalnızca bu satırları işler.
+GRID_MODE  = os.environ.get("CRIME_GRID_MODE", "full")  # full | sample
+NEG_RATIO  = float(os.environ.get("CRIME_NEG_RATIO", "3"))
+NEG_SEED   = int(os.environ.get("CRIME_NEG_SEED", "42"))
+DENSE_CSV  = os.environ.get("CRIME_GRID_DENSE_CSV", "1" if GRID_MODE == "full" else "0") == "1"
+grid_geoids = first_seen_geoids(store, among=grouped["GEOID"])  # tam grid satır sırası
+n_grid = len(grid_geoids) * CELLS_PER_GEOID
+write_sparse_grid(grouped, sparse_path, geoids=grid_geoids)
+safe_save(grouped, nonzero_path)
+print(f"🧊 Seyrek grid: {len(grouped)} dolu hücre / {n_grid} → {sparse_path}")
+if GRID_MODE == "sample":
+    # Negatiflere koordinat (blok merkezi) ve tabakaya uyan tarih verilir; aksi hâlde sonraki
+    # adımlar (police_gov koordinat, weather tarih filtresi) onları düşürür.
+    neg_years = range(start_date.year, today.year + 1)
+    df_train = training_sample(grouped, geoids=grid_geoids, neg_ratio=NEG_RATIO, seed=NEG_SEED,
+                               coords=blocks.centroids() if blocks is not None else None,
+                               date_range=(start_date, today),
+                               holidays=holidays.US(years=list(neg_years)).keys())
+    write_sparse_grid(df_train, sample_path, geoids=grid_geoids,
+                      mode="sample", neg_ratio=NEG_RATIO, seed=NEG_SEED)
+    n_neg = int((df_train["crime_count"] == 0).sum())
+    print(f"🎯 Eğitim örneklemi: {len(df_train) - n_neg} dolu + {n_neg} negatif = {len(df_train)} satır "
+          f"(tam grid {n_grid}, ~{n_grid / max(len(df_train), 1):.1f}x daha az) → {sample_path}")
+if DENSE_CSV:
+    try:
+        n_rows = write_dense_csv(iter_dense(grouped, grid_geoids), full_path)
+        # sum_path eskiden de tam grid'in aynısıydı: ikinci kez açılmaz, dosya kopyalanır
+        shutil.copyfile(full_path, sum_path)
+        print(f"📄 Tam grid CSV: {n_rows} satır → {full_path} (+ {sum_path})")
+    except Exception as e:
+        print(f"❌ Kaydedilemedi: {full_path}\n{e}")
 
 # 2. adımın (911) ve sonraki adımların beklediği yerlere kopyalar
 try:
     Path("crime_data").mkdir(exist_ok=True)
-    src_grid = Path(full_path)
-    if src_grid.exists():
-        shutil.copy2(src_grid, Path("crime_data") / src_grid.name)
+    grid_files = [sparse_path] + ([sample_path] if GRID_MODE == "sample" else []) + ([full_path] if DENSE_CSV else [])
+    for src_grid in map(Path, grid_files):
+        if src_grid.exists():
+            shutil.copy2(src_grid, Path("crime_data") / src_grid.name)
     src_blocks = Path(blocks_path)
     if src_blocks.exists():
         shutil.copy2(src_blocks, Path("crime_data") / src_blocks.name)
@@ -1,13 +1,18 @@
 # pipeline_make_sf_crime_06.py
-import os, ast, json
+import os, json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from collections import defaultdict
 
 import numpy as np
 import pandas as pd
-import geopandas as gpd
 from sklearn.neighbors import BallTree
 
+from block_index import load_block_index
+from crime_schema import SCHEMA, cast_column
+from feature_store import FeatureStore
+from poi_risk import PoiRiskState, poi_key
+from poi_source import CACHE_DIR, geometries, load_poi_features
+
 # ================== 0) YOLLAR ==================
 BASE_DIR       = "crime_data"
 POI_GEOJSON_1  = os.path.join(BASE_DIR, "sf_pois.geojson")
@@ -16,8 +21,22 @@ BLOCK_PATH_1   = os.path.join(BASE_DIR, "sf_census_blocks_with_population.geojso
 BLOCK_PATH_2   = os.path.join(".",       "sf_census_blocks_with_population.geojson")  # fallback
 POI_CLEAN_CSV  = os.path.join(BASE_DIR, "sf_pois_cleaned_with_geoid.csv")
 POI_RISK_JSON  = os.path.join(BASE_DIR, "risky_pois_dynamic.json")
-CRIME_IN       = os.path.join(BASE_DIR, "sf_crime_05.csv")
-CRIME_OUT      = os.path.join(BASE_DIR, "sf_crime_06.csv")
+POI_RISK_STATE = os.path.join(CACHE_DIR, "poi_risk_state.npz")  # artımlı POI çevre suç sayıları (gitignore + CI önbelleği)
+POI_RISK_REBUILD = os.environ.get("POI_RISK_REBUILD", "0") == "1"  # 1 → sayıları baştan kur
+STEP           = "poi"  # özellik deposundaki adım adı (sf_crime_06'nın karşılığı)
+# Depodan okunan ve yan dosyaya yazılan kolonlar (önceki kolonlara dokunulmaz)
+CRIME_INPUT_COLS = ["latitude", "longitude"]
+POI_COLS = ["poi_total_count", "poi_risk_score", "poi_dominant_type",
+            "poi_total_count_range", "poi_risk_score_range"]
+# POI metrik yarıçapı (m) ve ek yarıçaplar: ek olanlar için poi_total_count_{r} / poi_risk_score_{r}
+# kolonları aynı ağaç sorgusundan (en büyük yarıçapla, mesafeli) türetilir. Varsayılan yalnızca
+# POI_RADIUS_M'dir (çıktı kolonları değişmez); ek yarıçaplar POI_RADII="100,300,500" ile açılır.
+POI_RADIUS_M = 300
+POI_RADII    = [int(x) for x in os.environ.get("POI_RADII", str(POI_RADIUS_M)).split(",") if x.strip()]
+EARTH_RADIUS_M = 6371000.0
+# Komşu sayımı (dinamik risk): sorgu noktaları parçalara bölünüp thread havuzunda çalışır
+POI_QUERY_WORKERS = max(1, int(os.environ.get("POI_QUERY_WORKERS", str(min(4, os.cpu_count() or 1)))))
+POI_QUERY_CHUNK   = max(1, int(os.environ.get("POI_QUERY_CHUNK", "20000")))
 
 Path(BASE_DIR).mkdir(exist_ok=True)
 
@@ -34,34 +53,6 @@ def _safe_save_csv(df: pd.DataFrame, path: str):
         df.to_csv(path + ".bak", index=False)
         print(f"📁 Yedek oluşturuldu: {path}.bak")
 
-def _ensure_crs(gdf, target="EPSG:4326"):
-    if gdf.crs is None:
-        return gdf.set_crs(target, allow_override=True)
-    s = (gdf.crs.to_string() if hasattr(gdf.crs, "to_string") else str(gdf.crs)).upper()
-    if s.endswith("CRS84"):  # CRS84 == 4326 (lon,lat)
-        return gdf.set_crs("EPSG:4326", allow_override=True)
-    if s != target:
-        return gdf.to_crs(target)
-    return gdf
-
-def _parse_tags(val):
-    if isinstance(val, dict): return val
-    if isinstance(val, str):
-        for loader in (json.loads, ast.literal_eval):
-            try:
-                x = loader(val)
-                return x if isinstance(x, dict) else {}
-            except Exception:
-                pass
-    return {}
-
-def _extract_cat_sub_name(tags: dict):
-    name = tags.get("name")
-    for key in ("amenity", "shop", "leisure"):
-        if key in tags and tags[key]:
-            return key, tags[key], name
-    return None, None, name
-
 def _normalize_geoid(series: pd.Series, target_len: int) -> pd.Series:
     s = series.astype(str).str.extract(r"(\d+)")[0]
     return s.str.zfill(target_len)
@@ -103,40 +94,21 @@ def build_poi_clean_with_geoid(blocks_path: str, poi_geojson_path: str) -> pd.Da
     if poi_geojson_path is None or not os.path.exists(poi_geojson_path):
         raise FileNotFoundError("❌ POI GeoJSON bulunamadı (crime_data/ veya kök).")
 
-    gdf = gpd.read_file(poi_geojson_path)
-    gdf = _ensure_crs(gdf, "EPSG:4326")
-
-    if "tags" not in gdf.columns:
-        gdf["tags"] = [{}]*len(gdf)
-    gdf["tags"] = gdf["tags"].apply(_parse_tags)
-
-    triples = gdf["tags"].apply(_extract_cat_sub_name)
-    gdf[["poi_category","poi_subcategory","poi_name"]] = pd.DataFrame(triples.tolist(), index=gdf.index)
+    # Sütunlu okuyucu: kategori/alt-kategori/ad tek geçişte; kaynak özeti aynıysa önbellekten
+    gdf = load_poi_features(poi_geojson_path)
 
     # geometry → lat/lon güvence
-    if "geometry" not in gdf.columns:
-        if {"lon","lat"}.issubset(gdf.columns):
-            gdf["geometry"] = gpd.points_from_xy(gdf["lon"], gdf["lat"])
-        else:
-            raise ValueError("GeoJSON 'geometry' veya 'lon/lat' içermiyor.")
-    gdf = _ensure_crs(gdf, "EPSG:4326")
-    gdf["lon"] = gdf.get("lon", pd.Series(index=gdf.index, dtype=float)).fillna(gdf.geometry.x)
-    gdf["lat"] = gdf.get("lat", pd.Series(index=gdf.index, dtype=float)).fillna(gdf.geometry.y)
+    gdf["lon"] = gdf["lon"].fillna(gdf["geom_x"])
+    gdf["lat"] = gdf["lat"].fillna(gdf["geom_y"])
 
     # Nüfus bloklarına spatial join (within)
     if blocks_path is None or not os.path.exists(blocks_path):
         raise FileNotFoundError("❌ Nüfus blokları GeoJSON bulunamadı (crime_data/ veya kök).")
 
-    blocks = gpd.read_file(blocks_path)
-    blocks = _ensure_crs(blocks, "EPSG:4326")
-    if "GEOID" not in blocks.columns:
-        raise ValueError("Block dosyasında 'GEOID' yok.")
-
-    # GEOID hedef uzunluğunu blok dosyasından öğren
-    target_len = blocks["GEOID"].astype(str).str.len().mode().iat[0]
-    blocks["GEOID"] = _normalize_geoid(blocks["GEOID"], target_len)
-
-    joined = gpd.sjoin(gdf, blocks[["GEOID","geometry"]], how="left", predicate="within")
+    # Önbellekli blok dizini (geometriler + STRtree + GEOID uzunluğu)
+    blocks = load_block_index(blocks_path)
+    target_len = blocks.target_len
+    joined = gdf.assign(GEOID=blocks.assign_geoms(geometries(gdf)))
 
     keep = [c for c in ["id","lat","lon","poi_category","poi_subcategory","poi_name","GEOID"] if c in joined.columns]
     df = joined[keep].copy()
@@ -155,6 +127,15 @@ def build_poi_clean_with_geoid(blocks_path: str, poi_geojson_path: str) -> pd.Da
     return df, target_len
 
 # ================== 2) Dinamik risk skoru (0–3) ==================
+def _count_within(tree: BallTree, pts: np.ndarray, r: float,
+                  workers: int = POI_QUERY_WORKERS, chunk: int = POI_QUERY_CHUNK) -> np.ndarray:
+    """Her nokta için r içindeki ağaç noktası sayısı (query_radius count_only; indeks dizisi kurulmaz)."""
+    parts = [pts[i:i + chunk] for i in range(0, len(pts), chunk)]
+    if len(parts) <= 1 or workers == 1:
+        return np.concatenate([tree.query_radius(p, r=r, count_only=True) for p in parts] or [np.zeros(0, int)])
+    with ThreadPoolExecutor(max_workers=workers) as pool:  # sorgu GIL dışında çalışır
+        return np.concatenate(list(pool.map(lambda p: tree.query_radius(p, r=r, count_only=True), parts)))
+
 def compute_dynamic_poi_risk(df_crime: pd.DataFrame, df_poi: pd.DataFrame, radius_m=300) -> dict:
     print("📊 Dinamik POI risk (ortalama çevre suç sayısı → 0–3 normalize)...")
     # temiz koordinatlar
@@ -176,29 +157,36 @@ def compute_dynamic_poi_risk(df_crime: pd.DataFrame, df_poi: pd.DataFrame, radiu
         with open(POI_RISK_JSON,"w") as f: json.dump({}, f, indent=2)
         return {}
 
-    # Haversine BallTree: radyan
+    # Haversine: radyan
     crime_rad = np.radians(dfc[["latitude","longitude"]].values)
     poi_rad   = np.radians(dfp[["lat","lon"]].values)
-    tree = BallTree(crime_rad, metric="haversine")
     r = radius_m/6371000.0
 
     poi_types = dfp["poi_subcategory"].fillna("")
-    counts = []
-    for pt, t in zip(poi_rad, poi_types):
-        if not t: 
-            continue
-        idx = tree.query_radius([pt], r=r)[0]
-        counts.append((t, len(idx)))
-
-    if not counts:
+    typed = poi_types.astype(bool).to_numpy()  # alt-kategorisi boş POI'ler sayılmaz
+    if not typed.any():
         _ensure_parent(POI_RISK_JSON)
         with open(POI_RISK_JSON,"w") as f: json.dump({}, f, indent=2)
         return {}
 
-    agg = defaultdict(list)
-    for t, c in counts:
-        agg[t].append(c)
-    avg = {t: float(np.mean(v)) for t, v in agg.items()}
+    # POI başına çevre suç sayısı: kayıtlı durum aynı POI/yarıçapa aitse yalnızca değişen suç
+    # noktaları sorgulanır; değilse tüm POI'ler suç ağacında tek toplu sorguyla sayılır
+    state = PoiRiskState(POI_RISK_STATE)
+    key = poi_key(poi_rad[typed], r)
+    if not POI_RISK_REBUILD and state.load() and state.key == key:
+        n_add, n_del = state.update(crime_rad)
+        print(f"♻️ POI risk durumu güncellendi: +{n_add:,} / -{n_del:,} suç noktası ({len(crime_rad):,} toplam)")
+    else:
+        tree = BallTree(crime_rad, metric="haversine")
+        state.reset(key, poi_rad[typed], r, crime_rad, _count_within(tree, poi_rad[typed], r))
+        print(f"🧱 POI risk durumu baştan kuruldu: {typed.sum():,} POI, {len(crime_rad):,} suç noktası")
+    state.save()
+    n_near = state.counts
+
+    # alt-kategori ortalaması gruplu toplam / adet
+    codes, types = pd.factorize(poi_types[typed])  # ilk görülme sırası → JSON anahtar sırası aynı
+    mean = np.bincount(codes, weights=n_near) / np.bincount(codes)
+    avg = dict(zip(types, mean.tolist()))
 
     v = list(avg.values())
     vmin, vmax = min(v), max(v)
@@ -216,9 +204,85 @@ def compute_dynamic_poi_risk(df_crime: pd.DataFrame, df_poi: pd.DataFrame, radiu
         print(f"  {k:<24} → {s:.2f}")
     return norm
 
+def _flatten(idxs, dists=None):
+    """query_radius nesne dizilerini CSR biçimine çevirir: (satır başına sayı, düz indeksler[, düz mesafeler])."""
+    counts = np.fromiter((len(ids) for ids in idxs), dtype=np.int64, count=len(idxs))
+    empty = not counts.sum()
+    flat = np.zeros(0, dtype=np.int64) if empty else np.concatenate(idxs).astype(np.int64)
+    if dists is None:
+        return counts, flat
+    return counts, flat, (np.zeros(0) if empty else np.concatenate(dists))
+
+def _within(counts: np.ndarray, flat: np.ndarray, flat_dist: np.ndarray, r: float):
+    """CSR komşu listesini daha küçük bir yarıçapa süzer (satır içi sıra korunur)."""
+    keep = flat_dist <= r
+    rows = np.repeat(np.arange(len(counts)), counts)
+    return np.bincount(rows[keep], minlength=len(counts)).astype(np.int64), flat[keep]
+
+def _row_sums(counts: np.ndarray, vals: np.ndarray) -> np.ndarray:
+    """CSR satır toplamları, eski satır döngüsündeki pandas .sum() ile bit düzeyinde aynı.
+
+    pandas .sum() ikili (pairwise) toplar; np.add.reduceat / bincount ardışık topladığından son
+    bitleri farklı olurdu. Aynı uzunluktaki satırlar (m × n) matrisine toplanıp .sum(axis=1) ile
+    (aynı ikili çekirdek) toplanır. Döngü satır başına değil, farklı komşu sayısı başınadır
+    (yarıçap içindeki en büyük POI sayısı kadar; tipik olarak birkaç yüz tur).
+    """
+    out = np.zeros(len(counts), dtype=float)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    for n in np.unique(counts[counts > 0]):
+        sel = np.flatnonzero(counts == n)
+        out[sel] = vals[offsets[sel][:, None] + np.arange(n)].sum(axis=1)
+    return out
+
+def _neighbor_metrics(counts: np.ndarray, flat: np.ndarray, sub_codes: np.ndarray, risks: np.ndarray):
+    """CSR komşu listesinden (bkz. _flatten) satır başına POI sayısı, risk toplamı ve baskın alt-kategori.
+
+    Hesaplar tüm satırlar için birlikte yapılır; sonuçlar eski satır döngüsüyle (.sum(),
+    value_counts().idxmax()) birebir aynıdır (eşitlikler dahil; bkz. tests/test_poi_equivalence.py).
+    Dönüş: (sayı, risk, alt-kategori kodu); komşusu olmayan satırın kodu len(kategori) → "No_POI".
+    """
+    n_sub = int(sub_codes.max()) + 1 if len(sub_codes) else 0
+    dom = np.full(len(counts), n_sub, dtype=np.int64)
+    risk = _row_sums(counts, risks[flat])
+    if not len(flat):
+        return counts, risk, dom
+    rows = np.repeat(np.arange(len(counts)), counts)
+
+    # (satır, alt-kategori) çiftlerinin sayısı (satır başına bincount'un seyrek hâli); çiftler satır
+    # içinde ilk görülme sırasına dizilir → value_counts'un benzersiz değer sırası (hash tablosu
+    # ekleme sırası) ile aynı
+    pair = rows * n_sub + sub_codes[flat]
+    pairs, first, n_pair = np.unique(pair, return_index=True, return_counts=True)
+    order = np.lexsort((first, pairs // n_sub))
+    pairs, n_pair = pairs[order], n_pair[order]
+    pair_row = pairs // n_sub
+    row_start = np.flatnonzero(np.r_[True, pair_row[1:] != pair_row[:-1]])
+    n_types = np.diff(np.r_[row_start, len(pairs)])
+
+    # Eşitlik bozma: value_counts() sayıları azalan sıralarken nargsort kullanır: dizi ters çevrilir,
+    # argsort(kind="quicksort") ile artan sıralanır, sonuç yine ters çevrilir; idxmax ilk elemanı,
+    # yani ters dizideki argsort'un SON elemanını alır. quicksort kararlı değildir (eşitlerin sırası
+    # dizinin uzunluğuna ve içeriğine bağlıdır), bu yüzden "ilk görülen"/"son görülen" gibi basit bir
+    # kural eşleşmez; aynı argsort aynı girdiyle çağrılmalıdır. Aynı tür sayısındaki (k) satırlar
+    # (m × k) matrisine toplanır ve satır satır argsort edilir (her satır 1-B çağrıyla aynı sonucu verir).
+    for k in np.unique(n_types):
+        sel = row_start[n_types == k]
+        pos = sel[:, None] + np.arange(k)
+        last = np.argsort(n_pair[pos][:, ::-1], axis=1, kind="quicksort")[:, -1]
+        top = pairs[sel + (k - 1 - last)]
+        dom[pair_row[sel]] = top % n_sub
+    return counts, risk, dom
+
 # ================== 3) Suçu POI ile zenginleştir (300m) ==================
-def enrich_crime_with_poi(df_crime: pd.DataFrame, df_poi: pd.DataFrame, poi_risk: dict, radius_m=300) -> pd.DataFrame:
-    print("🔗 Suç satırlarına POI metrikleri ekleniyor (300m yarıçap)...")
+def enrich_crime_with_poi(df_crime: pd.DataFrame, df_poi: pd.DataFrame, poi_risk: dict, radius_m=300,
+                          radii=()) -> pd.DataFrame:
+    """radius_m → POI_COLS; radii içindeki diğer yarıçaplar → poi_total_count_{r}, poi_risk_score_{r}.
+    Tüm yarıçaplar tek sorgudan (en büyük yarıçap, mesafeli) çıkarılır."""
+    extra = sorted({int(x) for x in radii} - {radius_m})
+    radius_cols = [c for rr in extra for c in (f"poi_total_count_{rr}", f"poi_risk_score_{rr}")]
+    out_cols = POI_COLS + radius_cols
+    print(f"🔗 Suç satırlarına POI metrikleri ekleniyor ({radius_m}m yarıçap"
+          + (f"; ek: {', '.join(f'{rr}m' for rr in extra)}" if extra else "") + ")...")
     dfc = df_crime.copy()
     dfc["latitude"]  = pd.to_numeric(dfc["latitude"], errors="coerce")
     dfc["longitude"] = pd.to_numeric(dfc["longitude"], errors="coerce")
@@ -238,33 +302,42 @@ def enrich_crime_with_poi(df_crime: pd.DataFrame, df_poi: pd.DataFrame, poi_risk
         out["poi_dominant_type"]     = "No_POI"
         out["poi_total_count_range"] = "Q1 (0-0)"
         out["poi_risk_score_range"]  = "Q1 (0-0)"
-        _safe_save_csv(out, CRIME_OUT)
-        print(f"💾 {CRIME_OUT}")
+        for c in radius_cols:
+            out[c] = 0 if c.startswith("poi_total_count") else 0.0
+        FeatureStore().write(STEP, out[out_cols], name="sf_crime_06")
+        print(f"💾 {FeatureStore().sidecar_path(STEP)}")
         return out
 
     # Haversine BallTree: suçları arıyoruz (çevredeki POI'leri değil)
     poi_rad   = np.radians(dfp[["lat","lon"]].values)
     crime_rad = np.radians(dfc[["latitude","longitude"]].values)
     tree = BallTree(poi_rad, metric="haversine")
-    r = radius_m/6371000.0
+    r = radius_m/EARTH_RADIUS_M
 
-    idxs = tree.query_radius(crime_rad, r=r)
-    poi_types = dfp["poi_subcategory"].fillna("")
-    poi_risks = dfp["risk_score"].fillna(0.0)
-
-    tot, risk, dom = [], [], []
-    for ids in idxs:
-        if len(ids) == 0:
-            tot.append(0); risk.append(0.0); dom.append("No_POI"); continue
-        subs  = poi_types.iloc[ids]
-        risks = poi_risks.iloc[ids]
-        tot.append(len(ids))
-        risk.append(float(risks.sum()))
-        dom.append(subs.value_counts().idxmax() if not subs.empty else "No_POI")
+    # En büyük yarıçapla tek sorgu; küçük yarıçaplar mesafeye göre süzülür (satır içi sıra aynı kalır)
+    r_max = max([radius_m, *extra])
+    if extra:
+        counts, flat, flat_dist = _flatten(*tree.query_radius(crime_rad, r=r_max/EARTH_RADIUS_M,
+                                                              return_distance=True))
+    else:
+        counts, flat = _flatten(tree.query_radius(crime_rad, r=r))
+
+    def subset(rr):
+        if rr == r_max:
+            return counts, flat
+        return _within(counts, flat, flat_dist, rr/EARTH_RADIUS_M)
+
+    sub_codes, sub_names = pd.factorize(dfp["poi_subcategory"].fillna(""))
+    risks = dfp["risk_score"].fillna(0.0).to_numpy()
+    tot, risk, dom = _neighbor_metrics(*subset(radius_m), sub_codes, risks)
+    for rr in extra:
+        c, f = subset(rr)
+        dfc[f"poi_total_count_{rr}"] = c
+        dfc[f"poi_risk_score_{rr}"]  = _row_sums(c, risks[f])
 
     dfc["poi_total_count"]   = tot
     dfc["poi_risk_score"]    = risk
-    dfc["poi_dominant_type"] = dom
+    dfc["poi_dominant_type"] = np.append(np.asarray(sub_names, dtype=object), "No_POI")[dom]
 
     # Dinamik aralık etiketleri
     lab_cnt  = _make_dynamic_labels(dfc["poi_total_count"])
@@ -274,18 +347,20 @@ def enrich_crime_with_poi(df_crime: pd.DataFrame, df_poi: pd.DataFrame, poi_risk
 
     # Orijinal sıralamayı koru: index üstünden left join
     out = df_crime.copy()
-    out = out.drop(columns=[c for c in ["poi_total_count","poi_risk_score","poi_dominant_type",
-                                        "poi_total_count_range","poi_risk_score_range"] if c in out.columns])
+    out = out.drop(columns=[c for c in out_cols if c in out.columns])
     out = out.merge(
-        dfc[["poi_total_count","poi_risk_score","poi_dominant_type",
-             "poi_total_count_range","poi_risk_score_range"]],
+        dfc[out_cols],
         left_index=True, right_index=True, how="left"
     ).fillna({"poi_total_count":0, "poi_risk_score":0.0,
               "poi_dominant_type":"No_POI",
-              "poi_total_count_range":"Q1 (0-0)", "poi_risk_score_range":"Q1 (0-0)"})
-
-    _safe_save_csv(out, CRIME_OUT)
-    print(f"✅ Yazıldı: {CRIME_OUT}  |  Satır: {len(out):,}")
+              "poi_total_count_range":"Q1 (0-0)", "poi_risk_score_range":"Q1 (0-0)",
+              **{c: 0 for c in radius_cols}})
+    # ek yarıçap kolonları ana kolonlarla aynı kompakt tipte (int32 / float32) yazılır
+    out = out.assign(**{c: cast_column(out[c], SCHEMA[c.rsplit("_", 1)[0]]) for c in radius_cols})
+
+    store = FeatureStore()
+    store.write(STEP, out[out_cols], name="sf_crime_06")
+    print(f"✅ Yazıldı: {store.sidecar_path(STEP)}  |  Satır: {len(out):,}")
     try:
         print(out.head(5)[["poi_total_count","poi_risk_score","poi_dominant_type"]].to_string(index=False))
     except Exception:
@@ -297,9 +372,10 @@ if __name__ == "__main__":
     print("🚀 Başlıyor...")
 
     # 0) Girdiler
-    if not os.path.exists(CRIME_IN):
-        raise FileNotFoundError(f"❌ Suç girdisi bulunamadı: {CRIME_IN}")
-    df_crime = pd.read_csv(CRIME_IN, low_memory=False)
+    store = FeatureStore()
+    if not store.base_path.exists():
+        raise FileNotFoundError(f"❌ Suç girdisi (özellik deposu base) bulunamadı: {store.base_path}")
+    df_crime = store.read(CRIME_INPUT_COLS, upto=STEP)
 
     blocks_path = _pick_existing(BLOCK_PATH_1, BLOCK_PATH_2)
     poi_geojson = _pick_existing(POI_GEOJSON_1, POI_GEOJSON_2)
@@ -311,15 +387,19 @@ if __name__ == "__main__":
         df_poi = pd.read_csv(POI_CLEAN_CSV)
         # GEOID uzunluğunu blok dosyasına uydur
         if blocks_path and os.path.exists(blocks_path):
-            gdf_blocks = gpd.read_file(blocks_path)
-            target_len = gdf_blocks["GEOID"].astype(str).str.len().mode().iat[0]
+            target_len = load_block_index(blocks_path).target_len
             df_poi["GEOID"] = _normalize_geoid(df_poi.get("GEOID", np.nan), target_len)
     else:
         df_poi, target_len = build_poi_clean_with_geoid(blocks_path, poi_geojson)
 
     # 2) Dinamik risk sözlüğü (0–3)
-    risk_dict = compute_dynamic_poi_risk(df_crime, df_poi, radius_m=300)
-
-    # 3) Suçu POI ile zenginleştir
-    _ = enrich_crime_with_poi(df_crime, df_poi, risk_dict, radius_m=300)
+    # Örneklem modunda negatif hücreler (crime_count == 0) blok merkezinde koordinat taşır;
+    # POI çevre suç sayılarına yalnızca dolu hücreler girer.
+    df_risk = df_crime
+    if "crime_count" in store.columns(upto=STEP):
+        df_risk = df_crime[store.read(["crime_count"], upto=STEP)["crime_count"].to_numpy() > 0]
+    risk_dict = compute_dynamic_poi_risk(df_risk, df_poi, radius_m=POI_RADIUS_M)
+
+    # 3) Suçu POI ile zenginleştir (ek yarıçaplar aynı ağaç sorgusunda)
+    _ = enrich_crime_with_poi(df_crime, df_poi, risk_dict, radius_m=POI_RADIUS_M, radii=POI_RADII)
     print("🎉 Bitti.")
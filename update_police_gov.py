@@ -6,6 +6,8 @@ import numpy as np
 import pandas as pd
 from sklearn.neighbors import BallTree
 
+from feature_store import FeatureStore
+
 # =========================
 # Yardımcılar
 # =========================
@@ -28,18 +30,6 @@ def find_col(ci_names, candidates):
             return m[cand.lower()]
     return None
 
-def normalize_geoid(series: pd.Series, target_len: int) -> pd.Series:
-    s = series.astype(str).str.extract(r"(\d+)")[0]
-    return s.str.zfill(target_len)
-
-def choose_geoid_len(s: pd.Series, default_len: int = 12) -> int:
-    vals = s.astype(str).str.extract(r"(\d+)")[0].dropna()
-    if vals.empty:
-        return default_len
-    lens = vals.str.len()
-    mode = lens.mode()
-    return int(mode.iat[0]) if not mode.empty else default_len
-
 def make_quantile_ranges(series: pd.Series, max_bins: int = 5, fallback_label: str = "Unknown") -> pd.Series:
     """Serinin tamamı için Q-etiketleri döndürür (Q1..Qk)."""
     s = pd.to_numeric(series, errors="coerce").replace([np.inf, -np.inf], np.nan)
@@ -76,8 +66,14 @@ def make_quantile_ranges(series: pd.Series, max_bins: int = 5, fallback_label: s
 BASE_DIR  = "crime_data"
 Path(BASE_DIR).mkdir(exist_ok=True)
 
-CRIME_IN  = os.path.join(BASE_DIR, "sf_crime_06.csv")
-CRIME_OUT = os.path.join(BASE_DIR, "sf_crime_07.csv")
+STEP      = "police_gov"  # özellik deposundaki adım adı (sf_crime_07'nin karşılığı)
+# Depodan okunan ve yan dosyaya yazılan kolonlar (önceki kolonlara dokunulmaz)
+CRIME_INPUT_COLS = ["latitude", "longitude", "lat", "lon", "GEOID"]
+OUTPUT_COLS = [
+    "distance_to_police", "distance_to_government_building",
+    "is_near_police", "is_near_government",
+    "distance_to_police_range", "distance_to_government_building_range",
+]
 
 # Polis & devlet dosyalarını hem crime_data/ hem kökte ara
 POLICE_CANDIDATES = [
@@ -98,9 +94,11 @@ def pick_existing(paths):
 # =========================
 # 2) Verileri yükle
 # =========================
-if not os.path.exists(CRIME_IN):
-    raise FileNotFoundError(f"❌ Suç girdisi bulunamadı: {CRIME_IN}")
-df = pd.read_csv(CRIME_IN, low_memory=False)
+store = FeatureStore()
+if not store.base_path.exists():
+    raise FileNotFoundError(f"❌ Suç girdisi (özellik deposu base) bulunamadı: {store.base_path}")
+df = store.read(CRIME_INPUT_COLS, upto=STEP)
+n_in = len(df)
 
 police_path = pick_existing(POLICE_CANDIDATES)
 gov_path    = pick_existing(GOV_CANDIDATES)
@@ -126,17 +124,14 @@ if "latitude" not in df.columns and "lat" in df.columns:
 req_cols = {"latitude", "longitude"}
 missing = [c for c in req_cols if c not in df.columns]
 if missing:
-    raise KeyError(f"❌ sf_crime_06.csv içinde eksik kolon(lar): {missing}")
+    raise KeyError(f"❌ sf_crime_06 (özellik deposu) içinde eksik kolon(lar): {missing}")
 
 # Sayısal ve temizlik
 df["latitude"]  = pd.to_numeric(df["latitude"], errors="coerce")
 df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
 df = df.dropna(subset=["latitude", "longitude"]).copy()
-
-# GEOID normalize (dosyadaki baskın uzunluğa göre)
-if "GEOID" in df.columns:
-    tgt_len = choose_geoid_len(df["GEOID"], default_len=12)
-    df["GEOID"] = normalize_geoid(df["GEOID"], tgt_len)
+keep = np.zeros(n_in, dtype=bool)
+keep[df.index] = True  # koordinatı olmayan satırlar çıktıdan çıkar
 
 # Polis/gov lat/lon kolonlarını bul ve normalize et
 def prep_points(df_points: pd.DataFrame) -> pd.DataFrame:
@@ -194,9 +189,9 @@ df["distance_to_government_building_range"] = make_quantile_ranges(
 # =========================
 # 5) Kaydet & özet
 # =========================
-safe_save_csv(df, CRIME_OUT)
+store.write(STEP, df[OUTPUT_COLS], keep=keep, name="sf_crime_07")
 print("✅ Polis/devlet yakınlık ölçümleri eklendi.")
-print(f"📁 Kaydedildi: {CRIME_OUT}")
+print(f"📁 Kaydedildi: {store.sidecar_path(STEP)}")
 try:
     print(
         df[[
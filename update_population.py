@@ -4,6 +4,9 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 
+from feature_store import FeatureStore
+from join_keys import GEOID_KEY, drop_keys, geoid_label, with_keys
+
 # ============== Yardımcılar ==============
 def ensure_parent(path: str):
     Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
@@ -24,10 +27,6 @@ def find_col(ci_names, candidates):
             return m[cand.lower()]
     return None
 
-def normalize_geoid(s: pd.Series, target_len: int) -> pd.Series:
-    s = s.astype(str).str.extract(r"(\d+)")[0]
-    return s.str.zfill(target_len)
-
 def choose_geoid_len(*series, default_len: int = 12) -> int:
     lens = []
     for ser in series:
@@ -44,15 +43,11 @@ def choose_geoid_len(*series, default_len: int = 12) -> int:
 BASE_DIR = "crime_data"
 Path(BASE_DIR).mkdir(exist_ok=True)
 
-CRIME_INPUT_CANDIDATES = [
-    os.path.join(BASE_DIR, "sf_crime_02.csv"),
-    os.path.join(".",       "sf_crime_02.csv"),
-]
 POPULATION_PATH_CANDIDATES = [
     os.path.join(BASE_DIR, "sf_population.csv"),
     os.path.join(".",       "sf_population.csv"),
 ]
-CRIME_OUTPUT = os.path.join(BASE_DIR, "sf_crime_03.csv")
+STEP = "population"  # özellik deposundaki adım adı (sf_crime_03'ün karşılığı)
 
 def pick_existing(paths):
     for p in paths:
@@ -60,23 +55,22 @@ def pick_existing(paths):
             return p
     return None
 
-crime_input_path = pick_existing(CRIME_INPUT_CANDIDATES)
-population_path  = pick_existing(POPULATION_PATH_CANDIDATES)
+store = FeatureStore()
+population_path = pick_existing(POPULATION_PATH_CANDIDATES)
 
-if not crime_input_path or not population_path:
+if not store.base_path.exists() or not population_path:
     raise FileNotFoundError("❌ Gerekli dosyalardan biri eksik! "
-                            f"(crime: {crime_input_path}, population: {population_path})")
+                            f"(crime: {store.base_path}, population: {population_path})")
 
-print("📥 Veriler yükleniyor...")
-# GEOID’leri güvenli okumak için dtype=str
-df_crime = pd.read_csv(crime_input_path, dtype={"GEOID": str}, low_memory=False)
-df_pop   = pd.read_csv(population_path, dtype=str, low_memory=False)
-
-# ============== 2) Kolon adlarını tespit et ==============
-crime_geoid_col = find_col(df_crime.columns, ["GEOID", "geoid", "geoid10", "block_geoid", "tract_geoid"])
+# ============== 2) Kolon adlarını tespit et & yalnızca gerekenleri yükle ==============
+crime_geoid_col = find_col(store.columns(upto=STEP), ["GEOID", "geoid", "geoid10", "block_geoid", "tract_geoid"])
 if crime_geoid_col is None:
     raise KeyError("❌ Suç verisinde GEOID kolonu bulunamadı.")
 
+print("📥 Veriler yükleniyor...")
+df_crime = store.read([crime_geoid_col], upto=STEP)
+df_pop   = pd.read_csv(population_path, dtype=str, low_memory=False)
+
 pop_geoid_col = find_col(df_pop.columns, ["GEOID", "geoid", "GEOID10", "geoid10", "block_geoid", "TRACTCE", "BLOCKID"])
 if pop_geoid_col is None:
     raise KeyError("❌ Nüfus verisinde GEOID kolonu bulunamadı.")
@@ -90,15 +84,18 @@ if pop_val_col is None:
 
 # ============== 3) GEOID uzunluğunu belirle & normalize et ==============
 target_len = choose_geoid_len(df_crime[crime_geoid_col], df_pop[pop_geoid_col], default_len=12)
-df_crime["GEOID"] = normalize_geoid(df_crime[crime_geoid_col], target_len)
-df_pop["GEOID"]   = normalize_geoid(df_pop[pop_geoid_col], target_len)
+# Birleştirme tamsayı GEOID koduyla (join_keys); suç tarafındaki etiket bir kez üretilir.
+df_crime = with_keys(df_crime, geoid=df_crime[crime_geoid_col])
+df_pop   = with_keys(df_pop, geoid=df_pop[pop_geoid_col])
+df_crime["GEOID"] = geoid_label(df_crime[GEOID_KEY], target_len).to_numpy()
 
 # Nüfus sayısını sayısal yap
 df_pop["population"] = pd.to_numeric(df_pop[pop_val_col], errors="coerce")
 
 # ============== 4) Birleştir ==============
-to_merge = df_pop[["GEOID", "population"]].copy()
-df_merged = pd.merge(df_crime, to_merge, on="GEOID", how="left")
+# GEOID başına tek nüfus değeri → satırlar sf_crime_02 ile hizalı kalır
+to_merge = df_pop[[GEOID_KEY, "population"]].drop_duplicates(GEOID_KEY)
+df_merged = drop_keys(pd.merge(df_crime, to_merge, on=GEOID_KEY, how="left"))
 
 # ============== 5) Eksikleri doldur & tipler ==============
 if df_merged["population"].isna().any():
@@ -118,8 +115,10 @@ except Exception:
     print(df_merged.head())
 
 print(f"\n📊 Satır sayısı: {df_merged.shape[0]}")
-print(f"📊 Sütun sayısı: {df_merged.shape[1]}")
 
 # ============== 7) Kaydet ==============
-safe_save_csv(df_merged, CRIME_OUTPUT)
-print(f"\n✅ Birleştirilmiş çıktı kaydedildi → {CRIME_OUTPUT}")
+# Yalnızca yeni kolon(lar) önceki tabloya eklenir; GEOID kolon adı farklıysa normalize GEOID de eklenir
+out_cols = (["GEOID"] if crime_geoid_col != "GEOID" else []) + ["population"]
+store.write(STEP, df_merged[out_cols], name="sf_crime_03")
+print(f"📊 Sütun sayısı: {len(store.columns())}")
+print(f"\n✅ Birleştirilmiş çıktı kaydedildi → {store.sidecar_path(STEP)}")
@@ -8,6 +8,10 @@ import pandas as pd
 import geopandas as gpd
 from scipy.spatial import cKDTree
 
+from block_index import load_block_index
+from feature_store import FeatureStore
+from source_freshness import FreshnessRegistry, file_token, http_token
+
 # =========================
 # Yardımcılar
 # =========================
@@ -23,10 +27,6 @@ def safe_save_csv(df: pd.DataFrame, path: str):
         df.to_csv(path + ".bak", index=False)
         print(f"📁 Yedek oluşturuldu: {path}.bak")
 
-def normalize_geoid(s: pd.Series, target_len: int) -> pd.Series:
-    s = s.astype(str).str.extract(r"(\d+)")[0]
-    return s.str.zfill(target_len)
-
 def freedman_diaconis_bin_count(data: np.ndarray, max_bins: int = 10) -> int:
     data = np.asarray(data)
     data = data[np.isfinite(data)]
@@ -47,8 +47,10 @@ def freedman_diaconis_bin_count(data: np.ndarray, max_bins: int = 10) -> int:
 BASE_DIR     = "crime_data"
 Path(BASE_DIR).mkdir(exist_ok=True)
 
-CRIME_INPUT  = os.path.join(BASE_DIR, "sf_crime_04.csv")
-CRIME_OUTPUT = os.path.join(BASE_DIR, "sf_crime_05.csv")
+STEP         = "train"  # özellik deposundaki adım adı (sf_crime_05'in karşılığı)
+# Depodan okunan ve yan dosyaya yazılan kolonlar (önceki kolonlara dokunulmaz)
+CRIME_INPUT_COLS = ["latitude", "longitude"]
+OUTPUT_COLS  = ["distance_to_train", "train_stop_count", "distance_to_train_range", "train_stop_count_range"]
 TRAIN_OUTPUT = os.path.join(BASE_DIR, "sf_train_stops_with_geoid.csv")
 
 # census geojson hem crime_data/ hem kökte olabilir
@@ -63,71 +65,102 @@ GTFS_ZIP = "/tmp/bart_gtfs.zip"
 GTFS_TXT = "/tmp/stops.txt"
 
 # =========================
-# 2) GTFS verisini indir ve çıkar
-# =========================
-print("🚉 BART tren verisi indiriliyor...")
-download_ok = False
-for attempt in range(3):
-    try:
-        urlretrieve(GTFS_URL, GTFS_ZIP)
-        with zipfile.ZipFile(GTFS_ZIP, "r") as zf:
-            # Bazı paketlerde path farklı olabilir; güvenli çıkarma
-            members = [m for m in zf.namelist() if m.lower().endswith("stops.txt")]
-            if not members:
-                raise FileNotFoundError("stops.txt GTFS paketinde bulunamadı.")
-            zf.extract(members[0], "/tmp/")
-            extracted = os.path.join("/tmp", members[0].split("/")[-1])
-            os.rename(extracted, GTFS_TXT) if extracted != GTFS_TXT else None
-        download_ok = True
-        break
-    except Exception as e:
-        print(f"⚠️ İndirme/çıkarma denemesi {attempt+1} başarısız: {e}")
-
-if not download_ok:
-    raise SystemExit("❌ GTFS indirilemedi; çıkılıyor.")
-
-bart_stops = pd.read_csv(GTFS_TXT, dtype={"stop_lat": float, "stop_lon": float})
-bart_stops = bart_stops.dropna(subset=["stop_lat", "stop_lon"]).copy()
-print(f"📥 GTFS stops: {len(bart_stops)} kayıt")
-
-# =========================
-# 3) GEOID eşlemesi (census sjoin)
+# 1.1) Tazelik kontrolü (GTFS ETag/Last-Modified + bloklar + suç girdisi)
 # =========================
 census_path = next((p for p in CENSUS_CANDIDATES if os.path.exists(p)), None)
 if census_path is None:
     raise FileNotFoundError("❌ Nüfus blokları GeoJSON bulunamadı (crime_data/ veya kök).")
 
-gdf_stops = gpd.GeoDataFrame(
-    bart_stops,
-    geometry=gpd.points_from_xy(bart_stops["stop_lon"], bart_stops["stop_lat"]),
-    crs="EPSG:4326",
-)
-
-gdf_blocks = gpd.read_file(census_path)
-target_len = gdf_blocks["GEOID"].astype(str).str.len().mode().iat[0]
-gdf_blocks["GEOID"] = normalize_geoid(gdf_blocks["GEOID"], target_len)
-
-gdf_joined = gpd.sjoin(gdf_stops, gdf_blocks[["geometry", "GEOID"]], how="left", predicate="within")
-gdf_joined = gdf_joined.drop(columns=["index_right"], errors="ignore")
-gdf_joined["GEOID"] = normalize_geoid(gdf_joined["GEOID"], target_len)
-gdf_joined = gdf_joined.drop(columns=["geometry"])
-
-safe_save_csv(gdf_joined, TRAIN_OUTPUT)
-print(f"✅ {len(gdf_joined)} tren durağı SF içinde bulundu → {TRAIN_OUTPUT}")
+fresh = FreshnessRegistry()
+store = FeatureStore()
+CRIME_OUTPUT = str(store.sidecar_path(STEP))
+crime_token = store.token(CRIME_INPUT_COLS, upto=STEP)
+blocks_token = file_token(census_path)
+remote_token = http_token(GTFS_URL)
+stops_token = f"{remote_token}|{blocks_token}" if remote_token else None
+step_token = f"{stops_token}|{crime_token}" if stops_token else None
+
+def skip_step(stops_token: str, step_token: str, what: str):
+    """Duraklar ve suç girdisi değişmemiş: kayıtları günceller, zincir CSV'sini yeniler ve çıkar."""
+    fresh.update("http:bart_gtfs", stops_token, from_cache=True)
+    fresh.update("step:update_train", step_token, from_cache=True)
+    fresh.save("update_train")
+    store.export_chain("sf_crime_05", STEP)  # önceki adımlar değişmiş olabilir → zincir CSV'si görünümden yenilenir
+    print(f"⏭️ {what} ve suç girdisi değişmemiş; {CRIME_OUTPUT} olduğu gibi kullanılıyor.")
+    raise SystemExit(0)
+
+# GTFS ve suç girdisi değişmediyse KD-tree/binleme sonucu da aynıdır → adımı atla
+if fresh.is_fresh("step:update_train", step_token, TRAIN_OUTPUT, CRIME_OUTPUT):
+    skip_step(stops_token, step_token, "BART GTFS")
+
+gdf_joined = None
+if fresh.is_fresh("http:bart_gtfs", stops_token, TRAIN_OUTPUT):
+    print(f"🗃️ BART GTFS değişmemiş (ETag/Last-Modified aynı); {TRAIN_OUTPUT} kullanılıyor.")
+    gdf_joined = pd.read_csv(TRAIN_OUTPUT, dtype={"GEOID": str}, low_memory=False)
+    fresh.update("http:bart_gtfs", stops_token, from_cache=True)
+
+if gdf_joined is None:
+    # =========================
+    # 2) GTFS verisini indir ve çıkar
+    # =========================
+    print("🚉 BART tren verisi indiriliyor...")
+    download_ok = False
+    for attempt in range(3):
+        try:
+            urlretrieve(GTFS_URL, GTFS_ZIP)
+            with zipfile.ZipFile(GTFS_ZIP, "r") as zf:
+                # Bazı paketlerde path farklı olabilir; güvenli çıkarma
+                members = [m for m in zf.namelist() if m.lower().endswith("stops.txt")]
+                if not members:
+                    raise FileNotFoundError("stops.txt GTFS paketinde bulunamadı.")
+                zf.extract(members[0], "/tmp/")
+                extracted = os.path.join("/tmp", members[0].split("/")[-1])
+                os.rename(extracted, GTFS_TXT) if extracted != GTFS_TXT else None
+            download_ok = True
+            break
+        except Exception as e:
+            print(f"⚠️ İndirme/çıkarma denemesi {attempt+1} başarısız: {e}")
+
+    if not download_ok:
+        raise SystemExit("❌ GTFS indirilemedi; çıkılıyor.")
+
+    # Sunucu ETag/Last-Modified vermiyorsa içerik özeti ile karşılaştır
+    content_token = f"{file_token(GTFS_TXT)}|{blocks_token}"
+    if stops_token is None:
+        stops_token = content_token
+        step_token = f"{stops_token}|{crime_token}"
+        if fresh.is_fresh("step:update_train", step_token, TRAIN_OUTPUT, CRIME_OUTPUT):
+            skip_step(stops_token, step_token, "stops.txt içeriği")
+        if fresh.is_fresh("http:bart_gtfs", stops_token, TRAIN_OUTPUT):
+            print(f"🗃️ stops.txt içeriği değişmemiş; {TRAIN_OUTPUT} kullanılıyor (sjoin atlandı).")
+            gdf_joined = pd.read_csv(TRAIN_OUTPUT, dtype={"GEOID": str}, low_memory=False)
+            fresh.update("http:bart_gtfs", stops_token, from_cache=True)
+
+if gdf_joined is None:
+    bart_stops = pd.read_csv(GTFS_TXT, dtype={"stop_lat": float, "stop_lon": float})
+    bart_stops = bart_stops.dropna(subset=["stop_lat", "stop_lon"]).copy()
+    print(f"📥 GTFS stops: {len(bart_stops)} kayıt")
+
+    # =========================
+    # 3) GEOID eşlemesi (önbellekli blok dizini)
+    # =========================
+    blocks = load_block_index(census_path)
+    gdf_joined = bart_stops.assign(GEOID=blocks.assign_geoid(bart_stops["stop_lon"], bart_stops["stop_lat"]))
+
+    safe_save_csv(gdf_joined, TRAIN_OUTPUT)
+    print(f"✅ {len(gdf_joined)} tren durağı SF içinde bulundu → {TRAIN_OUTPUT}")
+    fresh.update("http:bart_gtfs", stops_token, from_cache=False)
 
 # =========================
 # 4) Suç verisini yükle
 # =========================
-if not os.path.exists(CRIME_INPUT):
-    raise FileNotFoundError(f"❌ Suç girdi dosyası yok: {CRIME_INPUT}")
+if crime_token is None:
+    raise FileNotFoundError(f"❌ Suç girdisi (özellik deposu base) yok: {store.base_path}")
 
-crime = pd.read_csv(CRIME_INPUT, dtype={"GEOID": str}, low_memory=False)
+crime = store.read(CRIME_INPUT_COLS, upto=STEP)
 if not {"latitude", "longitude"}.issubset(crime.columns):
     raise ValueError("❌ Suç verisinde 'latitude' ve/veya 'longitude' sütunu eksik!")
 
-# GEOID uzunluğunu suç verisine de uydur
-crime["GEOID"] = normalize_geoid(crime["GEOID"], target_len)
-
 # =========================
 # 5) Projeksiyon (EPSG:3857) ve KDTree için matrisler
 # =========================
@@ -191,14 +224,12 @@ else:
 # =========================
 # 7) Kaydet & Özet
 # =========================
-df_final = gdf_crime.drop(columns="geometry")
-safe_save_csv(df_final, CRIME_OUTPUT)
+n_rows = store.write(STEP, gdf_crime[OUTPUT_COLS], name="sf_crime_05")
+fresh.update("step:update_train", step_token, from_cache=False)
+fresh.save("update_train")
 
 print("📦 Yeni sütunlar eklendi:")
-print(df_final[[
-    "GEOID", "distance_to_train", "distance_to_train_range",
-    "train_stop_count", "train_stop_count_range"
-]].head())
+print(gdf_crime[OUTPUT_COLS].head())
 
 print(f"✅ Güncellenmiş veri kaydedildi → {CRIME_OUTPUT}")
-print(f"📊 Satır sayısı: {df_final.shape[0]} | Sütun sayısı: {df_final.shape[1]}")
+print(f"📊 Satır sayısı: {n_rows} | Sütun sayısı: {len(store.columns())}")
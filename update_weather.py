@@ -4,6 +4,10 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+from crime_grid import CELLS_PER_GEOID
+from feature_store import FeatureStore
+from join_keys import DATE_KEY, NA_DATE, date_label, drop_keys, with_keys
+
 # ============== Yardımcılar ==============
 def ensure_parent(path: str):
     Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
@@ -34,33 +38,37 @@ def find_col(cols, candidates):
 BASE_DIR = "crime_data"
 Path(BASE_DIR).mkdir(exist_ok=True)
 
-CRIME_INPUT_CANDS = [
-    os.path.join(BASE_DIR, "sf_crime_07.csv"),
-    os.path.join(".",       "sf_crime_07.csv"),
-]
 WEATHER_CANDS = [
     os.path.join(BASE_DIR, "sf_weather_5years.csv"),
     os.path.join(".",       "sf_weather_5years.csv"),
 ]
+STEP = "weather"  # özellik deposundaki adım adı
+# Zincirin son hâli tek CSV olarak yalnızca burada dışa aktarılır
 CRIME_OUTPUT = os.path.join(BASE_DIR, "sf_crime_08.csv")
+# Depodan okunan ve yan dosyaya yazılan kolonlar (önceki kolonlara dokunulmaz)
+CRIME_INPUT_COLS = ["date", "datetime"]
+WEATHER_COLS = ["temp_max", "temp_min", "temp_range", "precipitation_mm"]
 
-crime_path   = pick_existing(CRIME_INPUT_CANDS)
+store = FeatureStore()
+crime_path   = store.base_path if store.base_path.exists() else None
 weather_path = pick_existing(WEATHER_CANDS)
 
 if not crime_path or not weather_path:
-    raise FileNotFoundError(f"❌ Gerekli dosyalardan biri yok. crime={crime_path}, weather={weather_path}")
+    raise FileNotFoundError(f"❌ Gerekli dosyalardan biri yok. crime={store.base_path}, weather={weather_path}")
 
 print("📥 Veriler yükleniyor...")
 # Tarihi daha rahat hizalamak için dtype'ları esnek alalım
-df_crime   = pd.read_csv(crime_path, low_memory=False)
+df_crime   = store.read(CRIME_INPUT_COLS, upto=STEP)
 df_weather = pd.read_csv(weather_path, low_memory=False)
 
-# ============== 2) Tarih sütunlarını normalize et ==============
-# crime: date yoksa datetime'tan türet
+# ============== 2) Tarih anahtarları ==============
+# Birleştirme tamsayı gün koduyla (join_keys); suç tarafındaki 'date' etiketi bir kez üretilir.
+# crime: date yoksa datetime'tan türet (türetilen 'date' çıktıya eklenir)
+out_cols = WEATHER_COLS if "date" in df_crime.columns else ["date"] + WEATHER_COLS
 if "date" in df_crime.columns:
-    df_crime["date"] = pd.to_datetime(df_crime["date"], errors="coerce").dt.date
+    df_crime = with_keys(df_crime, date=df_crime["date"])
 elif "datetime" in df_crime.columns:
-    df_crime["date"] = pd.to_datetime(df_crime["datetime"], errors="coerce").dt.date
+    df_crime = with_keys(df_crime, date=df_crime["datetime"])
 else:
     raise KeyError("❌ Suç verisinde 'date' veya 'datetime' sütunu bulunamadı.")
 
@@ -68,11 +76,13 @@ else:
 date_col = find_col(df_weather.columns, ["DATE", "date", "obs_date"])
 if date_col is None:
     raise KeyError("❌ Hava durumu verisinde tarih kolonu (DATE/date) bulunamadı.")
-df_weather[date_col] = pd.to_datetime(df_weather[date_col], errors="coerce").dt.date
+df_weather = with_keys(df_weather, date=df_weather[date_col])
 
 # Geçersiz tarihleri temizle
-df_crime  = df_crime.dropna(subset=["date"]).copy()
-df_weather = df_weather.dropna(subset=[date_col]).copy()
+keep = df_crime[DATE_KEY].to_numpy() != NA_DATE  # geçersiz tarihli satırlar çıktıdan çıkar
+df_crime   = df_crime[keep].reset_index(drop=True)
+df_weather = df_weather[df_weather[DATE_KEY] != NA_DATE].copy()
+df_crime["date"] = date_label(df_crime[DATE_KEY]).to_numpy()
 
 # ============== 3) NOAA dönüşümleri (birim güvenli) ==============
 # Olası kolon adlarını bul
@@ -104,25 +114,42 @@ df_weather["temp_range"] = (df_weather["temp_max"] - df_weather["temp_min"]).rou
 # Aynı tarihte birden fazla satır varsa (farklı istasyonlar), rasyonel bir şekilde özetle:
 agg = (
     df_weather
-    .groupby([date_col], as_index=False)
+    .groupby([DATE_KEY], as_index=False)
     .agg({
         "temp_max": "max",               # günün en yüksek sıcaklığı
         "temp_min": "min",               # günün en düşük sıcaklığı
         "temp_range": "max",             # range yeniden hesaplamaya gerek yok; max makul
         "precipitation_mm": "sum"        # toplam yağış (mm)
     })
-    .rename(columns={date_col: "date"})
 )
 
 # ============== 5) Suç verisiyle birleştir ==============
-df_merged = pd.merge(df_crime, agg, on="date", how="left")
+df_merged = drop_keys(pd.merge(df_crime, agg, on=DATE_KEY, how="left"))
 
 # ============== 6) Kaydet & Özet ==============
-safe_save_csv(df_merged, CRIME_OUTPUT)
+store.write(STEP, df_merged[out_cols], keep=keep, name="sf_crime_08")
+
+# Örneklem modu (CRIME_GRID_MODE=sample): negatif hücreler ve ağırlıkları sf_crime_08'e kadar korunmalı;
+# ağırlık toplamı tam grid boyutuna (GEOID × 672) eşit olmalı
+if "sample_weight" in store.columns():
+    w_cols = ["crime_count", "sample_weight"]
+    w_in, w_out = store.read(w_cols + ["GEOID"], upto="311"), store.read(w_cols)
+    neg_in, neg_out = int((w_in["crime_count"] == 0).sum()), int((w_out["crime_count"] == 0).sum())
+    n_nan = int(w_out["sample_weight"].isna().sum())
+    if neg_out < neg_in or n_nan:
+        raise ValueError(f"❌ Negatif örneklem zincirde kayboldu: {neg_in} → {neg_out} negatif, "
+                         f"{n_nan} satırda sample_weight boş")
+    n_grid = int(w_in["GEOID"].nunique()) * CELLS_PER_GEOID
+    w_sum = float(w_out["sample_weight"].sum())
+    if neg_in and not np.isclose(w_sum, n_grid, rtol=1e-6):
+        raise ValueError(f"❌ Örneklem ağırlıkları tam grid'i karşılamıyor: toplam {w_sum:,.1f} ≠ {n_grid:,} hücre")
+    print(f"🎯 Negatif örneklem korundu: {neg_out} negatif, ağırlık toplamı {w_sum:,.0f} = tam grid {n_grid:,}")
+
+n_rows = store.export_csv(CRIME_OUTPUT)
 
 print(f"✅ Hava durumu eklendi → {CRIME_OUTPUT}")
-print("📄 Eklenen sütunlar:", ["temp_max", "temp_min", "temp_range", "precipitation_mm"])
-print(f"📊 Satır sayısı: {df_merged.shape[0]}, Sütun sayısı: {df_merged.shape[1]}")
+print("📄 Eklenen sütunlar:", out_cols)
+print(f"📊 Satır sayısı: {n_rows}, Sütun sayısı: {len(store.columns())}")
 try:
     print(df_merged[["date", "temp_max", "temp_min", "temp_range", "precipitation_mm"]].head().to_string(index=False))
 except Exception: